@@ -0,0 +1,93 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import peewee as pw
+
+import unichat.backup as backup
+import unichat.db as db
+import unichat.clients.instagram_client.instagram_db as idb
+import unichat.clients.telegram_client.telegram_db as tdb
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+
+
+models = [db.Contact, db.Media, wdb.WhatsAppContact, tdb.TelegramContact, idb.InstagramContact,
+          db.UniChatMessage, db.UniChatMessageSearch, db.ConversationSummary]
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+        self.target_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+        for database in [self.target_db, self.source_db]:
+            database.bind(models)
+            database.connect()
+            database.create_tables(models)
+        me = db.add_contact('Neo', is_me=True)
+        trinity = db.add_contact('Trinity')
+        tdb.TelegramContact.create(user_id=1, first_name='Trinity', contact=trinity)
+        wdb.WhatsAppContact.create(phone_nr='+41', chat_name='Trinity', is_linked=True, contact=trinity)
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        messages = [{'from_contact': trinity if i % 2 else me,
+                     'to_contact': me if i % 2 else trinity,
+                     'text': 'ok' if i < 3 else f'message {i}',
+                     'timestamp': start + datetime.timedelta(minutes=i // 3)}
+                    for i in range(25)]
+        db.save_messages_bulk('telegram', messages)
+        # the same message twice is kept twice
+        db.save_messages_bulk('whatsapp', [messages[-1]] * 2)
+
+    def tearDown(self):
+        for database in [self.source_db, self.target_db]:
+            database.close()
+        self.tmp_dir.cleanup()
+        db.invalidate_identity_caches()
+
+    def rows(self):
+        return [(m.from_contact.name, m.to_contact.name, m.chat_client, m.text, m.timestamp)
+                for m in db.get_messages_by_ids([m.id for m in db.UniChatMessage.select()])]
+
+    def test_export_import_round_trip(self):
+        file_path = os.path.join(self.tmp_dir.name, 'backup.ndjson.gz')
+        counts = backup.export_store(file_path)
+        self.assertEqual(counts['unichatmessage'], 27)
+        rows = self.rows()
+
+        self.target_db.bind(models)
+        # the contacts get other ids than in the exported store
+        db.add_contact('Morpheus')
+        counts = backup.import_store(file_path, chunk_size=4)
+        self.assertEqual(counts, {'contact': 2, 'whatsappcontact': 1, 'telegramcontact': 1,
+                                  'instagramcontact': 0, 'unichatmessage': 27})
+        self.assertEqual(self.rows(), rows)
+        self.assertEqual(tdb.get_contact_from_telegram_user_id(1).name, 'Trinity')
+        self.assertEqual(len(db.search_messages('24')), 3)
+        # importing the file again changes nothing
+        counts = backup.import_store(file_path)
+        self.assertEqual(sum(counts.values()), 0)
+        self.assertEqual(self.rows(), rows)
+        # the duplicates are known to the store, e.g. when scraped again
+        message = {'from_contact': db.Contact.get(name='Neo'),
+                   'to_contact': db.Contact.get(name='Trinity'),
+                   'text': 'message 24',
+                   'timestamp': datetime.datetime(2024, 1, 1, 0, 8, tzinfo=datetime.timezone.utc)}
+        self.assertEqual(db.save_messages_bulk('whatsapp', [message] * 2), [])
+        self.assertEqual(len(db.save_messages_bulk('whatsapp', [message] * 3)), 1)
+
+    def test_rejects_unknown_files(self):
+        file_path = os.path.join(self.tmp_dir.name, 'other.ndjson')
+        with open(file_path, 'w') as f:
+            f.write('{"table": "contact"}\n')
+        with self.assertRaises(ValueError):
+            backup.import_store(file_path)
+        for header in ['{"format": "unichat-ndjson"}', '{"format": "unichat-ndjson", "version": 2}']:
+            with open(file_path, 'w') as f:
+                f.write(header + '\n')
+            with self.assertRaises(ValueError):
+                backup.import_store(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
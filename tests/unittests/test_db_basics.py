@@ -2,6 +2,8 @@ import os
 import unittest
 from unittest.mock import patch, MagicMock
 
+import peewee
+
 import unichat.db as db
 import unichat.config as config
 
@@ -57,6 +59,7 @@ class TestCreateDataDirs(unittest.TestCase):
 
 
 class TestInitDatabase(unittest.TestCase):
+    @patch.object(config, 'db_storage_mode', 'plain')
     @patch('os.path.join')
     @patch('os.path.expanduser')
     @patch('peewee.SqliteDatabase')
@@ -83,6 +86,86 @@ class TestInitDatabase(unittest.TestCase):
         mock_database.close.assert_called()
 
 
+class TestManagedDatabase(unittest.TestCase):
+    @patch.object(config, 'db_storage_mode', 'managed')
+    def test_get_database_managed(self):
+        database = db.get_database()
+        self.assertIsInstance(database, db.ManagedSqliteDatabase)
+        pragmas = dict(database._pragmas)
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['foreign_keys'], 1)
+        self.assertEqual(pragmas['cache_size'], -config.db_cache_size_kib)
+
+    @patch('time.sleep')
+    def test_locked_database_is_retried(self, mock_sleep):
+        database = db.ManagedSqliteDatabase(':memory:')
+        locked = peewee.OperationalError('database is locked')
+        with patch('peewee.SqliteDatabase.execute_sql',
+                   side_effect=[locked, locked, 'cursor']) as mock_execute:
+            with self.assertLogs(level='WARNING') as logs:
+                self.assertEqual(database.execute_sql('SELECT 1'), 'cursor')
+        self.assertEqual(mock_execute.call_count, 3)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch('time.sleep')
+    def test_locked_database_gives_up(self, mock_sleep):
+        database = db.ManagedSqliteDatabase(':memory:')
+        locked = peewee.OperationalError('database is locked')
+        with patch('peewee.SqliteDatabase.execute_sql', side_effect=locked):
+            with self.assertLogs(level='WARNING'):
+                with self.assertRaises(peewee.OperationalError):
+                    database.execute_sql('SELECT 1')
+        self.assertEqual(mock_sleep.call_count, config.db_lock_retries)
+
+    def test_other_errors_are_not_retried(self):
+        database = db.ManagedSqliteDatabase(':memory:')
+        with self.assertRaises(peewee.OperationalError):
+            database.execute_sql('SELECT * FROM missing_table')
+
+
+class TestIdentityCache(unittest.TestCase):
+    def test_cache_loads_once(self):
+        cache = db.IdentityCache(maxsize=2)
+        loader = MagicMock(return_value='row')
+        self.assertEqual(cache.get('a', loader), 'row')
+        self.assertEqual(cache.get('a', loader), 'row')
+        loader.assert_called_once()
+
+    def test_least_recently_used_is_evicted(self):
+        cache = db.IdentityCache(maxsize=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 1)
+        cache.get('c', lambda: 3)
+        self.assertEqual(list(cache.rows), ['a', 'c'])
+
+    def test_failed_lookup_is_not_cached(self):
+        cache = db.IdentityCache()
+        loader = MagicMock(side_effect=peewee.DoesNotExist)
+        with self.assertRaises(peewee.DoesNotExist):
+            cache.get('a', loader)
+        self.assertNotIn('a', cache.rows)
+
+    def test_missing_row_is_not_cached(self):
+        cache = db.IdentityCache()
+        self.assertIsNone(cache.get('a', lambda: None))
+        self.assertNotIn('a', cache.rows)
+
+    def test_callers_get_their_own_copy(self):
+        cache = db.IdentityCache()
+        row = cache.get('a', lambda: {'is_linked': False})
+        row['is_linked'] = True
+        self.assertEqual(cache.get('a', lambda: None), {'is_linked': False})
+
+    def test_invalidate_clears_all_caches(self):
+        caches = [db.IdentityCache(), db.IdentityCache()]
+        for cache in caches:
+            cache.get('a', lambda: 1)
+        db.invalidate_identity_caches()
+        self.assertTrue(all(not cache.rows for cache in caches))
+
+
 if __name__ == '__main__':
     unittest.main()
-
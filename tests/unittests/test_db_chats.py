@@ -1,12 +1,14 @@
-from peewee import SqliteDatabase
+from peewee import SqliteDatabase, IntegrityError
 import datetime
 import unittest
+from unittest.mock import patch
 import unichat.db as db
 import unichat.clients.telegram_client.telegram_db as tdb
 import json
 
-test_db = SqliteDatabase(':memory:')
-models = [db.Contact, tdb.TelegramContact, db.UniChatMessage]
+test_db = SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, tdb.TelegramContact, db.Media, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary, db.SyncState]
 
 
 class TestDatabaseChats(unittest.TestCase):
@@ -28,10 +30,11 @@ class TestDatabaseChats(unittest.TestCase):
         with open('tests/resources/mock_chat.json') as f:
             messages = json.load(f)
 
+        contacts = {'Neo': self.me, 'AgentSmith': self.contact}
         start = datetime.datetime(2024, 1, 1, 1, 1)
         for message in messages:
-            db.UniChatMessage.create(from_contact=message['from_contact'],
-                                     to_contact=message['to_contact'],
+            db.UniChatMessage.create(from_contact=contacts[message['from_contact']],
+                                     to_contact=contacts[message['to_contact']],
                                      chat_client='telegram',
                                      text=message['text'],
                                      timestamp=start)
@@ -40,6 +43,292 @@ class TestDatabaseChats(unittest.TestCase):
     def tearDown(self):
         test_db.drop_tables(models)
         test_db.close()
+        db.invalidate_identity_caches()
+
+    def test_contact_resolution_is_cached(self):
+        contact = tdb.get_contact_from_telegram_user_id(1)
+        telegram_contact = tdb.get_telegram_contact(self.contact)
+        db.Contact.update(name=db.Contact.name + '!').execute()
+        tdb.TelegramContact.update(first_name='renamed').execute()
+        # cached rows are equal copies, not the same instance
+        cached = tdb.get_contact_from_telegram_user_id(1)
+        self.assertIsNot(contact, cached)
+        self.assertEqual(cached.name, contact.name)
+        self.assertEqual(tdb.get_telegram_contact(self.contact).first_name,
+                         telegram_contact.first_name)
+        self.assertEqual(db.get_unichat_me(), db.get_unichat_me())
+
+    def test_remove_contact_invalidates_cache(self):
+        self.assertEqual(tdb.get_contact_from_telegram_user_id(1), self.contact)
+        db.remove_contact('AgentSmith')
+        with self.assertRaises(db.Contact.DoesNotExist):
+            tdb.get_contact_from_telegram_user_id(1)
+
+    def test_add_contact_invalidates_cache(self):
+        trinity = db.add_contact('Trinity')
+        self.assertIsNone(tdb.get_telegram_contact(trinity))
+        tdb.TelegramContact.create(user_id=2, first_name='Trinity', contact=trinity)
+        # a missing link is not cached
+        self.assertEqual(tdb.get_telegram_contact(trinity).user_id, 2)
+        tdb.TelegramContact.update(first_name='Trin').execute()
+        self.assertEqual(tdb.get_telegram_contact(trinity).first_name, 'Trinity')
+        db.add_contact('Morpheus')
+        self.assertEqual(tdb.get_telegram_contact(trinity).first_name, 'Trin')
+
+    def test_rename_contact_keeps_history(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        count = len(db.get_unichat_message('Neo', 'AgentSmith', 'telegram'))
+        self.assertTrue(db.rename_contact('AgentSmith', 'Smith'))
+        self.assertFalse(db.rename_contact('Smith', 'Neo'))
+        self.assertFalse(db.rename_contact('Oracle', 'Seraph'))
+        self.assertEqual(len(db.get_unichat_message('Neo', 'Smith', 'telegram')), count)
+        self.assertEqual(db.get_conversation_summary('telegram', key).contact.name, 'Smith')
+        self.assertEqual(tdb.get_contact_from_telegram_user_id(1).name, 'Smith')
+
+    def test_conversation_key_is_order_independent(self):
+        key0 = db.get_conversation_key(self.me, self.contact)
+        key1 = db.get_conversation_key(self.contact, self.me)
+        self.assertEqual(key0, key1)
+        self.assertNotEqual(key0, db.get_conversation_key(self.me, self.me))
+
+    def test_get_unichat_message_last(self):
+        messages = db.get_unichat_message('Neo', 'AgentSmith', 'telegram', limit=1)
+        self.assertEqual(len(messages), 1)
+        last = db.UniChatMessage.select().order_by(db.UniChatMessage.id.desc()).get()
+        self.assertEqual(messages[0].id, last.id)
+
+    def test_get_unichat_message_both_directions(self):
+        messages = db.get_unichat_message('AgentSmith', 'Neo', 'telegram')
+        self.assertEqual(len(messages), db.UniChatMessage.select().count())
+        self.assertEqual(db.get_unichat_message('AgentSmith', 'Neo', 'whatsapp'), [])
+
+    def test_save_messages_bulk(self):
+        count = db.UniChatMessage.select().count()
+        start = datetime.datetime(2024, 2, 1, 1, 1)
+        messages = [{'from_contact': self.me,
+                     'to_contact': self.contact,
+                     'text': str(i),
+                     'timestamp': start + datetime.timedelta(seconds=i)}
+                    for i in range(1234)]
+        ids = db.save_messages_bulk('telegram', messages, chunk_size=100)
+        self.assertEqual(len(ids), 1234)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(db.UniChatMessage.select().count(), count + 1234)
+        stored = db.get_messages_by_ids(ids)
+        self.assertEqual([m.text for m in stored], [str(i) for i in range(1234)])
+        self.assertEqual(stored[0].conversation_key,
+                         db.get_conversation_key(self.contact, self.me))
+
+    def test_save_messages_bulk_rolls_back(self):
+        count = db.UniChatMessage.select().count()
+        messages = [{'from_contact': self.me,
+                     'to_contact': self.contact,
+                     'text': 'ok',
+                     'timestamp': datetime.datetime(2024, 2, 1)},
+                    {'from_contact': self.me,
+                     'to_contact': 'Morpheus',
+                     'text': 'unknown contact',
+                     'timestamp': datetime.datetime(2024, 2, 1)}]
+        with self.assertRaises(IntegrityError):
+            db.save_messages_bulk('telegram', messages, chunk_size=1)
+        self.assertEqual(db.UniChatMessage.select().count(), count)
+
+    def test_save_messages_bulk_skips_duplicates(self):
+        messages = [{'from_contact': self.contact,
+                     'to_contact': self.me,
+                     'text': text,
+                     'timestamp': '2024-03-01T10:01:00+00:00'}
+                    for text in ['ok', 'ok', 'sure']]
+        ids = db.save_messages_bulk('whatsapp', messages)
+        self.assertEqual(len(ids), 3)
+        # a scraped window that overlaps the stored messages
+        window = messages + [{'from_contact': self.me,
+                              'to_contact': self.contact,
+                              'text': 'new',
+                              'timestamp': '2024-03-01T10:02:00+00:00'}]
+        new_ids = db.save_messages_bulk('whatsapp', window, chunk_size=2)
+        self.assertEqual([m.text for m in db.get_messages_by_ids(new_ids)], ['new'])
+
+    def test_sync_cursor_advances_with_the_messages(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        self.assertIsNone(db.get_sync_state('whatsapp', key))
+        messages = [{'from_contact': self.contact,
+                     'to_contact': self.me,
+                     'text': text,
+                     'timestamp': '2024-03-01T10:01:00+00:00',
+                     'external_id': external_id}
+                    for text, external_id in [('ok', 'a'), ('ok', 'b'), ('no id', None)]]
+        db.save_messages_bulk('whatsapp', messages)
+        self.assertEqual(db.get_sync_state('whatsapp', key).external_id, 'b')
+        # stored again, e.g. a rescan, and a backfilled older message
+        older = dict(messages[0], timestamp='2024-02-01T10:00:00+00:00', external_id='old')
+        self.assertEqual(len(db.save_messages_bulk('whatsapp', messages + [older])), 1)
+        sync_state = db.get_sync_state('whatsapp', key)
+        self.assertEqual(sync_state.external_id, 'b')
+        self.assertEqual(sync_state.timestamp, db.get_epoch_ms('2024-03-01T10:01:00+00:00'))
+        self.assertEqual(db.UniChatMessage.get(external_id='a').text, 'ok')
+
+    def test_identical_messages_in_separate_batches(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        message = {'from_contact': self.contact,
+                   'to_contact': self.me,
+                   'text': 'ok',
+                   'timestamp': '2024-03-01T10:01:00+00:00'}
+        first = db.save_messages_bulk('whatsapp', [dict(message, external_id='false_1@c.us_A')])
+        second = db.save_messages_bulk('whatsapp', [dict(message, external_id='false_1@c.us_B')])
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(db.get_sync_state('whatsapp', key).external_id, 'false_1@c.us_B')
+        # the same message observed again
+        self.assertEqual(db.save_messages_bulk('whatsapp', [dict(message, external_id='false_1@c.us_B')]), [])
+
+    def test_message_stored_without_id_is_claimed(self):
+        message = {'from_contact': self.contact,
+                   'to_contact': self.me,
+                   'text': 'ok',
+                   'timestamp': '2024-03-01T10:01:00+00:00'}
+        db.save_messages_bulk('whatsapp', [message, message])
+        self.assertEqual(db.save_messages_bulk('whatsapp', [dict(message, external_id='A'),
+                                                            dict(message, external_id='B')]), [])
+        stored = db.UniChatMessage.select().where(db.UniChatMessage.chat_client == 'whatsapp')
+        self.assertEqual(sorted(m.external_id for m in stored), ['A', 'B'])
+        key = db.get_conversation_key(self.me, self.contact)
+        self.assertEqual(db.get_sync_state('whatsapp', key).external_id, 'B')
+        # a third one is new
+        third = dict(message, external_id='C')
+        self.assertEqual(len(db.save_messages_bulk('whatsapp', [third])), 1)
+
+    def test_message_stored_with_id_matches_one_without(self):
+        message = {'from_contact': self.contact,
+                   'to_contact': self.me,
+                   'text': 'ok',
+                   'timestamp': '2024-03-01T10:01:00+00:00'}
+        db.save_messages_bulk('whatsapp', [dict(message, external_id='42')])
+        self.assertEqual(db.save_messages_bulk('whatsapp', [message]), [])
+        self.assertEqual(len(db.save_messages_bulk('whatsapp', [message, message])), 1)
+
+    def test_sync_cursor_ignores_skipped_messages(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        message = {'from_contact': self.contact,
+                   'to_contact': self.me,
+                   'text': 'ok',
+                   'timestamp': '2024-03-01T10:01:00+00:00',
+                   'external_id': 'a'}
+        db.save_messages_bulk('whatsapp', [message])
+        stored_hash = db.UniChatMessage.get(external_id='a').dedup_hash
+        # a newer message that collides with the stored one is not stored
+        later = dict(message, timestamp='2024-03-01T10:02:00+00:00', external_id='b', dedup_hash=stored_hash)
+        self.assertEqual(db.save_messages_bulk('whatsapp', [later]), [])
+        self.assertEqual(db.get_sync_state('whatsapp', key).external_id, 'a')
+
+    def test_unparsable_timestamps_get_the_neighbouring_one(self):
+        def message(text, timestamp):
+            return {'from_contact': self.contact, 'to_contact': self.me,
+                    'text': text, 'timestamp': timestamp}
+        messages = [message('first', 'Mon 10:15'),
+                    message('second', '2024-03-01T10:00:00+00:00'),
+                    message('third', 'Mon 10:16'),
+                    message('fourth', 'Mon 10:17')]
+        with self.assertLogs(level='WARNING') as logs:
+            ids = db.save_messages_bulk('instagram', messages, chunk_size=2)
+        self.assertEqual(len(logs.records), 1)
+        parsed = db.get_epoch_ms('2024-03-01T10:00:00+00:00')
+        self.assertEqual([db.UniChatMessage.get_by_id(i).timestamp for i in ids], [parsed] * 4)
+        # a single message gets the newest one of its conversation
+        later = db.UniChatMessage.create(from_contact=self.contact, to_contact=self.me,
+                                         chat_client='instagram', text='fifth', timestamp='Mon 10:18')
+        self.assertEqual(later.timestamp, parsed)
+
+    def test_save_message_duplicate(self):
+        message = {'from_contact': self.me,
+                   'to_contact': self.contact,
+                   'text': 'once',
+                   'timestamp': datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc)}
+        self.assertIsNotNone(db.save_message('telegram', message))
+        self.assertIsNone(db.save_message('telegram', message))
+        self.assertTrue(db.has_unichat_message(self.me, self.contact, 'telegram',
+                                               '2024-03-01T00:00:00+00:00', 'once'))
+        self.assertFalse(db.has_unichat_message(self.me, self.contact, 'whatsapp',
+                                                '2024-03-01T00:00:00+00:00', 'once'))
+
+    def test_get_message_page(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        total = db.UniChatMessage.select().count()
+        pages = []
+        before_id = None
+        while page := db.get_message_page('telegram', key, before_id=before_id, limit=3):
+            self.assertEqual([m.id for m in page], sorted(m.id for m in page))
+            pages.append(page)
+            before_id = page[0].id
+        ids = [m.id for page in reversed(pages) for m in page]
+        self.assertEqual(len(ids), total)
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(db.get_message_page('whatsapp', key), [])
+
+    def test_message_page_loads_contacts_in_one_query(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        with patch.object(test_db, 'execute_sql', wraps=test_db.execute_sql) as execute_sql:
+            page = db.get_message_page('telegram', key, limit=10)
+            senders = {(m.from_contact.name, m.from_contact.is_me, m.to_contact.name) for m in page}
+        self.assertEqual(execute_sql.call_count, 1)
+        self.assertIn(('Neo', True, 'AgentSmith'), senders)
+
+    def test_conversation_summary(self):
+        key = db.get_conversation_key(self.me, self.contact)
+        summary = db.get_conversation_summary('telegram', key)
+        messages = db.get_unichat_message('Neo', 'AgentSmith', 'telegram')
+        incoming = [m for m in messages if m.from_contact == self.contact]
+        self.assertEqual(summary.contact, self.contact)
+        self.assertEqual(summary.message_count, len(messages))
+        self.assertEqual(summary.unread_count, len(incoming))
+        self.assertEqual(db.get_last_message('telegram', key), messages[0])
+        self.assertIsNone(db.get_conversation_summary('whatsapp', key))
+
+        db.mark_conversation_read('telegram', key)
+        message = {'from_contact': self.contact,
+                   'to_contact': self.me,
+                   'text': 'new',
+                   'timestamp': datetime.datetime(2025, 1, 1)}
+        ids = db.save_messages_bulk('telegram', [message, message])
+        # a duplicate submission does not count
+        db.save_messages_bulk('telegram', [message])
+        summary = db.get_conversation_summary('telegram', key)
+        self.assertEqual(summary.last_message_id, ids[-1])
+        self.assertEqual(summary.message_count, len(messages) + 2)
+        self.assertEqual(db.get_unread_counts(self.contact), {'telegram': 2})
+
+        db.UniChatMessage.delete().where(db.UniChatMessage.id.in_(ids)).execute()
+        summary = db.get_conversation_summary('telegram', key)
+        self.assertEqual(summary.last_message_id, messages[0].id)
+        self.assertEqual(summary.message_count, len(messages))
+        db.remove_contact('AgentSmith')
+        self.assertIsNone(db.get_conversation_summary('telegram', key))
+
+    def test_contacts_by_activity(self):
+        db.add_contact('Trinity')
+        morpheus = db.add_contact('Morpheus')
+        self.assertEqual([c.name for c in db.get_contacts_by_activity()],
+                         ['Neo', 'AgentSmith', 'Morpheus', 'Trinity'])
+        db.save_message('telegram', {'from_contact': morpheus,
+                                     'to_contact': self.me,
+                                     'text': 'wake up',
+                                     'timestamp': datetime.datetime(2025, 1, 1)})
+        self.assertEqual([c.name for c in db.get_contacts_by_activity()],
+                         ['Neo', 'Morpheus', 'AgentSmith', 'Trinity'])
+
+    def test_search_messages(self):
+        results = db.search_messages('mister anders')
+        self.assertEqual(len(results), 2)
+        # the short message ranks before the long one
+        self.assertEqual(results[0].text, 'Mister Anderson! Did you get my package?')
+        self.assertEqual(db.search_messages('mister anders', offset=1), results[1:])
+        self.assertEqual(db.search_messages('anderson', client='whatsapp'), [])
+        self.assertEqual(db.search_messages('"(*'), [])
+
+    def test_search_messages_follows_deletes(self):
+        self.assertTrue(db.search_messages('package', contact=self.contact))
+        db.remove_contact('AgentSmith')
+        self.assertEqual(db.search_messages('package'), [])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,270 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.clients.telegram_client.telegram_db as tdb
+import unichat.helpers as helpers
+import unichat.migrations as migrations
+
+
+test_db = pw.SqliteDatabase(':memory:')
+models = [db.Contact,
+          db.Media,
+          db.UniChatMessage,
+          db.UniChatMessageSearch,
+          db.ConversationSummary,
+          db.SyncState]
+
+
+class TestMigrateDatabase(unittest.TestCase):
+    def setUp(self):
+        test_db.bind(models)
+        test_db.connect()
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.execute_sql('PRAGMA user_version = 0')
+        test_db.close()
+
+    def create_version_0_schema(self):
+        """ schema of the first released version, before any migration """
+        test_db.execute_sql('CREATE TABLE contact ('
+                            'name VARCHAR(255) NOT NULL PRIMARY KEY, '
+                            'profile_pic_path VARCHAR(255) NOT NULL, '
+                            'is_me INTEGER NOT NULL)')
+        test_db.execute_sql('CREATE TABLE unichatmessage ('
+                            'id INTEGER NOT NULL PRIMARY KEY, '
+                            'from_contact_id VARCHAR(255) NOT NULL, '
+                            'to_contact_id VARCHAR(255) NOT NULL, '
+                            'chat_client VARCHAR(255) NOT NULL, '
+                            'text TEXT, photo_path TEXT, video_path TEXT, '
+                            'timestamp DATETIME NOT NULL)')
+
+    def test_new_database_is_stamped(self):
+        migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+        self.assertEqual(migrations.get_schema_version(test_db),
+                         migrations.SCHEMA_VERSION)
+
+    def test_conversation_key_backfill(self):
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', '', 0)")
+        for i in range(12):
+            from_contact, to_contact = ('Neo', 'Trinity') if i % 2 else ('Trinity', 'Neo')
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES (?, ?, 'telegram', ?, '2024-01-01 01:01:00')",
+                                (from_contact, to_contact, str(i)))
+
+        with patch.object(migrations.config, 'db_migration_batch_size', 5):
+            migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        self.assertEqual(migrations.get_schema_version(test_db),
+                         migrations.SCHEMA_VERSION)
+        keys = {m.conversation_key for m in db.UniChatMessage.select()}
+        neo, trinity = db.Contact.get(name='Neo'), db.Contact.get(name='Trinity')
+        self.assertEqual(keys, {db.get_conversation_key(neo, trinity)})
+        messages = db.get_unichat_message('Trinity', 'Neo', 'telegram', limit=1)
+        self.assertEqual(messages[0].text, '11')
+
+    def test_sync_state(self):
+        self.create_version_0_schema()
+        migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+        self.assertIn('external_id', migrations._get_column_names(test_db, 'unichatmessage'))
+        self.assertTrue(test_db.table_exists('syncstate'))
+
+    def test_dedup_hash_backfill_keeps_duplicates(self):
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', '', 0)")
+        for _ in range(3):
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES ('Neo', 'Trinity', 'whatsapp', 'ok', '2024-01-01T01:01:00+00:00')")
+
+        migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        hashes = [m.dedup_hash for m in db.UniChatMessage.select()]
+        self.assertEqual(len(set(hashes)), 3)
+        # the same messages scraped again are recognized as stored
+        message = {'from_contact': db.Contact.get(name='Neo'),
+                   'to_contact': db.Contact.get(name='Trinity'),
+                   'text': 'ok',
+                   'timestamp': helpers.string_to_utc_timestamp('01:01, 01.01.2024')}
+        self.assertEqual(db.save_messages_bulk('whatsapp', [message] * 3), [])
+        self.assertEqual(len(db.save_messages_bulk('whatsapp', [message] * 4)), 1)
+
+    def test_message_search_backfill(self):
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', '', 0)")
+        for text in ['follow the white rabbit', None, 'knock knock']:
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES ('Trinity', 'Neo', 'telegram', ?, '2024-01-01 01:01:00')",
+                                (text,))
+
+        with patch.object(migrations.config, 'db_migration_batch_size', 2):
+            migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        self.assertEqual([m.text for m in db.search_messages('rabb')], ['follow the white rabbit'])
+        self.assertEqual(len(db.search_messages('knock')), 1)
+
+    def test_timestamp_conversion(self):
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', '', 0)")
+        rows = [('telegram', '2024-01-01 10:00:00+01:00'),
+                ('telegram', '2024-01-01 10:30:00'),
+                ('whatsapp', '2024-01-01T11:00:00+00:00'),
+                ('instagram', 'Invalid date format: yesterday')]
+        for chat_client, timestamp in rows:
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES ('Trinity', 'Neo', ?, 'hi', ?)",
+                                (chat_client, timestamp))
+
+        with patch.object(migrations.config, 'db_migration_batch_size', 3):
+            migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        timestamps = [m.timestamp for m in db.UniChatMessage.select().order_by(db.UniChatMessage.id)]
+        local = datetime.datetime(2024, 1, 1, 10, 30)
+        self.assertEqual(timestamps[0], 1704099600000)
+        self.assertEqual(timestamps[1], helpers.timestamp_to_epoch_ms(local))
+        # whatsapp stored its local time as UTC
+        self.assertEqual(helpers.convert_timestamp_to_time(timestamps[2]), '11:00')
+        # the unparsable timestamp is taken over from the previous message
+        self.assertEqual(timestamps[3], timestamps[2])
+        message = {'from_contact': db.Contact.get(name='Trinity'),
+                   'to_contact': db.Contact.get(name='Neo'),
+                   'text': 'hi',
+                   'timestamp': helpers.string_to_utc_timestamp('11:00, 01.01.2024')}
+        self.assertEqual(db.save_messages_bulk('whatsapp', [message]), [])
+
+    def test_conversation_summary_backfill(self):
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), "
+                            "('Trinity', '', 0), ('Morpheus', '', 0)")
+        rows = [('Trinity', 'Neo', 'telegram', '2024-01-01 10:00:00'),
+                ('Neo', 'Trinity', 'telegram', '2024-01-01 11:00:00'),
+                ('Morpheus', 'Neo', 'telegram', '2024-01-01 09:00:00'),
+                ('Trinity', 'Neo', 'whatsapp', '2024-01-01T08:00:00+00:00'),
+                ('Trinity', 'Neo', 'telegram', '2024-01-01 10:30:00')]
+        for row in rows:
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES (?, ?, ?, 'hi', ?)", row)
+
+        with patch.object(migrations.config, 'db_migration_batch_size', 2):
+            migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        summaries = {(s.chat_client, s.contact.name): s for s in db.ConversationSummary.select()}
+        self.assertEqual(len(summaries), 3)
+        trinity = summaries['telegram', 'Trinity']
+        self.assertEqual((trinity.message_count, trinity.last_message_id, trinity.unread_count),
+                         (3, 2, 0))
+        self.assertEqual(summaries['telegram', 'Morpheus'].message_count, 1)
+        self.assertEqual([c.name for c in db.get_contacts_by_activity()],
+                         ['Neo', 'Trinity', 'Morpheus'])
+
+    def test_media_store_import(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        patcher = patch.object(helpers, 'get_user_data_dir_path', return_value=data_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        photo_path = os.path.join(data_dir.name, '42.jpg')
+        # the profile picture has the same content as the photo
+        profile_pic_path = os.path.join(data_dir.name, '7.jpg')
+        for file_path in [photo_path, profile_pic_path]:
+            with open(file_path, 'wb') as f:
+                f.write(b'red pill')
+        self.create_version_0_schema()
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', ?, 0)",
+                            (profile_pic_path,))
+        for text in ['first', 'again', None]:
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, photo_path, timestamp) '
+                                "VALUES ('Trinity', 'Neo', 'telegram', ?, ?, '2024-01-01 10:00:00')",
+                                (text, photo_path if text else os.path.join(data_dir.name, 'gone.jpg')))
+
+        with patch.object(migrations.config, 'db_migration_batch_size', 1):
+            migrations.migrate_database(test_db)
+        test_db.create_tables(models)
+
+        messages = list(db.UniChatMessage.select().order_by(db.UniChatMessage.id))
+        media = db.Media.get()
+        self.assertFalse(os.path.exists(photo_path))
+        self.assertFalse(os.path.exists(profile_pic_path))
+        self.assertEqual(db.Media.select().count(), 1)
+        self.assertEqual([m.media_id for m in messages], [media.id, media.id, None])
+        self.assertEqual(messages[0].photo_path, media.get_file_path())
+        self.assertEqual(media.source_key, 'telegram:photo:42')
+        self.assertEqual(db.Contact.get(name='Trinity').profile_pic_path, media.get_file_path())
+        # the same photo message delivered again is recognized as stored
+        message = {'from_contact': db.Contact.get(name='Trinity'),
+                   'to_contact': db.Contact.get(name='Neo'),
+                   'text': 'first',
+                   'photo_path': media.get_file_path(),
+                   'timestamp': messages[0].timestamp}
+        self.assertEqual(db.save_messages_bulk('telegram', [message]), [])
+
+    def test_contact_id_rebuild_resumes(self):
+        self.create_version_0_schema()
+        test_db.execute_sql('CREATE TABLE telegramcontact ('
+                            'user_id INTEGER NOT NULL PRIMARY KEY, first_name VARCHAR(255) NOT NULL, '
+                            'last_name VARCHAR(255), username VARCHAR(255), '
+                            'contact_id VARCHAR(255) NOT NULL REFERENCES contact (name))')
+        test_db.execute_sql("INSERT INTO contact VALUES ('Neo', '', 1), ('Trinity', '', 0)")
+        test_db.execute_sql("INSERT INTO telegramcontact VALUES (7, 'Trinity', NULL, NULL, 'Trinity')")
+        for i in range(6):
+            test_db.execute_sql('INSERT INTO unichatmessage '
+                                '(from_contact_id, to_contact_id, chat_client, text, timestamp) '
+                                "VALUES ('Trinity', 'Neo', 'telegram', ?, '2024-01-01 10:00:00')",
+                                ('ok' if i < 2 else str(i),))
+
+        find_dedup_hash = migrations._find_dedup_hash
+        calls = []
+
+        def interrupted(database, message_id, hash_args, table='unichatmessage'):
+            if table == 'unichatmessage_new':
+                if len(calls) == 3:
+                    raise KeyboardInterrupt
+                calls.append(message_id)
+            return find_dedup_hash(database, message_id, hash_args, table)
+
+        with (patch.object(migrations.config, 'db_migration_batch_size', 2),
+              patch.object(migrations, '_find_dedup_hash', interrupted)):
+            with self.assertRaises(KeyboardInterrupt):
+                migrations.migrate_database(test_db)
+        self.assertEqual(migrations.get_schema_version(test_db), 6)
+        migrations.migrate_database(test_db)
+        test_db.bind([tdb.TelegramContact])
+        test_db.create_tables(models + [tdb.TelegramContact])
+
+        trinity = tdb.get_contact_from_telegram_user_id(7)
+        self.assertIsInstance(trinity.id, int)
+        self.assertEqual(len(db.get_unichat_message('Neo', 'Trinity', 'telegram')), 6)
+        self.assertTrue(db.rename_contact('Trinity', 'Trin'))
+        self.assertEqual(db.get_conversation_summary('telegram', db.get_conversation_key(
+            trinity, db.get_unichat_me())).contact.name, 'Trin')
+        # the duplicates are hashed with the contact ids
+        message = {'from_contact': trinity,
+                   'to_contact': db.get_unichat_me(),
+                   'text': 'ok',
+                   'timestamp': datetime.datetime(2024, 1, 1, 10)}
+        self.assertEqual(db.save_messages_bulk('telegram', [message] * 2), [])
+        test_db.drop_tables([tdb.TelegramContact])
+        db.invalidate_identity_caches()
+
+
+if __name__ == '__main__':
+    unittest.main()
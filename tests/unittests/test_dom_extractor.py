@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock
+
+import peewee as pw
+
+import unichat.config as config
+import unichat.db as db
+import unichat.dom_extractor as dom_extractor
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+from unichat.clients.whatsapp_client.whatsapp_client import WhatsAppClient
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, wdb.WhatsAppContact]
+
+
+def block(metadata, text, id=None):
+    return {'id': id, 'metadata': metadata, 'sender': None, 'timestamp': None, 'text': text,
+            'is_own': None, 'media': []}
+
+
+class TestDomExtractor(unittest.TestCase):
+    def setUp(self):
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        me = db.add_contact('Neo', is_me=True)
+        trinity = db.add_contact('Trinity')
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Neo A.', is_linked=True, contact=me)
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Trinity', is_linked=True, contact=trinity)
+        self.driver = MagicMock()
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        db.invalidate_identity_caches()
+
+    def test_one_script_call(self):
+        self.driver.execute_script.return_value = None
+        self.assertEqual(dom_extractor.extract_messages(self.driver, config.discord_extraction, start=-5), [])
+        self.driver.execute_script.assert_called_once_with(dom_extractor.EXTRACT_SCRIPT,
+                                                           config.discord_extraction, None, -5, None)
+
+    def test_scrolls_every_batch_before_it_is_read(self):
+        selectors = dict(config.instagram_extraction, scroll_batch_size=2)
+        self.driver.execute_script.side_effect = lambda script, *args: 5 if script == dom_extractor.SCROLL_SCRIPT else []
+        dom_extractor.extract_messages(self.driver, selectors, start=1)
+        calls = [(call.args[0] == dom_extractor.SCROLL_SCRIPT, call.args[-2:])
+                 for call in self.driver.execute_script.call_args_list]
+        self.assertEqual(calls, [(True, (None, None)),
+                                 (True, (None, 1)), (False, (1, 3)),
+                                 (True, (None, 3)), (False, (3, 5))])
+
+    def test_whatsapp_window(self):
+        client = WhatsAppClient.__new__(WhatsAppClient)
+        client.time_sender_regex = r'\[(?P<datetime>.+)\]\s(?P<sender>.+):'
+        client.whatsapp_me = 'Neo A.'
+        client.dm = MagicMock()
+        client.dm.get_chromedriver.return_value = self.driver
+        self.driver.execute_script.return_value = [
+            block('[22:15, 31.12.2023] Trinity: ', 'follow the white rabbit', id='a'),
+            # a deleted message
+            block(None, None, id='b'),
+            block('[22:16, 31.12.2023] Neo A.: ', 'who is there?', id='c'),
+        ]
+        messages = client._extract_messages('Trinity')
+        self.assertEqual(self.driver.execute_script.call_count, 1)
+        self.assertEqual([(m['from_contact'].name, m['to_contact'].name, m['text']) for m in messages],
+                         [('Trinity', 'Neo', 'follow the white rabbit'), ('Neo', 'Trinity', 'who is there?')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import unichat.config as config
+import unichat.driver_manager as driver_manager
+from unichat.clients.discord_client.discord_client import DiscordClient
+from unichat.driver_manager import DriverPool
+
+
+class TestDriverPool(unittest.TestCase):
+    def setUp(self):
+        # no browser is started
+        self.initialize_driver = patch.object(driver_manager.DriverManager, 'initialize_driver',
+                                              return_value=None).start()
+        self.user_data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.user_data_dir.cleanup)
+        patch.object(driver_manager.helpers, 'get_user_data_dir_path',
+                     return_value=self.user_data_dir.name).start()
+        self.addCleanup(patch.stopall)
+
+    def test_shared_browser(self):
+        pool = DriverPool(size=1)
+        whatsapp = pool.get_driver_manager('whatsapp')
+        self.assertIs(pool.get_driver_manager('instagram'), whatsapp)
+        self.assertIs(pool.get_driver_manager('whatsapp'), whatsapp)
+        self.assertEqual(whatsapp.default_driver_port, config.driver_port)
+        self.assertEqual(os.path.basename(whatsapp.userdata_dir), config.driver_userdata_dir)
+
+    def test_browser_per_client(self):
+        pool = DriverPool(size=2)
+        whatsapp = pool.get_driver_manager('whatsapp')
+        instagram = pool.get_driver_manager('instagram')
+        self.assertIsNot(instagram, whatsapp)
+        self.assertNotEqual(instagram.default_driver_port, whatsapp.default_driver_port)
+        self.assertNotEqual(instagram.userdata_dir, whatsapp.userdata_dir)
+        # beyond the pool size the browsers are shared
+        self.assertIs(pool.get_driver_manager('discord'), whatsapp)
+
+    def test_browsers_start_on_first_use(self):
+        pool = DriverPool(size=2)
+        pool.get_driver_manager('whatsapp')
+        instagram = pool.get_driver_manager('instagram')
+        self.initialize_driver.assert_not_called()
+        self.initialize_driver.return_value = object()
+        instagram.get_chromedriver()
+        instagram.get_chromedriver()
+        self.initialize_driver.assert_called_once()
+
+    def test_profile_of_the_shared_mode_is_copied(self):
+        shared_dir = os.path.join(self.user_data_dir.name, config.driver_userdata_dir)
+        os.makedirs(os.path.join(shared_dir, 'Default'))
+        for name in ('Default/Cookies', 'SingletonLock'):
+            with open(os.path.join(shared_dir, name), 'w') as f:
+                f.write('login')
+        pool = DriverPool(size=2)
+        self.assertEqual(pool.get_driver_manager('whatsapp').userdata_dir, shared_dir)
+        instagram_dir = pool.get_driver_manager('instagram').userdata_dir
+        self.assertEqual(instagram_dir, f'{shared_dir}-instagram')
+        self.assertTrue(os.path.exists(os.path.join(instagram_dir, 'Default', 'Cookies')))
+        self.assertFalse(os.path.exists(os.path.join(instagram_dir, 'SingletonLock')))
+        # an existing profile is kept
+        os.remove(os.path.join(instagram_dir, 'Default', 'Cookies'))
+        pool = DriverPool(size=2)
+        pool.get_driver_manager('whatsapp')
+        pool.get_driver_manager('instagram')
+        self.assertFalse(os.path.exists(os.path.join(instagram_dir, 'Default', 'Cookies')))
+
+    def test_clients_are_built_from_the_pool(self):
+        pool = DriverPool(size=2)
+        discord = DiscordClient(driver_manager=pool.get_driver_manager('discord'))
+        self.assertIs(discord.driver_manager, pool.get_driver_manager('discord'))
+        self.assertEqual(len(pool.driver_managers), 1)
+
+    def test_commands_of_different_browsers_run_in_parallel(self):
+        # the default size starts a browser per selenium client of the app
+        pool = DriverPool()
+        whatsapp = pool.get_driver_manager('whatsapp')
+        instagram = pool.get_driver_manager('instagram')
+        self.assertIsNot(instagram.mutexLock, whatsapp.mutexLock)
+        waiting = threading.Event()
+        release = threading.Event()
+
+        def slow_command():
+            waiting.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=whatsapp.execute_driver_command, args=(slow_command,))
+        thread.start()
+        waiting.wait(5)
+        start = time.monotonic()
+        self.assertEqual(instagram.execute_driver_command(lambda x: x + 1, 1), 2)
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import json
+from datetime import datetime
 
 import unichat.helpers as helpers
 
@@ -62,6 +63,11 @@ class TestTimestampFormatting(unittest.TestCase):
         formatted_timestamp = helpers.convert_timestamp_to_date(timestamp)
         self.assertEqual(formatted_timestamp, '21.05.24')
 
+    def test_epoch_ms_input(self):
+        timestamp = helpers.timestamp_to_epoch_ms(datetime(2024, 5, 21, 13, 37))
+        self.assertEqual(helpers.convert_timestamp_to_date(timestamp), '21.05.24')
+        self.assertEqual(helpers.convert_timestamp_to_time(timestamp), '13:37')
+
 
 if __name__ == "__main__":
     unittest.main()
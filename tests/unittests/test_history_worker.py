@@ -0,0 +1,43 @@
+import contextlib
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+from unichat.workers.history_worker import StoreHistoryWorker
+
+
+def stored(ids):
+    future = Future()
+    future.set_result(ids)
+    return future
+
+
+class TestStoreHistoryWorker(unittest.TestCase):
+    def setUp(self):
+        patch('unichat.db.thread_connection', return_value=contextlib.nullcontext()).start()
+        self.addCleanup(patch.stopall)
+        self.client = MagicMock()
+        self.client.name = 'telegram'
+        self.qt_signal = MagicMock()
+        self.worker = StoreHistoryWorker(self.client, 42, self.qt_signal)
+        self.progress = []
+        self.worker.progress.connect(self.progress.append)
+
+    def test_stores_batch_by_batch(self):
+        self.client.iter_chat_messages.return_value = iter([['a', 'b'], ['c']])
+        self.client.store_messages.side_effect = lambda batch: stored(list(range(len(batch))))
+        self.worker.run()
+        self.client.iter_chat_messages.assert_called_once_with(42)
+        self.assertEqual(self.progress, [2, 3])
+        # the chat is shown after the first batch
+        self.qt_signal.emit.assert_called_once_with('telegram')
+
+    def test_empty_history_shows_the_chat(self):
+        self.client.iter_chat_messages.return_value = iter([])
+        self.worker.run()
+        self.assertEqual(self.progress, [])
+        self.qt_signal.emit.assert_called_once_with('telegram')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.clients.instagram_client.instagram_db as idb
+from unichat.importers import instagram_export
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, idb.InstagramContact, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary]
+
+START = 1704060000000
+
+
+def mojibake(text):
+    return text.encode('utf-8').decode('latin-1')
+
+
+class TestInstagramExport(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(helpers, 'get_user_data_dir_path', return_value=self.data_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        self.me = db.add_contact('Neo', is_me=True)
+        self.trinity = db.add_contact('Trinity')
+        idb.InstagramContact.create(web_link='', chat_name='You sent', contact=self.me)
+        idb.InstagramContact.create(web_link='', chat_name='Trinity Ä', contact=self.trinity)
+
+        self.root = os.path.join(self.data_dir.name, 'instagram')
+        inbox = os.path.join('your_instagram_activity', 'messages', 'inbox')
+        thread = os.path.join(self.root, inbox, 'trinity_1')
+        os.makedirs(os.path.join(thread, 'photos'))
+        with open(os.path.join(thread, 'photos', '1.jpg'), 'wb') as f:
+            f.write(b'white rabbit')
+        participants = [{'name': mojibake('Trinity Ä')}, {'name': 'neo.anderson'}]
+        # message_1.json holds the newest messages, newest first
+        self.write_thread(thread, 'message_1.json', participants, [
+            {'sender_name': mojibake('Trinity Ä'), 'timestamp_ms': START + 2,
+             'photos': [{'uri': os.path.join(inbox, 'trinity_1', 'photos', '1.jpg')},
+                        {'uri': 'missing.jpg'}]},
+            {'sender_name': 'neo.anderson', 'timestamp_ms': START + 1, 'content': mojibake('grüezi 👋')},
+        ])
+        self.write_thread(thread, 'message_2.json', participants, [
+            {'sender_name': mojibake('Trinity Ä'), 'timestamp_ms': START, 'content': 'follow the white rabbit'},
+        ])
+        # a group thread is skipped
+        self.write_thread(os.path.join(self.root, inbox, 'group_2'), 'message_1.json',
+                          participants + [{'name': 'Morpheus'}],
+                          [{'sender_name': 'Morpheus', 'timestamp_ms': START, 'content': 'hi'}])
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        self.data_dir.cleanup()
+        db.invalidate_identity_caches()
+
+    @staticmethod
+    def write_thread(thread, file_name, participants, messages):
+        os.makedirs(thread, exist_ok=True)
+        with open(os.path.join(thread, file_name), 'w', encoding='utf-8') as f:
+            # instagram escapes everything that is not ascii
+            json.dump({'participants': participants, 'messages': messages, 'title': 'x'}, f)
+
+    def test_fix_encoding(self):
+        self.assertEqual(instagram_export.fix_encoding(mojibake('grüezi 👋')), 'grüezi 👋')
+        self.assertEqual(instagram_export.fix_encoding('grüezi 👋'), 'grüezi 👋')
+
+    def test_import_inbox(self):
+        self.assertEqual(instagram_export.import_inbox(self.root), 3)
+        messages = list(reversed(db.get_unichat_message('Neo', 'Trinity', 'instagram')))
+        self.assertEqual([(m.from_contact.name, m.text) for m in messages],
+                         [('Trinity', 'follow the white rabbit'), ('Neo', 'grüezi 👋'), ('Trinity', None)])
+        with open(messages[2].photo_path, 'rb') as f:
+            self.assertEqual(f.read(), b'white rabbit')
+        self.assertEqual(db.ConversationSummary.get().unread_count, 0)
+
+        self.assertEqual(instagram_export.import_inbox(self.root), 0)
+        self.assertEqual(db.UniChatMessage.select().count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import unichat.config as config
+from unichat.clients.instagram_client.instagram_client import InstagramClient
+from unichat.clients.telegram_client.telegram_client import SyncTelegramClient
+
+
+class TestTelegramIterChatMessages(unittest.TestCase):
+    def setUp(self):
+        self.client = SyncTelegramClient.__new__(SyncTelegramClient)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # two messages per second, newest first like telethon returns them
+        self.messages = [SimpleNamespace(id=i, date=start + timedelta(seconds=i // 2))
+                         for i in reversed(range(10))]
+        self.client.iter_messages = MagicMock(return_value=iter(self.messages))
+        self.client.download_photo = MagicMock(return_value=None)
+        self.client.to_unichat_message = lambda message, media: {'id': message.id,
+                                                                 'timestamp': message.date}
+        patch.object(config, 'chat_fetch_batch_size', 3).start()
+        self.addCleanup(patch.stopall)
+
+    def test_batches_newest_first(self):
+        batches = list(self.client.iter_chat_messages(42))
+        self.client.iter_messages.assert_called_once_with(42)
+        self.assertEqual([m['id'] for batch in batches for m in batch], list(reversed(range(10))))
+        # a second is never split between two batches
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+
+    def test_since_pages_oldest_first(self):
+        since = 1704067200000
+        list(self.client.iter_chat_messages(42, since=since))
+        self.client.iter_messages.assert_called_once_with(
+            42, offset_date=datetime(2024, 1, 1, tzinfo=timezone.utc), reverse=True)
+
+    def test_is_lazy(self):
+        batches = self.client.iter_chat_messages(42)
+        next(batches)
+        self.assertLess(self.client.download_photo.call_count, len(self.messages))
+
+
+class TestInstagramIterChatMessages(unittest.TestCase):
+    def setUp(self):
+        self.client = InstagramClient.__new__(InstagramClient)
+        messages = [{'timestamp': f'2024-01-01T10:{i:02d}:00+00:00', 'text': str(i)} for i in range(5)]
+        messages.append({'timestamp': 'Yesterday 10:05', 'text': 'unparsed'})
+        self.client.get_all_messages = MagicMock(return_value=messages)
+        patch('unichat.clients.instagram_client.instagram_client.idb').start()
+        patch.object(config, 'chat_fetch_batch_size', 2).start()
+        self.addCleanup(patch.stopall)
+
+    def test_newest_batch_first(self):
+        batches = list(self.client.iter_chat_messages('Trinity'))
+        self.assertEqual([[m['text'] for m in batch] for batch in batches],
+                         [['4', 'unparsed'], ['2', '3'], ['0', '1']])
+
+    def test_since_drops_older_messages(self):
+        since = int(datetime(2024, 1, 1, 10, 3, tzinfo=timezone.utc).timestamp() * 1000)
+        batches = list(self.client.iter_chat_messages('Trinity', since=since))
+        self.assertEqual([[m['text'] for m in batch] for batch in batches], [['unparsed'], ['3', '4']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.media_store as media_store
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, db.UniChatMessage, db.UniChatMessageSearch, db.ConversationSummary]
+
+
+class TestMediaStore(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(helpers, 'get_user_data_dir_path', return_value=self.data_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        self.data_dir.cleanup()
+
+    def write_file(self, name, content):
+        file_path = os.path.join(self.data_dir.name, name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return file_path
+
+    def test_same_content_is_stored_once(self):
+        photo = self.write_file('photo.jpg', b'white rabbit')
+        media = media_store.add_file(photo, source_key='telegram:photo:1')
+        # the source file is copied, not moved
+        self.assertTrue(os.path.exists(photo))
+        file_path = media.get_file_path()
+        self.assertTrue(file_path.startswith(media_store.get_media_dir_path()))
+        self.assertIn(os.path.join(media.content_hash[:2], media.content_hash[2:4]), file_path)
+
+        copy = self.write_file('copy.jpg', b'white rabbit')
+        self.assertEqual(media_store.add_file(copy, move=True), media)
+        self.assertFalse(os.path.exists(copy))
+        self.assertEqual(db.Media.select().count(), 1)
+        self.assertEqual(media_store.get_by_source('telegram:photo:1'), media)
+        self.assertIsNone(media_store.get_by_source('telegram:photo:2'))
+
+    def test_evicts_least_recently_used(self):
+        media = [media_store.add_file(self.write_file(f'{i}.jpg', bytes(100) + bytes([i])))
+                 for i in range(4)]
+        for i, m in enumerate(media):
+            db.Media.update(last_access=i).where(db.Media.id == m.id).execute()
+        media_store.touch([media[0].id])
+        # a profile picture is kept
+        db.Contact.create(name='Neo', profile_pic_path=media[1].get_file_path())
+
+        deleted = media_store.evict(quota=250)
+        self.assertEqual(deleted, [media[2].get_file_path(), media[3].get_file_path()])
+        self.assertEqual({m.id for m in db.Media.select()}, {media[0].id, media[1].id})
+        self.assertFalse(os.path.exists(media[2].get_file_path()))
+        self.assertEqual(media_store.evict(quota=250), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import peewee as pw
+from PySide6.QtCore import Qt
+
+import unichat.db as db
+import unichat.helpers as helpers
+from unichat.clients.chat_client import ChatClient
+from unichat.workers.persistence_worker import PersistenceWorker
+
+
+models = [db.Contact, db.Media, db.UniChatMessage, db.UniChatMessageSearch, db.ConversationSummary]
+
+
+class TestPersistenceWorker(unittest.TestCase):
+    def setUp(self):
+        # a file, the worker thread has its own connection
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.test_db = pw.SqliteDatabase(os.path.join(self.db_dir.name, 'test.db'),
+                                         pragmas={'foreign_keys': 1})
+        self.test_db.bind(models)
+        self.test_db.connect()
+        self.test_db.create_tables(models)
+        self.me = db.add_contact('Neo', is_me=True)
+        self.contact = db.add_contact('Trinity')
+        self.worker = PersistenceWorker()
+        self.emitted = []
+        self.worker.msg_receive_signal.connect(self.emitted.extend, Qt.DirectConnection)
+
+    def tearDown(self):
+        self.test_db.drop_tables(models)
+        self.test_db.close()
+        self.db_dir.cleanup()
+        db.invalidate_identity_caches()
+
+    def message(self, text, to_contact=None):
+        return {'from_contact': self.contact,
+                'to_contact': to_contact or self.me,
+                'text': text,
+                'timestamp': datetime.datetime(2024, 1, 1)}
+
+    def run_worker(self):
+        thread = threading.Thread(target=self.worker.run)
+        thread.start()
+        self.worker.stop()
+        thread.join()
+
+    def test_submissions_are_written_in_one_batch(self):
+        futures = [self.worker.submit('telegram', [self.message(str(i))]) for i in range(3)]
+        futures.append(self.worker.submit('telegram', [self.message('0')]))
+        with patch.object(self.test_db, 'commit', wraps=self.test_db.commit) as commit:
+            self.run_worker()
+        self.assertEqual(commit.call_count, 1)
+        self.assertEqual([[m.text for m in f.result()] for f in futures], [['0'], ['1'], ['2'], []])
+        self.assertEqual([m.text for m in self.emitted], ['0', '1', '2'])
+
+    def test_failing_submission_does_not_fail_the_batch(self):
+        stored = self.worker.submit('telegram', [self.message('ok')])
+        failed = self.worker.submit('telegram', [self.message('lost', to_contact='Morpheus')])
+        self.run_worker()
+        self.assertEqual([m.text for m in stored.result()], ['ok'])
+        self.assertIsInstance(failed.exception(), pw.IntegrityError)
+        self.assertEqual(db.UniChatMessage.select().count(), 1)
+
+    def test_media_files_are_stored_by_the_writer(self):
+        file_path = os.path.join(self.db_dir.name, 'photo.jpg')
+        with open(file_path, 'wb') as f:
+            f.write(b'white rabbit')
+        message = dict(self.message('photo'), media_file=(file_path, 'telegram:photo:1'))
+        with patch.object(helpers, 'get_user_data_dir_path', return_value=self.db_dir.name):
+            future = self.worker.submit('telegram', [message])
+            self.run_worker()
+            stored = future.result()[0]
+            self.assertEqual(stored.media.source_key, 'telegram:photo:1')
+            self.assertTrue(os.path.exists(stored.photo_path))
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_media_file_of_a_failing_submission_is_kept(self):
+        file_path = os.path.join(self.db_dir.name, 'photo.jpg')
+        with open(file_path, 'wb') as f:
+            f.write(b'white rabbit')
+        message = dict(self.message('photo', to_contact='Morpheus'),
+                       media_file=(file_path, 'telegram:photo:1'))
+        with patch.object(helpers, 'get_user_data_dir_path', return_value=self.db_dir.name):
+            future = self.worker.submit('telegram', [message])
+            self.run_worker()
+        self.assertIsInstance(future.exception(), pw.IntegrityError)
+        self.assertTrue(os.path.exists(file_path))
+        self.assertEqual(db.Media.select().count(), 0)
+
+    def test_futures_fail_when_reading_the_stored_messages_fails(self):
+        future = self.worker.submit('telegram', [self.message('ok')])
+        with patch.object(db, 'get_messages_by_ids', side_effect=pw.OperationalError('locked')):
+            self.run_worker()
+        self.assertIsInstance(future.exception(timeout=1), pw.OperationalError)
+        self.assertEqual(db.UniChatMessage.select().count(), 1)
+
+    def test_submit_after_stop_fails(self):
+        self.worker.stop()
+        future = self.worker.submit('telegram', [self.message('late')])
+        self.assertIsInstance(future.exception(), RuntimeError)
+        self.assertTrue(self.worker.queue.empty())
+
+    def test_touched_media_is_written_by_the_worker(self):
+        media = db.Media.create(content_hash='a', path='a.jpg', size=1, last_access=0)
+        client = ChatClient('telegram')
+        client.persistence = self.worker
+        client.touch_media([media.id])
+        client.touch_media([media.id])
+        self.assertEqual(db.Media.get_by_id(media.id).last_access, 0)
+        with patch.object(self.test_db, 'execute_sql', wraps=self.test_db.execute_sql) as execute_sql:
+            self.run_worker()
+        self.assertGreater(db.Media.get_by_id(media.id).last_access, 0)
+        self.assertEqual(sum('UPDATE' in call.args[0] for call in execute_sql.call_args_list), 1)
+
+    def test_store_messages_does_not_wait_for_the_writer(self):
+        client = ChatClient('telegram')
+        client.persistence = self.worker
+        ids = client.store_messages([self.message('ok')])
+        self.assertFalse(ids.done())
+        self.run_worker()
+        self.assertEqual(ids.result(), [db.UniChatMessage.get(text='ok').id])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+
+import unichat.workers.poll_scheduler as poll_scheduler
+from unichat.workers.poll_scheduler import PollScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPollScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = PollScheduler('whatsapp', base_interval=0.25, max_interval=2,
+                                       backoff_factor=2, clock=self.clock)
+        self.addCleanup(poll_scheduler.set_app_hidden, False)
+
+    def test_backs_off_while_idle(self):
+        delays = []
+        for _ in range(5):
+            self.scheduler.record(False)
+            delays.append(self.scheduler.get_delay())
+        self.assertEqual(delays, [0.5, 1, 2, 2, 2])
+
+    def test_snaps_back_on_activity(self):
+        for _ in range(4):
+            self.scheduler.record(False)
+        self.scheduler.record(True)
+        self.assertEqual(self.scheduler.get_delay(), 0.25)
+
+    def test_wake(self):
+        for _ in range(4):
+            self.scheduler.record(False)
+        self.scheduler.wake()
+        self.assertEqual(self.scheduler.get_delay(), 0.25)
+        # the waiting loop returns right away
+        self.assertTrue(self.scheduler.wait())
+
+    def test_hidden_app_stretches_the_interval(self):
+        poll_scheduler.set_app_hidden(True)
+        self.assertEqual(self.scheduler.get_delay(), 0.25 * poll_scheduler.config.poll_hidden_factor)
+        self.scheduler.record(False)
+        poll_scheduler.set_app_hidden(False)
+        # showing the window polls right away at the base interval
+        self.assertEqual(self.scheduler.get_delay(), 0.25)
+        self.assertTrue(self.scheduler.wait())
+
+    def test_metrics(self):
+        for hit in [False, True, False, False]:
+            self.scheduler.record(hit)
+        metrics = poll_scheduler.get_poll_metrics()['whatsapp']
+        self.assertEqual(metrics, {'interval_sec': 1, 'polls': 4, 'hits': 1, 'hit_rate': 0.25})
+
+    def test_metrics_are_logged(self):
+        with patch.object(poll_scheduler.logging, 'info') as info:
+            self.scheduler.record(False)
+            info.assert_not_called()
+            self.clock.now = poll_scheduler.config.poll_metrics_log_interval_sec
+            self.scheduler.record(False)
+            info.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from PySide6.QtCore import QObject
+
+from unichat.workers.telegram_async_worker import AsyncTelegramClientWorker
+
+
+class TestTelegramSyncChats(unittest.TestCase):
+    def setUp(self):
+        # no telethon session, only the qt object
+        self.worker = AsyncTelegramClientWorker.__new__(AsyncTelegramClientWorker)
+        QObject.__init__(self.worker)
+        self.worker.telethon_client = MagicMock()
+        self.worker.telethon_client.get_messages = AsyncMock(
+            return_value=[SimpleNamespace(id=9, media=None), SimpleNamespace(id=8, media=None)])
+        self.emitted = []
+        self.worker.msg_receive_signal.connect(
+            lambda message, media, media_file: self.emitted.append(message.id))
+        self.tdb = patch('unichat.workers.telegram_async_worker.tdb').start()
+        self.tdb.get_linked_user_ids.return_value = [42]
+        patch('unichat.db.get_unichat_me').start()
+        self.get_sync_state = patch('unichat.db.get_sync_state').start()
+        self.addCleanup(patch.stopall)
+
+    def test_requests_the_messages_after_the_cursor(self):
+        self.get_sync_state.return_value = SimpleNamespace(external_id='7')
+        asyncio.run(self.worker.sync_chats())
+        self.worker.telethon_client.get_messages.assert_awaited_once_with(
+            42, min_id=7, reverse=True, limit=None)
+        # emitted oldest first like new messages
+        self.assertEqual(self.emitted, [8, 9])
+
+    def test_requests_the_latest_messages_without_cursor(self):
+        self.get_sync_state.return_value = None
+        asyncio.run(self.worker.sync_chats())
+        self.worker.telethon_client.get_messages.assert_awaited_once_with(42, limit=64)
+
+
+
+class TestTelegramWorkerStop(unittest.TestCase):
+    def setUp(self):
+        self.worker = AsyncTelegramClientWorker.__new__(AsyncTelegramClientWorker)
+        QObject.__init__(self.worker)
+        self.worker.telethon_client = MagicMock()
+        self.worker.loop = None
+        self.worker._is_running = True
+
+    def test_stop_before_run_does_not_connect(self):
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.worker.stop()
+        self.worker.run()
+        self.worker.telethon_client.start.assert_not_called()
+        self.worker.loop.close()
+
+    def test_stop_disconnects_in_the_worker_loop(self):
+        self.worker.loop = asyncio.new_event_loop()
+        self.addCleanup(self.worker.loop.close)
+        self.worker.stop()
+        self.worker.telethon_client.disconnect.assert_not_called()
+        self.worker.loop.run_until_complete(asyncio.sleep(0))
+        self.worker.telethon_client.disconnect.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.clients.telegram_client.telegram_db as tdb
+from unichat.importers import telegram_export
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, tdb.TelegramContact, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary, db.SyncState]
+
+START = 1704060000
+
+
+def exported_message(i, from_id, text='', **fields):
+    return dict({'id': i, 'type': 'message', 'date': '2024-01-01T00:00:00',
+                 'date_unixtime': str(START + i), 'from': 'x', 'from_id': from_id,
+                 'text': text}, **fields)
+
+
+class TestTelegramExport(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(helpers, 'get_user_data_dir_path', return_value=self.data_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        self.me = db.add_contact('Neo', is_me=True)
+        self.trinity = db.add_contact('Trinity')
+        tdb.TelegramContact.create(user_id=1, first_name='Neo', contact=self.me)
+        tdb.TelegramContact.create(user_id=2, first_name='Trinity', contact=self.trinity)
+
+        os.makedirs(os.path.join(self.data_dir.name, 'export', 'photos'))
+        with open(os.path.join(self.data_dir.name, 'export', 'photos', 'photo_1.jpg'), 'wb') as f:
+            f.write(b'white rabbit')
+        # an export of all chats, with a chat of a contact that is not linked
+        self.export = {
+            'about': 'Here is the data you requested.',
+            'personal_information': {'user_id': 1, 'first_name': 'Neo'},
+            'chats': {'about': 'chats', 'list': [
+                {'name': 'Morpheus', 'type': 'personal_chat', 'id': 3,
+                 'messages': [exported_message(1, 'user3', 'red pill')]},
+                {'name': 'Trinity', 'type': 'personal_chat', 'id': 2, 'messages': [
+                    {'id': 2, 'type': 'service', 'date_unixtime': str(START), 'actor_id': 'user2',
+                     'action': 'phone_call'},
+                    exported_message(3, 'user2', ['follow the ', {'type': 'bold', 'text': 'white rabbit'}]),
+                    exported_message(4, 'user1', 'ok'),
+                    exported_message(4, 'user1', 'ok'),
+                    exported_message(5, 'user2', photo='photos/photo_1.jpg'),
+                    exported_message(6, 'user2', photo='(File not included. Change data exporting '
+                                                       'settings to download.)', text='lost'),
+                ]},
+            ]},
+        }
+        self.file_path = os.path.join(self.data_dir.name, 'export', 'result.json')
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.export, f, indent=1, ensure_ascii=False)
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        self.data_dir.cleanup()
+        db.invalidate_identity_caches()
+
+    def test_stream_matches_json(self):
+        with open(self.file_path, encoding='utf-8') as f:
+            # a tiny read size splits the values between the reads
+            streamed = list(telegram_export.iter_chat_messages(f, read_size=7))
+        expected = [({key: value for key, value in chat.items() if key != 'messages'}, message)
+                    for chat in self.export['chats']['list'] for message in chat['messages']]
+        self.assertEqual(streamed, expected)
+        empty = list(telegram_export.iter_chat_messages(io.StringIO('{"messages": [], "list": [1, {}]}')))
+        self.assertEqual(empty, [])
+
+    def test_import_is_idempotent(self):
+        # a message that the live client synced already
+        db.save_messages_bulk('telegram', [{
+            'from_contact': self.me, 'to_contact': self.trinity, 'text': 'ok',
+            'timestamp': datetime.datetime.fromtimestamp(START + 4, tz=datetime.timezone.utc),
+            'external_id': '4'}])
+
+        # the message with the id 4 is stored already, twice in the export
+        self.assertEqual(telegram_export.import_result_json(self.file_path), 3)
+        messages = db.get_unichat_message('Neo', 'Trinity', 'telegram')
+        self.assertEqual([m.text for m in reversed(messages)],
+                         ['follow the white rabbit', 'ok', '', 'lost'])
+        photo = messages[1]
+        self.assertEqual(photo.from_contact, self.trinity)
+        with open(photo.photo_path, 'rb') as f:
+            self.assertEqual(f.read(), b'white rabbit')
+        self.assertEqual(db.ConversationSummary.get().unread_count, 0)
+
+        self.assertEqual(telegram_export.import_result_json(self.file_path), 0)
+        self.assertEqual(db.UniChatMessage.select().count(), 4)
+        self.assertEqual(db.UniChatMessage.get(text='lost').external_id, '6')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.clients.whatsapp_client.whatsapp_chat_list as whatsapp_chat_list
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+from unichat.workers.whatsapp_worker import WhatsappAsyncFetcherWorker
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, wdb.WhatsAppContact]
+
+
+def row(name, time, preview, unread=0):
+    return {'name': name, 'time': time, 'preview': preview, 'unread': unread}
+
+
+class TestWhatsAppChatList(unittest.TestCase):
+    def setUp(self):
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        me = db.add_contact('Neo', is_me=True)
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Neo A.', is_linked=True, contact=me)
+        for name in ['Trinity', 'Morpheus', 'Tank']:
+            wdb.WhatsAppContact.create(phone_nr='-', chat_name=name, is_linked=name != 'Tank',
+                                       contact=db.add_contact(name))
+        self.client = MagicMock()
+        self.client.get_latest_messages_of_chats.return_value = []
+        self.worker = WhatsappAsyncFetcherWorker(self.client, None)
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        db.invalidate_identity_caches()
+
+    def test_linked_chat_names(self):
+        self.assertEqual(wdb.get_linked_chat_names(), {'Trinity', 'Morpheus'})
+
+    def test_find_changed_chats(self):
+        seen = {}
+        rows = [row('Trinity', '10:01', 'hi', unread=2), row('Morpheus', '09:00', 'ok'),
+                row('Oracle', '10:02', 'cookies', unread=1)]
+        # at the first scan only the chats with unread messages
+        self.assertEqual(whatsapp_chat_list.find_changed_chats(seen, rows, {'Trinity', 'Morpheus'}),
+                         ['Trinity'])
+        # the badge is gone after the chat was opened
+        rows[0] = row('Trinity', '10:01', 'hi')
+        self.assertEqual(whatsapp_chat_list.find_changed_chats(seen, rows, {'Trinity', 'Morpheus'}), [])
+        rows[1] = row('Morpheus', '10:03', 'ok', unread=1)
+        self.assertEqual(whatsapp_chat_list.find_changed_chats(seen, rows, {'Trinity', 'Morpheus'}),
+                         ['Morpheus'])
+
+    def test_watcher_opens_only_changed_chats(self):
+        self.client.get_chat_list.return_value = [row('Trinity', '10:01', 'hi'), row('Morpheus', '09:00', 'ok'),
+                                                  row('Tank', '10:00', 'hey', unread=3)]
+        self.worker.watch_chats()
+        self.client.get_latest_messages_of_chats.assert_not_called()
+
+        messages = [{'text': 'new'}]
+        self.client.get_latest_messages_of_chats.return_value = messages
+        self.client.get_chat_list.return_value = [row('Morpheus', '10:05', 'new', unread=1),
+                                                  row('Trinity', '10:01', 'hi')]
+        self.worker.watch_chats()
+        self.client.get_latest_messages_of_chats.assert_called_once_with(['Morpheus'], None)
+        self.client.save_messages.assert_called_once_with(messages)
+
+    def test_watcher_skips_the_target_chat(self):
+        self.worker.chat_name = 'Trinity'
+        self.client.get_chat_list.return_value = [row('Trinity', '10:01', 'hi', unread=1)]
+        self.worker.watch_chats()
+        self.client.get_latest_messages_of_chats.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+from unichat.importers import whatsapp_export
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, wdb.WhatsAppContact, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary]
+
+ANDROID_EXPORT = [
+    '31.12.23, 22:14 - Messages and calls are end-to-end encrypted.\n',
+    '31.12.23, 22:15 - Trinity: follow the white rabbit\n',
+    'knock, knock\n',
+    '31.12.23, 22:15 - Neo: who is there?\n',
+    '31.12.23, 22:16 - Trinity: IMG-20231231-WA0001.jpg (file attached)\n',
+]
+IOS_EXPORT = [
+    '[12/31/23, 10:15:07 PM] Trinity: follow the white rabbit\n',
+    '[12/31/23, 10:16:00 PM] Neo: ‎<attached: 00000012-PHOTO-2023-12-31.jpg>\n',
+]
+
+
+class TestWhatsAppExport(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(helpers, 'get_user_data_dir_path', return_value=self.data_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        self.me = db.add_contact('Neo', is_me=True)
+        self.trinity = db.add_contact('Trinity')
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        self.data_dir.cleanup()
+        db.invalidate_identity_caches()
+
+    def write_export(self, name, lines, photo=None):
+        file_path = os.path.join(self.data_dir.name, name)
+        if photo is None:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            with zipfile.ZipFile(file_path, 'w') as archive:
+                archive.writestr('_chat.txt', ''.join(lines))
+                archive.writestr(photo, b'white rabbit')
+        return file_path
+
+    def test_parse_android_and_ios(self):
+        self.assertTrue(whatsapp_export.detect_day_first(ANDROID_EXPORT))
+        self.assertFalse(whatsapp_export.detect_day_first(IOS_EXPORT))
+        android = list(whatsapp_export.parse_chat_export(ANDROID_EXPORT, day_first=True))
+        ios = list(whatsapp_export.parse_chat_export(IOS_EXPORT, day_first=False))
+
+        self.assertEqual([m['sender'] for m in android], ['Trinity', 'Neo', 'Trinity'])
+        self.assertEqual(android[0]['text'], 'follow the white rabbit\nknock, knock')
+        self.assertEqual(android[2]['attachment'], 'IMG-20231231-WA0001.jpg')
+        self.assertIsNone(android[2]['text'])
+        self.assertEqual(ios[1]['attachment'], '00000012-PHOTO-2023-12-31.jpg')
+        # the same local minute in both formats, like the web client shows it
+        self.assertEqual(android[0]['timestamp'], ios[0]['timestamp'])
+        self.assertEqual(android[0]['timestamp'].isoformat(),
+                         helpers.string_to_utc_timestamp('22:15, 31.12.2023'))
+
+    def test_import_zip_with_photo(self):
+        file_path = self.write_export('WhatsApp Chat - Trinity.zip', ANDROID_EXPORT,
+                                      photo='IMG-20231231-WA0001.jpg')
+        self.assertEqual(whatsapp_export.import_chat_export(file_path, self.trinity), 3)
+
+        whatsapp_contact = wdb.get_whatsapp_contact(self.trinity)
+        self.assertEqual(whatsapp_contact.chat_name, 'Trinity')
+        self.assertTrue(whatsapp_contact.is_linked)
+        messages = db.get_unichat_message('Neo', 'Trinity', 'whatsapp')
+        self.assertEqual([m.from_contact.name for m in messages], ['Trinity', 'Neo', 'Trinity'])
+        photo = messages[0]
+        self.assertIsNotNone(photo.media)
+        with open(photo.photo_path, 'rb') as f:
+            self.assertEqual(f.read(), b'white rabbit')
+        summary = db.ConversationSummary.get()
+        self.assertEqual(summary.unread_count, 0)
+
+        # a second import adds nothing
+        self.assertEqual(whatsapp_export.import_chat_export(file_path, self.trinity), 0)
+        self.assertEqual(db.UniChatMessage.select().count(), 3)
+        self.assertEqual(db.Media.select().count(), 1)
+
+    def test_scraped_messages_are_not_imported_again(self):
+        db.save_messages_bulk('whatsapp', [{'from_contact': self.me,
+                                            'to_contact': self.trinity,
+                                            'text': 'who is there?',
+                                            'timestamp': helpers.string_to_utc_timestamp('22:15, 31.12.2023')}])
+        file_path = self.write_export('trinity.txt', ANDROID_EXPORT)
+        with self.assertRaises(ValueError):
+            # renamed file of an unlinked contact
+            whatsapp_export.import_chat_export(file_path, self.trinity)
+        self.assertEqual(whatsapp_export.import_chat_export(file_path, self.trinity, chat_name='Trinity'), 2)
+        self.assertEqual(db.UniChatMessage.select().count(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import peewee as pw
+
+import unichat.config as config
+import unichat.db as db
+import unichat.dom_extractor as dom_extractor
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+from unichat.clients.whatsapp_client.whatsapp_client import WhatsAppClient
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, wdb.WhatsAppContact, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary, db.SyncState]
+
+
+class VirtualizedChat:
+    """ fake driver of a chat that only renders `size` blocks and recycles the others """
+
+    def __init__(self, blocks, size, step):
+        self.blocks = blocks
+        self.size = size
+        self.step = step
+        self.top = len(blocks) - size
+        self.extractions = 0
+
+    def execute_script(self, script, *args):
+        if script == dom_extractor.EXTRACT_SCRIPT:
+            self.extractions += 1
+            _, _, start, end = args
+            return self.blocks[self.top:self.top + self.size][start:end]
+        if 'scrollTo' in script:
+            self.top = max(0, self.top - self.step)
+
+    def find_element(self, *args):
+        return MagicMock()
+
+
+class TestWhatsAppHistory(unittest.TestCase):
+    def setUp(self):
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        me = db.add_contact('Neo', is_me=True)
+        trinity = db.add_contact('Trinity')
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Neo A.', is_linked=True, contact=me)
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Trinity', is_linked=True, contact=trinity)
+        # 60 messages, three per minute, the same text twice in a minute
+        self.blocks = [{'id': f'msg{i}', 'metadata': f'[22:{i // 3:02d}, 31.12.2023] Trinity: ',
+                        'text': 'ok' if i % 3 else f'message {i}', 'sender': None, 'timestamp': None,
+                        'is_own': None, 'media': []}
+                       for i in range(60)]
+        self.chat = VirtualizedChat(self.blocks, size=10, step=7)
+        self.client = WhatsAppClient.__new__(WhatsAppClient)
+        self.client.name = 'whatsapp'
+        self.client.persistence = None
+        self.client.time_sender_regex = r'\[(?P<datetime>.+)\]\s(?P<sender>.+):'
+        self.client.whatsapp_me = 'Neo A.'
+        self.client._driver_window_handle = 'tab'
+        self.client.dm = MagicMock()
+        self.client.dm.get_chromedriver.return_value = self.chat
+        patch.object(WhatsAppClient, 'search_and_select_chat').start()
+        patch.object(config, 'timeout_limit_short', 0.1).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        db.invalidate_identity_caches()
+
+    def test_windows_capture_the_whole_history(self):
+        windows = list(self.client._iter_message_windows('Trinity'))
+        self.assertGreater(len(windows), 1)
+        # every window is at most a rendered window plus the held back minute
+        self.assertTrue(all(len(window) <= self.chat.size + 3 for window in windows))
+        self.assertEqual(sum(len(window) for window in windows), 60)
+        # a minute is never split between two windows
+        minutes = [{message['timestamp'] for message in window} for window in windows]
+        for i, window_minutes in enumerate(minutes):
+            for other in minutes[i + 1:]:
+                self.assertFalse(window_minutes & other)
+
+    def test_iter_chat_messages_releases_the_driver_lock_between_windows(self):
+        lock = self.client.dm.mutexLock
+        windows = self.client.iter_chat_messages('Trinity')
+        # the oldest minute of the window is held back
+        self.assertEqual(len(next(windows)), 9)
+        self.assertEqual(lock.__enter__.call_count, lock.__exit__.call_count)
+        self.assertEqual(sum(len(window) for window in windows), 51)
+        self.assertEqual(lock.__enter__.call_count, lock.__exit__.call_count)
+
+    def test_scraping_resumes_after_another_command_used_the_chat(self):
+        windows = self.client.iter_chat_messages('Trinity')
+        messages = next(windows) + next(windows)
+        # e.g. the fetcher selected the chat again, it is scrolled to the bottom
+        self.chat.top = len(self.blocks) - self.chat.size
+        messages += [message for window in windows for message in window]
+        self.assertEqual(sorted(message['external_id'] for message in messages),
+                         sorted(block['id'] for block in self.blocks))
+
+    def test_messages_after_the_sync_cursor(self):
+        messages = self.client._get_messages_after('Trinity', 'msg55')
+        # msg54 and msg56 share the minute of the cursor
+        self.assertEqual([m['external_id'] for m in messages], [f'msg{i}' for i in range(54, 60)])
+        self.assertEqual(self.client._get_messages_after('Trinity', 'msg59'), [])
+        self.assertIsNone(self.client._get_messages_after('Trinity', 'msg10'))
+
+    def test_store_history(self):
+        self.assertEqual(self.client._execute_store_history('Trinity'), 60)
+        self.assertEqual(db.UniChatMessage.select().count(), 60)
+        conversation_key = self.client._get_conversation_key('Trinity')
+        self.assertEqual(db.get_sync_state('whatsapp', conversation_key).external_id, 'msg59')
+        self.chat.top = len(self.blocks) - self.chat.size
+        self.assertEqual(self.client._execute_store_history('Trinity'), 0)
+
+    def test_stops_at_the_last_stored_message(self):
+        self.client._execute_store_history('Trinity')
+        self.chat.top = len(self.blocks) - self.chat.size
+        last_stored = db.UniChatMessage.select(pw.fn.MAX(db.UniChatMessage.timestamp)).scalar()
+        messages = self.client._execute_get_messages('Trinity', enable_limit=True,
+                                                     last_message_timestamp=last_stored)
+        self.assertLess(len(messages), 20)
+        self.assertEqual(messages[-1]['text'], 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import peewee as pw
+
+import unichat.db as db
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+import unichat.clients.whatsapp_client.whatsapp_observer as whatsapp_observer
+from unichat.clients.whatsapp_client.whatsapp_client import WhatsAppClient
+
+
+test_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+models = [db.Contact, db.Media, wdb.WhatsAppContact, db.UniChatMessage, db.UniChatMessageSearch,
+          db.ConversationSummary]
+
+
+class TestWhatsAppObserver(unittest.TestCase):
+    def setUp(self):
+        test_db.bind(models)
+        test_db.connect()
+        test_db.create_tables(models)
+        me = db.add_contact('Neo', is_me=True)
+        trinity = db.add_contact('Trinity')
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Neo A.', is_linked=True, contact=me)
+        wdb.WhatsAppContact.create(phone_nr='-', chat_name='Trinity', is_linked=True, contact=trinity)
+        # no browser, the driver commands run directly
+        self.client = WhatsAppClient.__new__(WhatsAppClient)
+        self.client.name = 'whatsapp'
+        self.client.time_sender_regex = r'\[(?P<datetime>.+)\]\s(?P<sender>.+):'
+        self.client.whatsapp_me = 'Neo A.'
+        self.client.selected_chat = None
+        self.client._driver_window_handle = 'tab'
+        self.client.dm = MagicMock()
+        self.client.dm.execute_driver_command.side_effect = lambda func, *args: func(*args)
+        self.rescan = patch.object(WhatsAppClient, '_execute_get_latest_messages',
+                                   side_effect=self.select_chat).start()
+        self.install = patch.object(whatsapp_observer, 'install').start()
+        self.drain = patch.object(whatsapp_observer, 'drain').start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        test_db.drop_tables(models)
+        test_db.close()
+        db.invalidate_identity_caches()
+
+    def select_chat(self, chat_name):
+        self.client.selected_chat = chat_name
+        return []
+
+    def test_drains_the_buffer_of_the_open_chat(self):
+        self.drain.return_value = []
+        self.assertEqual(self.client.get_new_messages('Trinity'), [])
+        # the first call rescans the chat and installs the observer
+        self.rescan.assert_called_once_with('Trinity')
+        self.install.assert_called_once()
+
+        self.drain.return_value = [{'id': 'a', 'pre_plain_text': '[22:15, 31.12.2023] Trinity: ',
+                                    'text': 'follow the white rabbit'},
+                                   {'id': 'b', 'pre_plain_text': None, 'text': 'no metadata'}]
+        messages = self.client.get_new_messages('Trinity')
+        self.assertEqual(self.rescan.call_count, 1)
+        self.assertEqual([(m['from_contact'].name, m['to_contact'].name, m['text']) for m in messages],
+                         [('Trinity', 'Neo', 'follow the white rabbit')])
+
+    def test_rescans_after_a_gap(self):
+        self.drain.return_value = []
+        self.client.get_new_messages('Trinity')
+        # the page was reloaded or the buffer overflowed
+        self.drain.return_value = None
+        self.assertEqual(self.client.get_new_messages('Trinity'), [])
+        self.assertEqual(self.rescan.call_count, 2)
+        # another chat was opened
+        self.drain.return_value = []
+        self.client.selected_chat = 'Morpheus'
+        self.client.get_new_messages('Trinity')
+        self.assertEqual(self.rescan.call_count, 3)
+
+    def test_target_observer_survives_watching_other_chats(self):
+        self.drain.return_value = []
+        self.client.get_new_messages('Trinity')
+        self.client.get_latest_messages_of_chats(['Morpheus', 'Oracle'], 'Trinity')
+        # the other chats were opened, the target last
+        self.assertEqual([call.args[0] for call in self.rescan.call_args_list],
+                         ['Trinity', 'Morpheus', 'Oracle', 'Trinity'])
+        self.assertEqual(self.client.selected_chat, 'Trinity')
+        # the next poll drains the observer without a rescan
+        self.client.get_new_messages('Trinity')
+        self.assertEqual(self.rescan.call_count, 4)
+        self.assertEqual(self.install.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
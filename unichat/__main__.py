@@ -1,6 +1,11 @@
-from .app import run_app
+import sys
 
 
 if __name__ == '__main__':
+    from .cli import COMMANDS
+    if sys.argv[1:2] and sys.argv[1] in COMMANDS:
+        # command line, e.g. python -m unichat export <file>
+        from .cli import main
+        sys.exit(main(sys.argv[1:]))
+    from .app import run_app
     run_app()
-
@@ -7,6 +7,7 @@ import traceback
 
 # external imports
 import telethon.tl.custom.message
+from PySide6.QtCore import QCoreApplication, QEvent
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
     QApplication,
@@ -14,19 +15,25 @@ from PySide6.QtWidgets import (
     QWidget,
     QStackedWidget,
     QHBoxLayout,
+    QVBoxLayout,
 )
 
 # project imports
 import unichat.db as db
+import unichat.migrations as migrations
+import unichat.workers.poll_scheduler as poll_scheduler
+from unichat.clients.instagram_client.instagram_client import InstagramClient
 from unichat.clients.telegram_client.telegram_client import SyncTelegramClient
 from unichat.clients.whatsapp_client.whatsapp_client import WhatsAppClient
 from unichat.config import WINDOW_WIDTH, WINDOW_HEIGHT
-from unichat.driver_manager import DriverManager
+from unichat.driver_manager import DriverPool
 from unichat.helpers import load_stylesheet, get_log_file_path
 from unichat.widgets.chat.chat_container_widget import ChatContainerWidget
 from unichat.widgets.contact_list.contact_list_widget import ContactListWidget
 from unichat.widgets.dialogs.sign_up_dialog import SignUpDialog
+from unichat.widgets.search.message_search_widget import MessageSearchWidget
 from unichat.workers.chat_client_worker import ChatClientWorker
+from unichat.workers.persistence_worker import PersistenceWorker
 from unichat.workers.telegram_async_worker import AsyncTelegramClientWorker
 from unichat.workers.whatsapp_worker import WhatsappAsyncFetcherWorker
 
@@ -51,7 +58,14 @@ class UniChat(QMainWindow):
         """
         super().__init__()
         # unichat code
+        migrations.run()
         db.init_storage()
+        # single writer of the incoming messages
+        self.persistence = ChatClientWorker(
+            worker=PersistenceWorker(),
+            sub_func=self.handle_stored_messages
+        )
+        self.persistence.execute_async_worker()
         # contacts is used for tab switching and maps contact name to indexes
         self.contacts: dict = {}
         # chats maps the contact name to the chat container
@@ -59,24 +73,32 @@ class UniChat(QMainWindow):
 
         # telegram code
         self.sync_telegram_client = SyncTelegramClient()
+        self.sync_telegram_client.persistence = self.persistence.worker
         self.async_telegram_client = None
         self.telethon_thread = None
         self.init_telegram_event_loop()
 
         # selenium driver code
-        self.selenium_driver_manager = DriverManager()
+        self.selenium_driver_pool = DriverPool()
 
         # whatsapp code
-        self.sync_whatsapp_client = WhatsAppClient(self.selenium_driver_manager)
+        self.sync_whatsapp_client = WhatsAppClient(
+            self.selenium_driver_pool.get_driver_manager('whatsapp'))
+        self.sync_whatsapp_client.persistence = self.persistence.worker
         self.async_whatsapp_target = None
         self.async_whatsapp_fetcher = ChatClientWorker(
-            worker=WhatsappAsyncFetcherWorker(self.sync_whatsapp_client, self.async_whatsapp_target),
-            sub_func=self.handle_whatsapp_recv_msg
+            worker=WhatsappAsyncFetcherWorker(self.sync_whatsapp_client, self.async_whatsapp_target)
         )
         self.async_whatsapp_fetcher.execute_async_worker()
 
+        # instagram code
+        self.sync_instagram_client = InstagramClient(
+            self.selenium_driver_pool.get_driver_manager('instagram'))
+        self.sync_instagram_client.persistence = self.persistence.worker
+
         # gui code
         self.central_widget = QWidget()
+        self.message_search = MessageSearchWidget()
         self.contact_list = ContactListWidget()
         self.chat_containers = QStackedWidget()
         self.init_ui()
@@ -100,9 +122,18 @@ class UniChat(QMainWindow):
         self.contact_list.list_widget.itemClicked.connect(
             self.handle_contact_list_signal
         )
-        layout.addWidget(self.contact_list)
-        self.contact_list.setMinimumWidth(300)
-        self.contact_list.setMaximumWidth(300)
+        self.message_search.message_selected.connect(
+            self.handle_message_search_signal
+        )
+        # search panel on top of the contact list
+        side_panel = QWidget()
+        side_layout = QVBoxLayout(side_panel)
+        side_layout.setContentsMargins(0, 0, 0, 0)
+        side_layout.addWidget(self.message_search)
+        side_layout.addWidget(self.contact_list)
+        side_panel.setMinimumWidth(300)
+        side_panel.setMaximumWidth(300)
+        layout.addWidget(side_panel)
         layout.addWidget(self.chat_containers)
         self.setLayout(layout)
 
@@ -121,7 +152,8 @@ class UniChat(QMainWindow):
         """
         self.contacts[contact.name] = len(self.contacts)
         chat_clients = [self.sync_telegram_client,
-                        self.sync_whatsapp_client]
+                        self.sync_whatsapp_client,
+                        self.sync_instagram_client]
         self.chats[contact.name] = ChatContainerWidget(contact, chat_clients)
         self.chat_containers.addWidget(self.chats[contact.name])
         self.chats[contact.name].profile_pic_update.connect(
@@ -133,7 +165,19 @@ class UniChat(QMainWindow):
         event handler for reacting to mouse clicks on contact items
 
         """
-        contact = contact_item.data(101).contact
+        self.show_chat(contact_item.data(101).contact)
+
+    def handle_message_search_signal(self, contact, chat_client_name):
+        """
+        opens the chat of a selected search result
+        """
+        self.show_chat(contact)
+        self.chats[contact.name].show_chat_client(chat_client_name)
+
+    def show_chat(self, contact):
+        """
+        switches to the chat container of the contact
+        """
         if contact.name not in self.chats:
             self.setup_chats(contact)
 
@@ -163,13 +207,16 @@ class UniChat(QMainWindow):
             self.async_whatsapp_target = None
             self.async_whatsapp_fetcher.change_target(self.async_whatsapp_target)
 
-    def handle_whatsapp_recv_msg(self, unichat_messages: list[db.UniChatMessage]):
-        """ handler for incoming whatsapp messages """
+    def handle_stored_messages(self, unichat_messages: list[db.UniChatMessage]):
+        """ handler for the messages written by the persistence worker """
         try:
+            me = db.get_unichat_me()
             for uc_msg in unichat_messages:
-                chat_contact = uc_msg.from_contact if uc_msg.to_contact == db.get_unichat_me() else uc_msg.to_contact
-                self.chats[chat_contact.name].update_chat_history(uc_msg, 'whatsapp')
-        except Exception as e:
+                chat_contact = uc_msg.from_contact if uc_msg.to_contact == me else uc_msg.to_contact
+                # the chat of the contact is set up when it is opened
+                if chat_contact.name in self.chats:
+                    self.chats[chat_contact.name].update_chat_history(uc_msg, uc_msg.chat_client)
+        except Exception:
             logging.error(traceback.format_exc())
 
     def init_telegram_event_loop(self):
@@ -183,22 +230,62 @@ class UniChat(QMainWindow):
         )
         self.async_telegram_client.execute_async_worker()
 
-    def handle_telegram_recv_msg(self, message: telethon.tl.custom.message.Message):
-        """ handler for incoming telegram messages """
+    def handle_telegram_recv_msg(self,
+                                 message: telethon.tl.custom.message.Message,
+                                 media: db.Media | None,
+                                 media_file: str | None):
+        """
+        handler for incoming telegram messages, the photo is in the media
+        store or downloaded to `media_file`. the message is queued for the
+        persistence worker, which stores the photo and announces the message
+        """
         try:
-            uc_msg = self.sync_telegram_client.save_message(message)
-            chat_contact = uc_msg.from_contact if uc_msg.to_contact == db.get_unichat_me() else uc_msg.to_contact
-            self.chats[chat_contact.name].update_chat_history(uc_msg, 'telegram')
-        except Exception as e:
+            uc_msg = self.sync_telegram_client.to_unichat_message(message, media, media_file)
+            self.persistence.worker.submit(self.sync_telegram_client.name, [uc_msg])
+        except Exception:
             logging.error(traceback.format_exc())
 
+    def changeEvent(self, event):
+        """ the background fetchers slow down while the window is minimized """
+        if event.type() == QEvent.Type.WindowStateChange:
+            poll_scheduler.set_app_hidden(self.isMinimized())
+        super().changeEvent(event)
+
+    def hideEvent(self, event):
+        """ the background fetchers slow down while the window is hidden """
+        poll_scheduler.set_app_hidden(True)
+        super().hideEvent(event)
+
+    def showEvent(self, event):
+        """ the background fetchers poll fast again when the window is shown """
+        poll_scheduler.set_app_hidden(self.isMinimized())
+        super().showEvent(event)
+
     def close_event(self, event):
         """ clean up code for selenium driver and async workers"""
+        # the fetcher uses the drivers and submits messages, it stops first
         self.async_whatsapp_fetcher.stop_worker()
-        self.selenium_driver_manager.close_driver()
+        self.async_whatsapp_fetcher.thread.quit()
+        self.async_whatsapp_fetcher.thread.wait()
+        self.selenium_driver_pool.close_drivers()
+        # the telegram worker emits messages that are submitted in this
+        # thread, it stops and its pending messages are submitted first
+        self.async_telegram_client.stop_worker()
+        self.async_telegram_client.thread.quit()
+        self.async_telegram_client.thread.wait()
+        QCoreApplication.sendPostedEvents()
+        # write the queued messages before the app exits
+        self.persistence.stop_worker()
+        self.persistence.thread.quit()
+        self.persistence.thread.wait()
+        db.close_thread_connection()
         # Accept the close event to proceed with closing the window
         event.accept()
 
+    def closeEvent(self, event):
+        """ qt close event handler """
+        self.close_event(event)
+
 
 def run_app():
     app = QApplication(sys.argv)
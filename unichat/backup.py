@@ -0,0 +1,249 @@
+"""
+streaming export and import of the message store as NDJSON, e.g. to move
+a history to another machine or to back it up.
+
+the first line is a header, every other line is one row:
+{"table": "contact", "row": {...}}. the rows reference contacts by their
+name, since the ids differ between stores. a message carries the
+occurrence number of its dedup hash instead of the hash, the importing
+store hashes it with its own ids. the rows are read with server side
+cursors and written line by line, an import inserts them in chunks, so
+the memory use does not depend on the size of the history. a path that
+ends with .gz is compressed with gzip
+"""
+import gzip
+import itertools
+import json
+import logging
+
+# external imports
+import peewee as pw
+
+# project imports
+import unichat.config as config
+import unichat.db as db
+import unichat.clients.instagram_client.instagram_db as idb
+import unichat.clients.telegram_client.telegram_db as tdb
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+
+FORMAT = 'unichat-ndjson'
+FORMAT_VERSION = 1
+# the highest occurrence number an export looks for, see `get_occurrence`
+MAX_OCCURRENCE = 100
+
+# exported columns per table, in import order (contacts before the rows
+# that reference them). surrogate ids and derived columns are left out
+TABLES = {
+    'contact': (db.Contact, ['name', 'profile_pic_path', 'is_me']),
+    'whatsappcontact': (wdb.WhatsAppContact, ['phone_nr', 'chat_name', 'is_linked', 'contact']),
+    'telegramcontact': (tdb.TelegramContact, ['user_id', 'first_name', 'last_name', 'username',
+                                              'contact']),
+    'instagramcontact': (idb.InstagramContact, ['web_link', 'chat_name', 'contact']),
+    'unichatmessage': (db.UniChatMessage, ['from_contact', 'to_contact', 'chat_client', 'text',
+                                           'photo_path', 'video_path', 'timestamp', 'dedup_hash',
+                                           'external_id']),
+}
+# contact reference columns per table
+CONTACT_COLUMNS = {
+    'whatsappcontact': ['contact'],
+    'telegramcontact': ['contact'],
+    'instagramcontact': ['contact'],
+    'unichatmessage': ['from_contact', 'to_contact'],
+}
+
+
+def _open(file_path: str, mode: str):
+    """ opens a text file, gzip compressed if the path ends with .gz """
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, mode + 't', encoding='utf-8')
+    return open(file_path, mode, encoding='utf-8')
+
+
+def get_occurrence(row: dict, from_key, to_key) -> int | None:
+    """
+    occurrence number of the dedup hash of a message row, i.e. which of
+    the identical messages it is. None if it is not found, e.g. for a
+    timestamp that could not be parsed when it was hashed
+    """
+    hash_args = (row['chat_client'], from_key, to_key, row['timestamp'],
+                 row['text'], row['photo_path'], row['video_path'])
+    for occurrence in range(MAX_OCCURRENCE):
+        if db.get_message_hash(*hash_args, occurrence=occurrence,
+                               external_id=row.get('external_id')) == row['dedup_hash']:
+            return occurrence
+    return None
+
+
+def _select_rows(table: str) -> pw.ModelSelect:
+    """ selects the exported columns of `table` with the contact names """
+    model, columns = TABLES[table]
+    fields = []
+    query = model.select()
+    for column in columns:
+        if column in CONTACT_COLUMNS.get(table, []):
+            contact = db.Contact.alias()
+            fields.append(contact.name.alias(column))
+            query = query.join_from(model, contact, on=model._meta.fields[column])
+        else:
+            fields.append(model._meta.fields[column])
+    if table == 'unichatmessage':
+        fields += [model.from_contact.alias('from_contact_id'),
+                   model.to_contact.alias('to_contact_id')]
+    return query.select(*fields).order_by(model._meta.primary_key).dicts()
+
+
+def export_store(file_path: str) -> dict[str, int]:
+    """
+    writes all tables to `file_path`, returns the exported rows per table
+    """
+    counts = {}
+    with _open(file_path, 'w') as f:
+        f.write(json.dumps({'format': FORMAT, 'version': FORMAT_VERSION}) + '\n')
+        for table in TABLES:
+            counts[table] = 0
+            # iterator() does not keep the fetched rows in the query cache
+            for row in _select_rows(table).iterator():
+                if table == 'unichatmessage':
+                    occurrence = get_occurrence(row, row.pop('from_contact_id'),
+                                                row.pop('to_contact_id'))
+                    if occurrence is not None:
+                        row['occurrence'] = occurrence
+                        del row['dedup_hash']
+                f.write(json.dumps({'table': table, 'row': row}, ensure_ascii=False) + '\n')
+                counts[table] += 1
+            logging.info('exported %s %s rows', counts[table], table)
+    return counts
+
+
+def _insert_contacts(model, key: pw.Field, rows: list[dict]) -> int:
+    """
+    inserts the rows whose `key` is not stored yet, e.g. a unichat contact
+    that is linked to the client already keeps its link. returns the
+    number of inserted rows
+    """
+    keys = [row[key.name] for row in rows]
+    stored = {value for value, in model.select(key).where(key.in_(keys)).tuples()}
+    rows = [row for row in rows if row[key.name] not in stored]
+    if rows:
+        model.insert_many(rows).execute()
+    return len(rows)
+
+
+def _hash_messages(rows: list[dict]) -> None:
+    """
+    sets the dedup hashes of imported messages with the ids of this store.
+    a message without an occurrence number keeps its exported hash
+    """
+    for row in rows:
+        occurrence = row.pop('occurrence', None)
+        if occurrence is not None:
+            row['dedup_hash'] = db.get_message_hash(row['chat_client'], row['from_contact'],
+                                                    row['to_contact'], row['timestamp'],
+                                                    row['text'],
+                                                    row['photo_path'], row['video_path'],
+                                                    occurrence=occurrence,
+                                                    external_id=row.get('external_id'))
+
+
+def _insert_messages(rows: list[dict]) -> int:
+    """
+    inserts messages with their dedup hash, messages that are stored
+    already are skipped. returns the number of inserted rows
+    """
+    inserted = 0
+    for chat_client, messages in itertools.groupby(rows, key=lambda row: row['chat_client']):
+        inserted += len(db.save_messages_bulk(chat_client, messages))
+    return inserted
+
+
+def _resolve_contacts(table: str, rows: list[dict]) -> list[dict]:
+    """
+    replaces the contact names of the rows with the ids of this store,
+    rows of unknown contacts are dropped
+    """
+    columns = CONTACT_COLUMNS.get(table, [])
+    names = {row[column] for row in rows for column in columns}
+    if not names:
+        return rows
+    contact_ids = dict(db.Contact.select(db.Contact.name, db.Contact.id)
+                       .where(db.Contact.name.in_(list(names))).tuples())
+    resolved = []
+    for row in rows:
+        if any(row[column] not in contact_ids for column in columns):
+            logging.warning('%s row of an unknown contact is skipped', table)
+            continue
+        for column in columns:
+            row[column] = contact_ids[row[column]]
+        resolved.append(row)
+    return resolved
+
+
+def _insert_rows(table: str, rows: list[dict]) -> int:
+    """ inserts a chunk of rows of `table` and skips the known ones """
+    model, _ = TABLES[table]
+    rows = _resolve_contacts(table, rows)
+    if table == 'unichatmessage':
+        _hash_messages(rows)
+        return _insert_messages(rows)
+    if table == 'contact':
+        return _insert_contacts(model, db.Contact.name, rows)
+    if table == 'telegramcontact':
+        return _insert_contacts(model, tdb.TelegramContact.user_id, rows)
+    return _insert_contacts(model, model.contact, rows)
+
+
+def _read_header(f) -> None:
+    """ checks the header of an export file and its format version """
+    header = json.loads(f.readline() or 'null')
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise ValueError('not an unichat export file')
+    if 'version' not in header:
+        raise ValueError('the export file has no version')
+    if header['version'] != FORMAT_VERSION:
+        raise ValueError(f'unsupported export version {header["version"]}')
+
+
+def _read_rows(f):
+    """ yields the (table, row) pairs of an export file """
+    for line in f:
+        if line.strip():
+            record = json.loads(line)
+            if record['table'] not in TABLES:
+                raise ValueError(f'unknown table {record["table"]}')
+            yield record['table'], record['row']
+
+
+def import_store(file_path: str, chunk_size: int = config.db_bulk_chunk_size) -> dict[str, int]:
+    """
+    reads an export file into the store, rows that are stored already
+    are skipped. the rows are inserted in chunks with a commit every
+    `config.db_migration_batch_size` rows. returns the inserted rows
+    per table
+    """
+    database = db.UniChatMessage._meta.database
+    counts = dict.fromkeys(TABLES, 0)
+    pending = 0
+    table = None
+    rows = []
+
+    def flush():
+        nonlocal pending
+        if rows:
+            counts[table] += _insert_rows(table, rows)
+            pending += len(rows)
+            rows.clear()
+        if pending >= config.db_migration_batch_size:
+            transaction.commit(begin=True)
+            pending = 0
+            logging.info('imported %s rows...', sum(counts.values()))
+
+    with _open(file_path, 'r') as f, database.atomic('IMMEDIATE') as transaction:
+        _read_header(f)
+        for row_table, row in _read_rows(f):
+            if row_table != table or len(rows) >= chunk_size:
+                flush()
+                table = row_table
+            rows.append(row)
+        flush()
+    db.invalidate_identity_caches()
+    return counts
@@ -0,0 +1,97 @@
+"""
+command line interface for the message store, e.g.
+`python -m unichat export backup.ndjson.gz` or
+`python -m unichat import-whatsapp "WhatsApp Chat with Trinity.zip" Trinity`
+"""
+import argparse
+import logging
+
+# project imports
+import unichat.db as db
+import unichat.clients.instagram_client.instagram_db as idb
+import unichat.clients.telegram_client.telegram_db as tdb
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+import unichat.migrations as migrations
+
+COMMANDS = ['export', 'import', 'import-whatsapp', 'import-telegram', 'import-instagram']
+
+
+def get_contact(name: str) -> db.Contact:
+    """ unichat contact with `name`, exits if it does not exist """
+    contact = db.Contact.get_or_none(db.Contact.name == name)
+    if contact is None:
+        raise SystemExit(f'there is no unichat contact {name}')
+    return contact
+
+
+def run_export(args) -> None:
+    from unichat.backup import export_store
+    for table, count in export_store(args.file).items():
+        print(f'exported {count} {table} rows')
+
+
+def run_import(args) -> None:
+    from unichat.backup import import_store
+    for table, count in import_store(args.file).items():
+        print(f'imported {count} {table} rows')
+
+
+def run_import_whatsapp(args) -> None:
+    from unichat.importers.whatsapp_export import import_chat_export
+    count = import_chat_export(args.file, get_contact(args.contact), chat_name=args.chat_name)
+    print(f'imported {count} whatsapp messages')
+
+
+def run_import_telegram(args) -> None:
+    from unichat.importers.telegram_export import import_result_json
+    count = import_result_json(args.file)
+    print(f'imported {count} telegram messages')
+
+
+def run_import_instagram(args) -> None:
+    from unichat.importers.instagram_export import import_inbox
+    count = import_inbox(args.path)
+    print(f'imported {count} instagram messages')
+
+
+def main(argv: list[str]) -> int:
+    """ parses the arguments and runs the command """
+    parser = argparse.ArgumentParser(prog='python -m unichat')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparser = subparsers.add_parser('export', help='export the message store')
+    subparser.add_argument('file', help='NDJSON file, compressed with gzip if it ends with .gz')
+    subparser.set_defaults(run=run_export)
+
+    subparser = subparsers.add_parser('import', help='import an export into the message store')
+    subparser.add_argument('file', help='NDJSON file, compressed with gzip if it ends with .gz')
+    subparser.set_defaults(run=run_import)
+
+    subparser = subparsers.add_parser('import-whatsapp',
+                                      help='import a chat export of the whatsapp app')
+    subparser.add_argument('file', help='.txt or .zip file of "Export chat"')
+    subparser.add_argument('contact', help='name of the unichat contact of the chat')
+    subparser.add_argument('--chat-name',
+                           help='whatsapp name of the contact, if it is not linked yet '
+                                'and the file was renamed')
+    subparser.set_defaults(run=run_import_whatsapp)
+
+    subparser = subparsers.add_parser('import-telegram',
+                                      help='import an export of telegram desktop')
+    subparser.add_argument('file', help='result.json of "Export chat history", the photos are '
+                                        'read relative to it')
+    subparser.set_defaults(run=run_import_telegram)
+
+    subparser = subparsers.add_parser('import-instagram',
+                                      help='import an instagram data download')
+    subparser.add_argument('path',
+                           help='extracted archive (format json), an inbox or a thread directory')
+    subparser.set_defaults(run=run_import_instagram)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    migrations.run()
+    db.init_storage()
+    db.init_database([wdb.WhatsAppContact, tdb.TelegramContact, idb.InstagramContact])
+    args.run(args)
+    return 0
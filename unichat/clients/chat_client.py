@@ -1,7 +1,18 @@
 from abc import ABC
+from collections.abc import Iterator
+from concurrent.futures import Future
 
 # project imports
 import unichat.db as db
+import unichat.media_store as media_store
+
+
+def _resolve_ids(stored: Future, ids: Future) -> None:
+    """ resolves `ids` with the ids of the messages that `stored` resolved to """
+    if stored.exception() is not None:
+        ids.set_exception(stored.exception())
+    else:
+        ids.set_result([message.id for message in stored.result()])
 
 
 class ChatClient(ABC):
@@ -13,6 +24,8 @@ class ChatClient(ABC):
         """ constructor """
         self.name = name
         self.user_data_dir_path = None
+        # persistence worker that writes the messages, see `store_messages`
+        self.persistence = None
 
     def login(self, *args) -> bool:
         """
@@ -54,7 +67,18 @@ class ChatClient(ABC):
         """
         raise NotImplementedError
 
-    def get_latest_messages(self, *args):
+    def iter_chat_messages(self, chat, since: int | None = None) -> Iterator[list[dict]]:
+        """
+        yields the messages of a chat in batches of unichat message dicts
+        (see `db.save_messages_bulk`) while they are fetched, so the first
+        batch can be stored and shown before the history is complete.
+        `since` is the epoch ms cursor of the last stored message, older
+        messages are not fetched. the order of the batches is up to the
+        client, newest first where it can
+        """
+        raise NotImplementedError
+
+    def get_latest_messages(self, chat_name: str):
         """
         returns a list of the latest messages from a chat with a specific contact.
         only returns messages, which have not yet been stored in the database.
@@ -68,6 +92,38 @@ class ChatClient(ABC):
         """
         raise NotImplementedError
 
+    def save_messages(self, messages: list) -> Future:
+        """
+        stores many messages of the client in a single transaction with
+        `store_messages`, returns a future of the ids of the unichat messages
+        """
+        raise NotImplementedError
+
+    def store_messages(self, messages: list[dict]) -> Future:
+        """
+        stores unichat message dicts (see `db.save_messages_bulk`). with a
+        persistence worker they are written by its thread, otherwise by the
+        calling one. returns a future of the ids of the created messages,
+        only a caller that needs the ids waits for it
+        """
+        ids = Future()
+        if self.persistence is None:
+            ids.set_result(db.save_messages_bulk(self.name, messages))
+        else:
+            self.persistence.submit(self.name, messages).add_done_callback(
+                lambda stored: _resolve_ids(stored, ids))
+        return ids
+
+    def touch_media(self, media_ids: list[int]) -> None:
+        """
+        marks the media of shown messages as used (see `media_store.touch`).
+        with a persistence worker it is written by its thread
+        """
+        if self.persistence is None:
+            media_store.touch(media_ids)
+        else:
+            self.persistence.touch_media(media_ids)
+
     def send_text_message(self, to_contact: db.Contact, text: str) -> None:
         """
         sends a text message to `to_contact`, returns the unichat message on success
@@ -10,7 +10,9 @@ from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.wait import WebDriverWait
 
 # project imports
-from unichat.config import discord_url, discord_element, message_url, timeout_limit
+import unichat.dom_extractor as dom_extractor
+from unichat.config import (discord_url, discord_element, discord_extraction, message_url,
+                            timeout_limit)
 from unichat.driver_manager import DriverManager
 
 
@@ -24,15 +26,22 @@ class DiscordClient:
     username = ""
     password = ""
 
-    def __init__(self, headless: bool = False, userdata_dir: str = "") -> None:
+    def __init__(self,
+                 headless: bool = False,
+                 userdata_dir: str = "",
+                 driver_manager: DriverManager | None = None) -> None:
         """Creates a DiscordClient instance that will handle all actions
         taken on the web client.
 
         :param headless: Boolean value that indicates whether to use headless mode.
         :param userdata_dir: Directory where browser userdata will be stored.
+        :param driver_manager: Driver manager of the client, e.g. from the `DriverPool`.
+            Without one the client starts its own browser.
         """
 
-        driver_manager = DriverManager(headless=headless, userdata_dir=userdata_dir)
+        if driver_manager is None:
+            driver_manager = DriverManager(headless=headless, userdata_dir=userdata_dir)
+        self.driver_manager = driver_manager
         self.DRIVER = driver_manager.get_chromedriver()
 
     def login_to_discord(self, driver: webdriver.Chrome, username: str, password: str) -> str:
@@ -237,20 +246,18 @@ class DiscordClient:
         # Scroll to top, to load in the html all the elements.
         self.scroll_chat_to_top(driver, scroller.get_attribute("class").split(" ")[0])
 
-        chat_messages_elements = messages_wrapper.find_elements(By.XPATH, ".//li[starts-with(@id, 'chat-messages')]")
+        # all messages in one script call, see `dom_extractor`
+        blocks = dom_extractor.extract_messages(driver, discord_extraction, root=messages_wrapper)
         msgs = []
 
         sender = None
-        for chat_element in chat_messages_elements:
+        for block in blocks:
             msg = {}
-            content = chat_element.find_element(By.XPATH, ".//div[starts-with(@class, 'contents')]")
-            message_content = content.find_element(By.XPATH, ".//div[starts-with(@id, 'message-content')]")
-            possible_sender = content.find_elements(By.XPATH, "./h3")
-            if len(possible_sender) == 1:
-                sender = possible_sender[0].find_element(By.XPATH, "./span/span").text
+            # only the first message of a group shows the sender
+            sender = block["sender"] or sender
             msg["sender"] = sender
-            msg["message"] = DiscordClient.get_text_from_message_content(message_content)
-            msg["timestamp"] = content.find_element(By.XPATH, ".//time").get_attribute("datetime")
+            msg["message"] = block["text"] or ""
+            msg["timestamp"] = block["timestamp"]
             msgs.append(msg)
 
         return msgs
@@ -1,6 +1,9 @@
 import time
+from collections.abc import Iterator
+from concurrent.futures import Future
 
 # external imports
+from selenium import webdriver
 from selenium.common import NoSuchElementException, ElementClickInterceptedException, TimeoutException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
@@ -12,6 +15,7 @@ from selenium.webdriver.support.wait import WebDriverWait
 import unichat.clients.instagram_client.instagram_db as idb
 import unichat.config as config
 import unichat.db as db
+import unichat.dom_extractor as dom_extractor
 import unichat.helpers as helpers
 from unichat.clients.chat_client import ChatClient
 from unichat.driver_manager import DriverManager
@@ -28,15 +32,33 @@ class InstagramClient(ChatClient):
         super().__init__(name)
         db.init_database(models=[idb.InstagramContact])
         self.dm = driver_manager
-        self.driver = self.dm.get_chromedriver()
         self.unichat_me = db.get_unichat_me()
         self.instagram_me = config.instagram_me
         self.encryption_util = EncryptionUtility()
         self.username = ''
         self.password = ''
-        self.driver_window_handle = self.dm.initialize_driver_tab(config.instagram_url)
+        # the tab is opened on first use, see `driver_window_handle`
+        self._driver_window_handle: str | None = None
+
+    @property
+    def driver(self) -> webdriver.Chrome:
+        """ the browser of the client, it is started on first use """
+        return self.dm.get_chromedriver()
+
+    @property
+    def driver_window_handle(self) -> str:
+        """ the tab of the client, it is opened on first use """
+        if self._driver_window_handle is None:
+            with self.dm.mutexLock:
+                if self._driver_window_handle is None:
+                    self._driver_window_handle = self.dm.initialize_driver_tab(config.instagram_url)
+        return self._driver_window_handle
 
     def login(self, *args) -> bool:
+        """Logs in to Instagram web client with the given credentials."""
+        return self.dm.execute_driver_command(self._execute_login, *args)
+
+    def _execute_login(self, *args) -> bool:
         """Logs in to Instagram web client with the given credentials.
 
         :param args: Instagram username and password.
@@ -93,6 +115,10 @@ class InstagramClient(ChatClient):
         self.link_to_unichat_account(self.instagram_me, self.unichat_me, '')
 
     def is_logged_in(self) -> bool:
+        """Checks if the user is logged in."""
+        return self.dm.execute_driver_command(self._execute_is_logged_in)
+
+    def _execute_is_logged_in(self) -> bool:
         """Checks if the user is logged in.
         """
         self.dm.switch_driver_window(self.driver_window_handle)
@@ -148,9 +174,14 @@ class InstagramClient(ChatClient):
             inc = idb.InstagramContact.create(web_link=args[0],
                                               chat_name=contact,
                                               contact=unichat_contact)
+            db.invalidate_identity_caches()
             return inc
 
     def get_active_chats(self) -> list[tuple[str, str]]:
+        """Retrieve all active chats from Instagram web client."""
+        return self.dm.execute_driver_command(self._execute_get_active_chats)
+
+    def _execute_get_active_chats(self) -> list[tuple[str, str]]:
         """Retrieve all active chats from Instagram web client.
 
         :return: List of all active chats.
@@ -176,17 +207,21 @@ class InstagramClient(ChatClient):
             active_chats.append((name, url))
         return active_chats
 
-    def save_message(self, message: dict[str, str | db.Contact]) -> db.UniChatMessage:
+    def save_message(self, message: dict[str, str | db.Contact]) -> db.UniChatMessage | None:
         """
         different clients have different message objects, so every client
-        needs to construct and save an unichat message object
+        needs to construct and save an unichat message object.
+        Returns None if the message was already stored
+        """
+        ids = self.store_messages([message]).result()
+        return db.get_messages_by_ids(ids)[0] if ids else None
+
+    def save_messages(self, messages: list[dict[str, str | db.Contact]]) -> Future:
         """
-        unichat_message = db.UniChatMessage.create(from_contact=message['from_contact'],
-                                                   to_contact=message['to_contact'],
-                                                   chat_client=self.name,
-                                                   text=message['text'],
-                                                   timestamp=message['timestamp'])
-        return unichat_message
+        Stores all messages in one transaction, returns a future of the ids
+        of the created unichat messages
+        """
+        return self.store_messages(messages)
 
     def send_text_message(self, to_contact: db.Contact, text: str) -> None:
         """
@@ -206,6 +241,10 @@ class InstagramClient(ChatClient):
             return None
 
     def send_message(self, contact_url: str, message: str) -> None:
+        """Send a message through Instagram web client."""
+        self.dm.execute_driver_command(self._execute_send_message, contact_url, message)
+
+    def _execute_send_message(self, contact_url: str, message: str) -> None:
         """Send a message through Instagram web client.
 
         :param contact_url: Instagram chat url.
@@ -222,6 +261,13 @@ class InstagramClient(ChatClient):
         actions.perform()
 
     def get_all_messages(self, contact_name: str, contact_url: str) -> list[dict[str, str | db.Contact]]:
+        """Retrieve the messages of a chat from Instagram web client."""
+        return self.dm.execute_driver_command(self._execute_get_all_messages,
+                                              contact_name, contact_url)
+
+    def _execute_get_all_messages(self,
+                                  contact_name: str,
+                                  contact_url: str) -> list[dict[str, str | db.Contact]]:
         """Retrieve a message from Instagram web client and returns them.
 
                 :param contact_name: Instagram contact name.
@@ -237,46 +283,46 @@ class InstagramClient(ChatClient):
         # scrolls to top of page, this will fail if time until messages is loaded is greater than 2s
         self._scroll_chat_to_top(wait_time=0.5)
 
-        msgs = self.driver.find_elements(
-            By.XPATH, helpers.find_xpath_with_class(config.instagram_element['msg_blobs']))
+        # all blocks in one script call, see `dom_extractor`
+        blocks = dom_extractor.extract_messages(self.driver, config.instagram_extraction)
 
         chat_msgs = []
         time_stamp = ""
-        for msg in msgs:
-            # this scrolls so that msg is in the view, this ensures the relevant html items are loaded
-            self.driver.execute_script('arguments[0].scrollIntoView(true);',
-                                       msg)
-
+        for block in blocks:
             data = {}
-            try:
-                time_stamp = msg.find_element(By.XPATH,
-                                              helpers.find_xpath_with_class(config.instagram_element["msg_time"])).text
-            except NoSuchElementException:
-                pass
+            # only the first message of a group shows the time
+            time_stamp = block['timestamp'] or time_stamp
             data['timestamp'] = time_stamp
-            try:
-                sender = msg.find_element(By.XPATH,
-                                          helpers.find_xpath_with_class(config.instagram_element['msg_sender'])).text
-            except NoSuchElementException:
-                sender = 'NA'
+            sender = block['sender'] or 'NA'
             data['from_contact'] = idb.get_contact_from_instagram_name(sender)
             data['to_contact'] = idb.get_contact_from_instagram_name(
                 self.instagram_me if sender != self.instagram_me else contact_name)
-            try:
-                message = msg.find_element(By.XPATH,
-                                           helpers.find_xpath_with_class(config.instagram_element['own_msg'])).text
-            except NoSuchElementException:
-                try:
-                    message = msg.find_element(By.XPATH,
-                                               helpers.find_xpath_with_class(
-                                                   config.instagram_element['other_msg'])).text
-                except NoSuchElementException:
-                    message = 'NO TEXT'
-            data['text'] = message
+            data['text'] = block['text'] or 'NO TEXT'
 
             chat_msgs.append(data)
         return chat_msgs
 
+    def iter_chat_messages(self,
+                           chat: str,
+                           since: int | None = None) -> Iterator[list[dict[str, str | db.Contact]]]:
+        """Yields the messages of a linked chat in batches, the newest batch first.
+
+        the chat only renders completely once it is scrolled to the top, so it
+        is extracted at once and split afterwards. messages older than `since`
+        are dropped, timestamps that can not be parsed are kept.
+
+        :param chat: Instagram contact name.
+        :param since: epoch ms timestamp of the last stored message.
+        """
+        contact = idb.get_contact_from_instagram_name(chat)
+        contact_url = idb.get_instagram_contact(contact).web_link
+        messages = self.get_all_messages(chat, contact_url)
+        if since is not None:
+            messages = [message for message in messages
+                        if (helpers.timestamp_to_epoch_ms(message['timestamp']) or since) >= since]
+        batches = helpers.chunks_by_timestamp(messages, config.chat_fetch_batch_size)
+        yield from reversed(list(batches))
+
     def _scroll_chat_to_top(self, wait_time: float = 1.0) -> None:
         """Scrolls to the top of the Instagram chat history
 
@@ -14,6 +14,10 @@ class InstagramContact(db.BaseModel):
     contact = pw.ForeignKeyField(db.Contact, on_delete='CASCADE')
 
 
+# resolved instagram contacts, cleared by `db.invalidate_identity_caches`
+_identity_cache = db.IdentityCache()
+
+
 def get_instagram_me() -> InstagramContact | None:
     """ returns instagram me """
     me = (InstagramContact
@@ -21,7 +25,7 @@ def get_instagram_me() -> InstagramContact | None:
           .join(db.Contact)
           .where(db.Contact.is_me))
     try:
-        return me.get()
+        return _identity_cache.get('me', me.get)
     except pw.DoesNotExist as e:
         logging.info(f'get instagram me failed: {e}')
         return None
@@ -36,16 +40,14 @@ def get_instagram_contact(contact: db.Contact) -> InstagramContact | None:
                   .select()
                   .join(db.Contact)
                   .where(InstagramContact.contact == contact))
-    try:
-        return in_contact.get()
-    except pw.DoesNotExist:
-        return None
+    return _identity_cache.get(('contact', contact.get_id() if contact else None),
+                               in_contact.first)
 
 
 def get_contact_from_instagram_name(contact_name: str) -> db.Contact:
     """ returns contact with `contact_name` """
     contact = (db.Contact
                .select(db.Contact, InstagramContact)
-               .join(InstagramContact, on=(db.Contact.name == InstagramContact.contact))
+               .join(InstagramContact, on=(db.Contact.id == InstagramContact.contact))
                .where(InstagramContact.chat_name == contact_name))
-    return contact.get()
+    return _identity_cache.get(('chat_name', contact_name), contact.get)
@@ -1,21 +1,34 @@
 import os
-from datetime import datetime
+from collections.abc import Iterator
+from concurrent.futures import Future
+from datetime import datetime, timezone
 
 # external imports
-import pytz
 import telethon
 from dotenv import load_dotenv
 from telethon.sync import TelegramClient
-from telethon.types import Message, InputFile
+from telethon.types import Message
 
 # project imports
 import unichat.clients.telegram_client.telegram_db as tdb
 import unichat.config as config
 import unichat.db as db
 import unichat.helpers as helpers
+import unichat.media_store as media_store
 from unichat.clients.chat_client import ChatClient
 
 
+def get_photo_source_key(message: Message) -> str | None:
+    """
+    key of the photo of a telegram message in the media store, None if
+    the message has no photo
+    """
+    try:
+        return f'telegram:photo:{message.media.photo.id}'
+    except AttributeError:
+        return None
+
+
 class SyncTelegramClient(ChatClient, TelegramClient):
     """
     multiple inheritance, so the sync client inherits from the telethon
@@ -82,17 +95,59 @@ class SyncTelegramClient(ChatClient, TelegramClient):
                                                 last_name=contact.last_name,
                                                 username=contact.username,
                                                 contact=unichat_contact)
-        pic_path = str(contact.id) + '.jpg'
-        file_path = os.path.join(self.user_data_dir_path, pic_path)
+        file_path = media_store.get_temp_file_path('.jpg')
         new_path = self.download_profile_photo(contact.id, file=file_path)
         if new_path:
-            unichat_contact.profile_pic_path = new_path
+            media = media_store.add_file(new_path, move=True)
+            unichat_contact.profile_pic_path = media.get_file_path()
             unichat_contact.save()
+        else:
+            os.remove(file_path)
+        db.invalidate_identity_caches()
         return tg_contact
 
-    def save_message(self, message: Message) -> db.UniChatMessage:
+    def save_message(self, message: Message) -> db.UniChatMessage | None:
         """
-        saves a telegram message object to a unichat message database entry
+        saves a telegram message object to a unichat message database entry,
+        returns None if the message was already stored
+        """
+        unichat_message = self.to_unichat_message(message, self.download_photo(message))
+        ids = self.store_messages([unichat_message]).result()
+        return db.get_messages_by_ids(ids)[0] if ids else None
+
+    def save_messages(self, messages: list[Message]) -> Future:
+        """
+        saves many telegram messages in one transaction, oldest first,
+        returns a future of the ids of the unichat messages
+        """
+        # convert (and download the photos) before the write transaction starts
+        unichat_messages = [self.to_unichat_message(message, self.download_photo(message))
+                            for message in sorted(messages, key=lambda message: message.id)]
+        return self.store_messages(unichat_messages)
+
+    def download_photo(self, message: Message) -> db.Media | None:
+        """
+        stores the photo of the message if there is one, a photo that is
+        stored already is not downloaded again
+        """
+        source_key = get_photo_source_key(message)
+        if source_key is None:
+            return None
+        media = media_store.get_by_source(source_key)
+        if media is None:
+            file_path = self.download_media(message=message.media,
+                                            file=media_store.get_temp_file_path('.jpg'))
+            media = media_store.add_file(file_path, source_key=source_key, move=True)
+        return media
+
+    def to_unichat_message(self,
+                           message: Message,
+                           media: db.Media | None = None,
+                           media_file: str | None = None) -> dict:
+        """
+        converts a telegram message object to the fields of a unichat
+        message. the photo is stored already (`media`) or a downloaded
+        `media_file` that the persistence worker adds to the media store
         """
         try:
             from_id = message.from_id.user_id
@@ -102,22 +157,16 @@ class SyncTelegramClient(ChatClient, TelegramClient):
         to_id = message.peer_id.user_id
         from_contact = tdb.get_contact_from_telegram_user_id(from_id)
         to_contact = tdb.get_contact_from_telegram_user_id(to_id)
-
-        try:
-            postfix = str(message.media.photo.id) + '.jpg'
-            save_to_file_path = os.path.join(self.user_data_dir_path, postfix)
-            photo_path = self.download_media(message=message.media,
-                                             file=save_to_file_path)
-        except AttributeError:
-            photo_path = None
-
-        timestamp = message.date.astimezone(pytz.timezone('CET'))
-        unichat_message = db.UniChatMessage.create(from_contact=from_contact,
-                                                   to_contact=to_contact,
-                                                   chat_client=self.name,
-                                                   text=message.message,
-                                                   photo_path=photo_path,
-                                                   timestamp=timestamp)
+        unichat_message = {'from_contact': from_contact,
+                           'to_contact': to_contact,
+                           'text': message.message,
+                           'photo_path': media.get_file_path() if media else None,
+                           'media': media,
+                           # telegram dates are UTC
+                           'timestamp': message.date,
+                           'external_id': str(message.id)}
+        if media_file is not None:
+            unichat_message['media_file'] = (media_file, get_photo_source_key(message))
         return unichat_message
 
     def get_active_chats(self):
@@ -137,28 +186,27 @@ class SyncTelegramClient(ChatClient, TelegramClient):
         """
         return self.get_messages(contact, limit=64)
 
-    def _save_outgoing_text_message(self, to_contact: db.Contact, text: str):
+    def iter_chat_messages(self, chat, since: int | None = None) -> Iterator[list[dict]]:
         """
-        helper function for saving an outgoing text message
+        pages through the chat with telethon's `iter_messages`, newest
+        first, or oldest first from `since` on. the photos of a batch are
+        downloaded before it is yielded
         """
-        ucm = db.UniChatMessage.create(from_contact=db.get_unichat_me(),
-                                       to_contact=to_contact,
-                                       chat_client=self.name,
-                                       text=text,
-                                       timestamp=datetime.now())
-        return ucm
+        if since is None:
+            messages = self.iter_messages(chat)
+        else:
+            offset_date = datetime.fromtimestamp(since / 1000, tz=timezone.utc)
+            messages = self.iter_messages(chat, offset_date=offset_date, reverse=True)
+        unichat_messages = (self.to_unichat_message(message, self.download_photo(message))
+                            for message in messages)
+        yield from helpers.chunks_by_timestamp(unichat_messages, config.chat_fetch_batch_size)
 
-    def _save_outgoing_photo_message(self, to_contact: db.Contact, photo_path: str):
+    def _save_outgoing_text_message(self, message: Message) -> Future:
         """
-        helper function for saving an outgoing photo message
-
+        helper function for saving a sent text message with the date telegram
+        gave it, the outgoing message event stores the same fields
         """
-        ucm = db.UniChatMessage.create(from_contact=db.get_unichat_me(),
-                                       to_contact=to_contact,
-                                       chat_client=self.name,
-                                       photo_path=photo_path,
-                                       timestamp=datetime.now())
-        return ucm
+        return self.store_messages([self.to_unichat_message(message)])
 
     def send_text_message(self, to_contact: db.Contact, text: str):
         """
@@ -166,8 +214,9 @@ class SyncTelegramClient(ChatClient, TelegramClient):
         """
         tg_contact = tdb.get_telegram_contact(to_contact)
         try:
-            self.send_message(entity=tg_contact.user_id,
-                              message=text)
+            message = self.send_message(entity=tg_contact.user_id,
+                                        message=text)
+            self._save_outgoing_text_message(message)
         except telethon.errors.rpcerrorlist.UserIsBotError:
             # TODO fix this
             pass
@@ -175,17 +224,16 @@ class SyncTelegramClient(ChatClient, TelegramClient):
             # TODO this too
             pass
 
-    def send_photo_message(self, to_contact: db.Contact, file: InputFile):
+    def send_photo_message(self, to_contact: db.Contact, photo_file: str):
         """
-        sends a png image file, returns the message on success
+        sends an image file, returns the stored message on success. the
+        local file is added to the media store instead of downloading the
+        sent photo again
         """
         tg_contact = tdb.get_telegram_contact(to_contact)
-        message = self.send_message(tg_contact.user_id, file=file)
+        message = self.send_message(tg_contact.user_id, file=photo_file)
         # successfully sent message will be returned TODO exception handling
-        postfix = str(message.media.photo.id) + '.jpg'
-        save_to_file_path = os.path.join(self.user_data_dir_path, postfix)
-        photo_path = self.download_media(message=message.media,
-                                         file=save_to_file_path)
-        ucm = self._save_outgoing_photo_message(to_contact=to_contact,
-                                                photo_path=photo_path)
-        return ucm
+        media = media_store.add_file(photo_file, source_key=get_photo_source_key(message))
+        # the same fields as the outgoing message event, so storing it twice is detected
+        ids = self.store_messages([self.to_unichat_message(message, media)]).result()
+        return db.get_messages_by_ids(ids)[0] if ids else None
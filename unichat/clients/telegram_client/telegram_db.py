@@ -23,6 +23,10 @@ class TelegramContact(db.BaseModel):
     contact = pw.ForeignKeyField(db.Contact, on_delete='CASCADE')
 
 
+# resolved telegram contacts, cleared by `db.invalidate_identity_caches`
+_identity_cache = db.IdentityCache()
+
+
 def get_telegram_me() -> db.Contact | None:
     """
     returns the join table of contact and telegram contact
@@ -35,7 +39,7 @@ def get_telegram_me() -> db.Contact | None:
           .join(TelegramContact)
           .where(db.Contact.is_me))
     try:
-        return me.get()
+        return _identity_cache.get('me', me.get)
     except pw.DoesNotExist as e:
         logging.info(f'get telegram me failed: {e}')
         return None
@@ -50,10 +54,8 @@ def get_telegram_contact(contact: db.Contact) -> TelegramContact | None:
                   .select()
                   .join(db.Contact)
                   .where(TelegramContact.contact == contact))
-    try:
-        return tg_contact.get()
-    except pw.DoesNotExist:
-        return None
+    return _identity_cache.get(('contact', contact.get_id() if contact else None),
+                               tg_contact.first)
 
 
 def get_contact_from_telegram_user_id(user_id: int) -> db.Contact:
@@ -65,4 +67,13 @@ def get_contact_from_telegram_user_id(user_id: int) -> db.Contact:
                .select(db.Contact)
                .join(TelegramContact)
                .where(TelegramContact.user_id == user_id))
-    return contact.get()
+    return _identity_cache.get(('user_id', user_id), contact.get)
+
+
+def get_linked_user_ids() -> list[int]:
+    """ user ids of the linked telegram contacts, without the owner """
+    query = (TelegramContact
+             .select(TelegramContact.user_id)
+             .join(db.Contact)
+             .where(~db.Contact.is_me))
+    return [tg_contact.user_id for tg_contact in query]
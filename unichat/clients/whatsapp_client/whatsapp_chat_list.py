@@ -0,0 +1,63 @@
+"""
+cheap change detection for all linked whatsapp chats. a single
+execute_script call reads the rendered rows of the chat list, i.e. the
+name, the time and preview of the last message and the unread counter
+of every chat. a chat with a new message moves to the top of the list,
+so the rendered rows are enough, the list is never scrolled. only the
+chats whose row changed are opened and fetched
+"""
+# external imports
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# project imports
+import unichat.config as config
+
+# arguments: selector map of the chat list
+SCAN_SCRIPT = '''
+const selectors = arguments[0];
+function read(row, selector) {
+    const element = row.querySelector(selector);
+    return element ? element.innerText : null;
+}
+return Array.from(document.querySelectorAll(selectors.row), function (row) {
+    const unread = (read(row, selectors.unread) || '').trim();
+    return {
+        name: read(row, selectors.name),
+        time: read(row, selectors.time),
+        preview: read(row, selectors.preview),
+        unread: /^[0-9]+$/.test(unread) ? parseInt(unread, 10) : 0,
+    };
+});
+'''
+
+
+def scan(driver: WebDriver) -> list[dict]:
+    """
+    reads the rendered rows of the chat list, a dict per chat with the
+    keys name, time, preview and unread (the number of unread messages),
+    top row first
+    """
+    rows = driver.execute_script(SCAN_SCRIPT, config.whatsapp_chat_list_extraction) or []
+    return [row for row in rows if row['name']]
+
+
+def find_changed_chats(seen: dict[str, tuple], rows: list[dict], chat_names: set[str]) -> list[str]:
+    """
+    the chats of `chat_names` whose row changed since it was seen last,
+    `seen` maps the chat names to their (time, preview) and is updated.
+    a chat that is seen for the first time counts as changed if it has
+    unread messages
+    """
+    changed = []
+    for row in rows:
+        name = row['name']
+        if name not in chat_names:
+            continue
+        state = (row['time'], row['preview'])
+        if name in seen:
+            if seen[name] != state:
+                changed.append(name)
+        elif row['unread']:
+            changed.append(name)
+        seen[name] = state
+    return changed
@@ -2,9 +2,11 @@ import logging
 import math
 import re
 import time
-from datetime import datetime
+from collections.abc import Iterator
+from concurrent.futures import Future
 
 # external imports
+from selenium import webdriver
 from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, \
     ElementClickInterceptedException
 from selenium.common.exceptions import TimeoutException
@@ -15,13 +17,24 @@ from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
 
 # project imports
+import unichat.clients.whatsapp_client.whatsapp_chat_list as whatsapp_chat_list
 import unichat.clients.whatsapp_client.whatsapp_db as wdb
+import unichat.clients.whatsapp_client.whatsapp_observer as whatsapp_observer
 import unichat.config as config
 import unichat.db as db
+import unichat.dom_extractor as dom_extractor
 import unichat.helpers as helpers
 from unichat.clients.chat_client import ChatClient
 from unichat.driver_manager import DriverManager
 
+# a unichat message dict, see `db.save_messages_bulk`
+MessageDict = dict[str, db.Contact | str]
+
+
+def _get_block_key(block: dict) -> str:
+    """ identifies an extracted block, by its DOM id if it has one """
+    return block['id'] or f"{block['metadata']}{block['text']}"
+
 
 class WhatsAppClient(ChatClient):
     def __init__(self,
@@ -34,10 +47,26 @@ class WhatsAppClient(ChatClient):
         self.qr_data: str = ''
         self.time_sender_regex = time_sender_regex
         self.dm = driver_manager
-        self.driver = self.dm.get_chromedriver()
         self.unichat_me = db.get_unichat_me()
         self.whatsapp_me = ""
-        self.driver_window_handle = self.dm.initialize_driver_tab(config.whatsapp_url)
+        # chat that is open in the tab, the observer captures its messages
+        self.selected_chat: str | None = None
+        # the tab is opened on first use, see `driver_window_handle`
+        self._driver_window_handle: str | None = None
+
+    @property
+    def driver(self) -> webdriver.Chrome:
+        """ the browser of the client, it is started on first use """
+        return self.dm.get_chromedriver()
+
+    @property
+    def driver_window_handle(self) -> str:
+        """ the tab of the client, it is opened on first use """
+        if self._driver_window_handle is None:
+            with self.dm.mutexLock:
+                if self._driver_window_handle is None:
+                    self._driver_window_handle = self.dm.initialize_driver_tab(config.whatsapp_url)
+        return self._driver_window_handle
 
     def get_me(self) -> str:
         """Returns own Whatsapp username.
@@ -178,6 +207,7 @@ class WhatsAppClient(ChatClient):
                                              chat_name=contact,
                                              is_linked=False,
                                              contact=unichat_contact)
+            db.invalidate_identity_caches()
             return wac
 
     def is_unichat_contact_linked(self, unichat_contact: db.Contact) -> bool:
@@ -190,18 +220,22 @@ class WhatsAppClient(ChatClient):
         else:
             return False
 
-    def save_message(self, message: dict[str, str | db.Contact]) -> db.UniChatMessage:
+    def save_message(self, message: dict[str, str | db.Contact]) -> db.UniChatMessage | None:
         """
         Different clients have different message objects, so every client
-        needs to construct and save an unichat message object
+        needs to construct and save an unichat message object.
+        Returns None if the message was already stored
         """
 
-        unichat_message = db.UniChatMessage.create(from_contact=message['from_contact'],
-                                                   to_contact=message['to_contact'],
-                                                   chat_client=self.name,
-                                                   text=message['text'],
-                                                   timestamp=message['timestamp'])
-        return unichat_message
+        ids = self.store_messages([message]).result()
+        return db.get_messages_by_ids(ids)[0] if ids else None
+
+    def save_messages(self, messages: list[dict[str, str | db.Contact]]) -> Future:
+        """
+        Stores all messages in one transaction, returns a future of the ids
+        of the created unichat messages
+        """
+        return self.store_messages(messages)
 
     def send_text_message(self, to_contact: db.Contact, text: str) -> None:
         """
@@ -274,10 +308,12 @@ class WhatsAppClient(ChatClient):
                 raise TimeoutException  # Exception when no chat is found
             else:
                 chats_found[0].click()  # Select the first chat found
+                self.selected_chat = chat_name
         except TimeoutException:
+            self.selected_chat = None
             logging.warning(f'Whatsapp Chat "{chat_name}" was not found.')
 
-    def get_all_messages(self, chat_name: str) -> list[dict[str, db.Contact | str]]:
+    def get_all_messages(self, chat_name: str) -> list[MessageDict]:
         """ Retrieve a message from WhatsApp web client"""
 
         return self.dm.execute_driver_command(self._execute_get_messages, chat_name)
@@ -285,55 +321,276 @@ class WhatsAppClient(ChatClient):
     def _execute_get_messages(self,
                               chat_name: str,
                               enable_limit: bool = False,
-                              last_message_timestamp: datetime = None) -> list[dict[str, db.Contact | str]]:
-        self.dm.switch_driver_window(self.driver_window_handle)
-        self.get_me()  # Ensure that whatsapp_me is loaded
+                              last_message_timestamp: int = None) -> list[MessageDict]:
+        """ the scraped history in chronological order, see `_iter_message_windows` """
+        windows = list(self._iter_message_windows(chat_name,
+                                                  last_message_timestamp if enable_limit else None))
+        # the windows are scraped from the newest to the oldest
+        return [message for window in reversed(windows) for message in window]
+
+    def iter_chat_messages(self, chat: str, since: int = None) -> Iterator[list[MessageDict]]:
+        """
+        Yields the messages of the chat window by window while it is scraped, the newest
+        window first, see `_iter_message_windows`. The driver lock is only held while a
+        window is scraped, other commands run while the caller handles a window.
+        """
+        yield from self._iter_message_windows(chat, since)
+
+    def _execute_store_history(self, chat_name: str, last_message_timestamp: int = None) -> int:
+        """
+        Hands every scraped window to the persistence as soon as it is scraped, returns the
+        number of stored messages. Has to run under the driver lock.
+        """
+        stored = 0
+        futures = []
+        for window in self._iter_message_windows(chat_name, last_message_timestamp):
+            if self.persistence is None:
+                stored += len(db.save_messages_bulk(self.name, window))
+            else:
+                # the worker writes while the next window is scraped
+                futures.append(self.persistence.submit(self.name, window))
+        return stored + sum(len(future.result()) for future in futures)
+
+    def _iter_message_windows(self,
+                              chat_name: str,
+                              last_message_timestamp: int = None) -> Iterator[list[MessageDict]]:
+        """
+        Scrolls the chat up and yields the messages of every newly rendered window, oldest
+        first within a window. WhatsApp virtualizes long chats and recycles the blocks that
+        are scrolled out of view, so every window is extracted while it is rendered. The
+        blocks are deduplicated by their DOM id against the window before, such that only
+        two windows are held at a time. Messages that share the oldest timestamp of a
+        window are held back until the next one, so identical messages of one minute are
+        counted in the same dedup batch. Stops at the top of the chat or, with
+        `last_message_timestamp`, at the last stored message. The driver lock is acquired
+        for every window and released before it is yielded, see `_restore_chat`.
+        """
+        with self.dm.mutexLock:
+            self.dm.switch_driver_window(self.driver_window_handle)
+            self.get_me()  # Ensure that whatsapp_me is loaded
+            chat_container = self._open_chat(chat_name)
+            if chat_container is None:
+                return
+            # the first window is everything that is rendered, later ones are the head of the chat
+            blocks = dom_extractor.extract_messages(self.driver, config.whatsapp_extraction)
+        previous_keys = set()
+        held = []
+        while True:
+            keys = [_get_block_key(block) for block in blocks]
+            new_blocks = [block for block, key in zip(blocks, keys) if key not in previous_keys]
+            if not new_blocks:
+                break  # Nothing older was rendered, the top is reached
+            previous_keys = set(keys)
+            messages = self._convert_blocks(chat_name, new_blocks)
+            if messages:
+                oldest_timestamp = messages[0]['timestamp']
+                split = next((i for i, message in enumerate(messages)
+                              if message['timestamp'] != oldest_timestamp),
+                             len(messages))
+                if split == len(messages):
+                    # the whole window shares one timestamp
+                    held = messages + held
+                else:
+                    yield messages[split:] + held
+                    held = messages[:split]
+                oldest_epoch_ms = helpers.timestamp_to_epoch_ms(oldest_timestamp)
+                if (last_message_timestamp is not None and oldest_epoch_ms is not None
+                        and oldest_epoch_ms < last_message_timestamp):
+                    break  # The last stored message is reached
+            first_key = keys[0] if keys else None
+            with self.dm.mutexLock:
+                chat_container = self._restore_chat(chat_name, chat_container, first_key)
+                if chat_container is None:
+                    break
+                blocks = self._scroll_up(chat_container, first_key)
+        if held:
+            yield held
+
+    def _open_chat(self, chat_name: str) -> WebElement | None:
+        """ Selects the chat and returns its container once a message is rendered """
         try:
             self.search_and_select_chat(chat_name)
             WebDriverWait(self.driver, config.timeout_limit).until(
                 ec.presence_of_element_located(
                     (By.CLASS_NAME, config.whatsapp_element['chat_message_block']))
             )  # Wait for the first message block to load
-            if enable_limit:
-                self._scroll_to_top(enable_limit, chat_name, last_message_timestamp)
-            else:
-                self._scroll_to_top()
-            message_list = WebDriverWait(self.driver, config.timeout_limit).until(
-                ec.presence_of_all_elements_located(
-                    (By.CLASS_NAME, config.whatsapp_element['chat_message_block']))
-            )
-            messages_json = []
-            for message_block in message_list:
-                message_data = self._convert_messages_block_to_unichat(chat_name, message_block)
-                if message_data:  # Deleted Messages are of type None
-                    messages_json.append(message_data)
-            return messages_json
-        except TimeoutException:
+            return self.driver.find_element(By.CLASS_NAME,
+                                            config.whatsapp_element['chat_container'])
+        except (TimeoutException, NoSuchElementException):
             logging.warning(f'Failed to retrieve Whatsapp messages for {chat_name}')
+            return None
+
+    def _restore_chat(self,
+                      chat_name: str,
+                      chat_container: WebElement,
+                      first_key: str | None) -> WebElement | None:
+        """
+        Other commands may use the driver between two windows, e.g. select another chat.
+        If the oldest block of the last window is not rendered anymore, the chat is selected
+        again and scrolled up until it is. Returns the chat container, None if the block is
+        not found anymore. Has to run under the driver lock.
+        """
+        self.dm.switch_driver_window(self.driver_window_handle)
+        blocks = dom_extractor.extract_messages(self.driver, config.whatsapp_extraction)
+        if first_key is None or any(_get_block_key(block) == first_key for block in blocks):
+            return chat_container
+        chat_container = self._open_chat(chat_name)
+        if chat_container is None:
+            return None
+        blocks = dom_extractor.extract_messages(self.driver, config.whatsapp_extraction)
+        while blocks and not any(_get_block_key(block) == first_key for block in blocks):
+            blocks = self._scroll_up(chat_container, _get_block_key(blocks[0]))
+        if not blocks:
+            logging.warning(f'Failed to resume scraping the Whatsapp chat {chat_name}')
+            return None
+        return chat_container
+
+    def _scroll_up(self, chat_container: WebElement, first_key: str | None) -> list[dict]:
+        """
+        Scrolls the chat to the top and returns the head window once older blocks are
+        rendered, an empty list at the top of the chat
+        """
+        self.driver.execute_script("arguments[0].scrollTo(0,0)", chat_container)
+
+        def head_window(driver):
+            blocks = dom_extractor.extract_messages(driver, config.whatsapp_extraction,
+                                                    end=config.whatsapp_window_size)
+            return blocks if blocks and _get_block_key(blocks[0]) != first_key else False
+
+        try:
+            blocks = WebDriverWait(self.driver, config.timeout_limit_short).until(head_window)
+        except TimeoutException:
+            return []
+        if not any(_get_block_key(block) == first_key for block in blocks):
+            # more than a window was rendered at once
+            blocks = dom_extractor.extract_messages(self.driver, config.whatsapp_extraction)
+        return blocks
 
     def get_latest_messages(self, chat_name):
         """ Retrieve the latest messages from WhatsApp web client. Used by the async fetcher"""
         return self.dm.execute_driver_command(self._execute_get_latest_messages, chat_name)
 
-    def _execute_get_latest_messages(self, chat_name: str) -> list[dict[str, db.Contact | str]] | None:
+    def _execute_get_latest_messages(self, chat_name: str) -> list[MessageDict] | None:
         try:
             last_message_db = self._get_last_db_message(chat_name=chat_name)
+            if last_message_db is None:
+                # nothing stored yet, the whole chat history is new and stored window by window
+                self._execute_store_history(chat_name)
+                return None
             self.search_and_select_chat(chat_name=chat_name)
-            message_blocks = WebDriverWait(self.driver, config.timeout_limit).until(
+            WebDriverWait(self.driver, config.timeout_limit).until(
                 ec.presence_of_all_elements_located(
                     (By.CLASS_NAME, config.whatsapp_element['chat_message_block']))
             )
-            last_message_online = self._convert_messages_block_to_unichat(chat_name, message_blocks[-1])
-            timestamp_db = datetime.fromisoformat(last_message_db.timestamp)
-            if not self._is_same_message(last_message_db, last_message_online):
-                messages = self._execute_get_messages(chat_name=chat_name, enable_limit=True,
-                                                      last_message_timestamp=timestamp_db)
-                return self._filter_new_messages(messages, timestamp_db)
+            sync_state = db.get_sync_state(self.name, self._get_conversation_key(chat_name))
+            if sync_state is not None:
+                new_messages = self._get_messages_after(chat_name, sync_state.external_id)
+                if new_messages is not None:
+                    return new_messages or None
+            # no cursor or it is not rendered anymore, the history is compared by content.
+            # the last blocks, the very last one may be e.g. a deleted message
+            last_messages_online = self._extract_messages(chat_name,
+                                                          start=-config.whatsapp_extraction_tail)
+            timestamp_db = last_message_db.timestamp
+            if (not last_messages_online
+                    or not self._is_same_message(last_message_db, last_messages_online[-1])):
+                # the whole scraped window is returned, the database skips
+                # the messages that are already stored
+                return self._execute_get_messages(chat_name=chat_name, enable_limit=True,
+                                                  last_message_timestamp=timestamp_db)
             else:
                 return None
         except ElementClickInterceptedException as e:
             logging.warning(e)
 
+    def _get_messages_after(self, chat_name: str, external_id: str) -> list[MessageDict] | None:
+        """
+        The rendered messages after the one with `external_id`, i.e. the sync cursor. The
+        messages before it that share its timestamp are included, so identical messages of
+        one minute are counted in the same dedup batch. None if the cursor is not rendered.
+        """
+        messages = self._extract_messages(chat_name)
+        external_ids = [message['external_id'] for message in messages]
+        if external_id not in external_ids:
+            return None
+        cursor = external_ids.index(external_id)
+        if cursor == len(messages) - 1:
+            return []
+        start = cursor
+        while start > 0 and messages[start - 1]['timestamp'] == messages[cursor]['timestamp']:
+            start -= 1
+        return messages[start:]
+
+    def get_new_messages(self, chat_name: str) -> list[MessageDict] | None:
+        """ Returns the messages rendered since the last call. Used by the async fetcher """
+        return self.dm.execute_driver_command(self._execute_get_new_messages, chat_name)
+
+    def _execute_get_new_messages(self, chat_name: str) -> list[MessageDict] | None:
+        """
+        drains the buffer of the message observer, one script call. the
+        chat is rescanned after a gap, i.e. if another chat was opened, the
+        page was reloaded or the buffer overflowed
+        """
+        self.dm.switch_driver_window(self.driver_window_handle)
+        if self.selected_chat == chat_name:
+            observed = whatsapp_observer.drain(self.driver)
+            if observed is not None:
+                return self._convert_observed_messages(chat_name, observed)
+        # the observer captures everything that is rendered from now on
+        whatsapp_observer.install(self.driver)
+        messages = self._execute_get_latest_messages(chat_name) or []
+        # messages that arrived during the rescan, the stored ones are skipped
+        observed = whatsapp_observer.drain(self.driver)
+        return messages + self._convert_observed_messages(chat_name, observed or [])
+
+    def get_latest_messages_of_chats(self,
+                                     chat_names: list[str],
+                                     target_chat: str | None = None) -> list[MessageDict]:
+        """ Retrieve the latest messages of several chats in one pass. Used by the async fetcher"""
+        return self.dm.execute_driver_command(self._execute_get_latest_messages_of_chats,
+                                              chat_names, target_chat)
+
+    def _execute_get_latest_messages_of_chats(self,
+                                              chat_names: list[str],
+                                              target_chat: str | None = None) -> list[MessageDict]:
+        """
+        opens every chat once and returns their new messages. the target chat of the
+        fetcher is opened again afterwards, it is rescanned from its sync cursor and its
+        observer is armed again, so the next drain does not rescan it
+        """
+        self.dm.switch_driver_window(self.driver_window_handle)
+        messages = []
+        for chat_name in chat_names:
+            messages += self._execute_get_latest_messages(chat_name) or []
+        if target_chat:
+            messages += self._execute_get_new_messages(target_chat)
+        return messages
+
+    def get_chat_list(self) -> list[dict]:
+        """
+        Returns the rendered rows of the chat list, see `whatsapp_chat_list`. Used by the async
+        fetcher
+        """
+        return self.dm.execute_driver_command(self._execute_get_chat_list)
+
+    def _execute_get_chat_list(self) -> list[dict]:
+        self.dm.switch_driver_window(self.driver_window_handle)
+        # selecting a chat leaves its name in the search box, which filters the list.
+        # clearing it keeps the chat open
+        self._clear_search_box()
+        return whatsapp_chat_list.scan(self.driver)
+
+    def _convert_observed_messages(self,
+                                   chat_name: str,
+                                   observed: list[dict[str, str]]) -> list[MessageDict]:
+        messages = []
+        for message in observed:
+            data = self._to_unichat_message(chat_name, message['pre_plain_text'], message['text'],
+                                            message.get('external_id'))
+            if data:
+                messages.append(data)
+        return messages
+
     def get_active_chats(self) -> list:
         """ Returns a list of the active chats
 
@@ -377,59 +634,58 @@ class WhatsAppClient(ChatClient):
         except TimeoutException:
             logging.warning('Failed to retrieve all active Whatsapp chats')
 
-    def _convert_messages_block_to_unichat(self,
-                                           chat_name: str,
-                                           message_block: WebElement) -> dict[str, db.Contact | str] | None:
-        has_message = True
-        message_content = None
-        data = None
-        try:
-            message_content = message_block.find_element(
-                By.CLASS_NAME,
-                config.whatsapp_element['chat_message_content']
-            )
-        except NoSuchElementException:
-            has_message = False
+    def _extract_messages(self,
+                          chat_name: str,
+                          start: int = 0,
+                          end: int | None = None) -> list[MessageDict]:
+        """
+        unichat messages of the message blocks[start:end] of the open chat,
+        read in one script call
+        """
+        blocks = dom_extractor.extract_messages(self.driver, config.whatsapp_extraction,
+                                                start=start, end=end)
+        return self._convert_blocks(chat_name, blocks)
+
+    def _convert_blocks(self, chat_name: str, blocks: list[dict]) -> list[MessageDict]:
+        """ unichat messages of extracted blocks, deleted messages (no metadata) are skipped """
+        messages = []
+        for block in blocks:
+            data = self._to_unichat_message(chat_name, block['metadata'], block['text'],
+                                            block['id'])
+            if data:
+                messages.append(data)
+        return messages
+
+    def _to_unichat_message(self,
+                            chat_name: str,
+                            timestamp_sender: str,
+                            message_text: str,
+                            external_id: str | None = None) -> MessageDict | None:
+        """
+        unichat message of the data-pre-plain-text metadata and the text of a message,
+        `external_id` is the data-id of its row
+        """
+        timestamp_sender_match = re.match(self.time_sender_regex, timestamp_sender or '')
+        if timestamp_sender_match is None:
+            return None
+        sender = timestamp_sender_match.group('sender')
+        return {'timestamp': helpers.string_to_utc_timestamp(
+            timestamp_sender_match.group('datetime')
+        ),
+            'from_contact': wdb.get_contact_from_whatsapp_name(sender),
+            'to_contact': wdb.get_contact_from_whatsapp_name(
+                self.get_me() if sender != self.get_me() else chat_name),
+            'text': message_text,
+            'external_id': external_id}
 
-        if has_message:
-            timestamp_sender = message_content.get_attribute(
-                config.whatsapp_element['chat_message_data']
-            )
-            timestamp_sender_match = re.match(self.time_sender_regex,
-                                              timestamp_sender)
-            message_text = message_block.find_element(
-                By.CLASS_NAME, config.whatsapp_element['chat_message_text']).text
-            sender = timestamp_sender_match.group('sender')
-            data = {'timestamp': helpers.string_to_utc_timestamp(
-                timestamp_sender_match.group('datetime')
-            ),
-                'from_contact': wdb.get_contact_from_whatsapp_name(sender),
-                'to_contact': wdb.get_contact_from_whatsapp_name(
-                    self.get_me() if sender != self.get_me() else chat_name),
-                'text': message_text}
-
-        return data
-
-    def _filter_new_messages(self,
-                             messages: list[dict[str, db.Contact | str]],
-                             last_message_timestamp: datetime) -> list[dict[str, db.Contact | str]]:
-        new_messages = []
-        for message in messages:
-            message_timestamp = datetime.fromisoformat(message['timestamp'])
-            if (last_message_timestamp < message_timestamp
-                    or not (db.has_unichat_message(from_contact=message['from_contact'],
-                                                   to_contact=message['to_contact'],
-                                                   chat_client=self.name,
-                                                   text=message['text'],
-                                                   timestamp=message['timestamp']))):
-                new_messages.append(message)
-        return new_messages
-
-    def _get_last_db_message(self, chat_name: str) -> db.UniChatMessage:
-
-        return db.get_unichat_message(contact_a_name=wdb.get_contact_from_whatsapp_name(self.get_me()).name,
-                                      contact_b_name=wdb.get_contact_from_whatsapp_name(chat_name).name,
-                                      chat_client=self.name, limit=1)[0]
+    def _get_conversation_key(self, chat_name: str) -> str:
+        return db.get_conversation_key(wdb.get_contact_from_whatsapp_name(self.get_me()),
+                                       wdb.get_contact_from_whatsapp_name(chat_name))
+
+    def _get_last_db_message(self, chat_name: str) -> db.UniChatMessage | None:
+        """Returns the latest stored message of the chat from its conversation summary."""
+
+        return db.get_last_message(self.name, self._get_conversation_key(chat_name))
 
     def _get_scroll_height(self, scroll_element: WebElement) -> float:
         """Gets scroll height of a WebElement and returns it.
@@ -440,77 +696,6 @@ class WhatsAppClient(ChatClient):
 
         return self.driver.execute_script('return arguments[0].scrollHeight', scroll_element)
 
-    def _has_past_last_stored_message(self,
-                                      chat_name: str,
-                                      last_message_timestamp: datetime,
-                                      message_blocks: list[WebElement]) -> bool:
-        oldest_online_message_block = self._convert_messages_block_to_unichat(chat_name, message_blocks[0])
-        online_timestamp = datetime.fromisoformat(oldest_online_message_block['timestamp'])
-        return last_message_timestamp > online_timestamp
-
-    def _scroll_to_top(self,
-                       enable_limit: bool = False,
-                       chat_name: str = "",
-                       last_message_timestamp: datetime = None) -> None:
-        """Scrolls to the top of the WhatsApp chat history
-        """
-
-        chat_window = WebDriverWait(self.driver, config.timeout_limit).until(
-            ec.presence_of_element_located(
-                (By.CLASS_NAME, config.whatsapp_element['chat_window'])
-            )
-        )
-
-        chat_container = WebDriverWait(self.driver, config.timeout_limit).until(
-            ec.presence_of_element_located(
-                (By.CLASS_NAME, config.whatsapp_element['chat_container'])
-            )
-        )
-
-        last_height = self._get_scroll_height(chat_window)
-
-        WebDriverWait(self.driver, config.timeout_limit).until(
-            ec.presence_of_element_located(
-                (By.CLASS_NAME, config.whatsapp_element['chat_message_content'])
-            )
-        )  # Wait for the first messages to load
-
-        # Get all message blocks
-        message_blocks = WebDriverWait(self.driver, config.timeout_limit).until(
-            ec.presence_of_all_elements_located(
-                (By.CLASS_NAME, config.whatsapp_element['chat_message_block']))
-        )
-
-        # Check if message_blocks already contain the last stored message
-        if (enable_limit and self._has_past_last_stored_message(chat_name, last_message_timestamp,
-                                                                message_blocks)):
-            return  # Exit if already reached
-
-        while True:
-            # Scroll up
-            self.driver.execute_script("arguments[0].scrollTo(0,0)", chat_container)
-
-            # Wait to load page
-            WebDriverWait(self.driver, config.timeout_limit).until(
-                ec.visibility_of_all_elements_located(
-                    (By.CLASS_NAME, config.whatsapp_element['chat_message_content'])
-                )
-            )
-
-            # Get all message blocks
-            message_blocks = WebDriverWait(self.driver, config.timeout_limit).until(
-                ec.presence_of_all_elements_located(
-                    (By.CLASS_NAME, config.whatsapp_element['chat_message_block']))
-            )
-
-            # Calculate new scroll height and compare with last scroll height
-            new_height = self._get_scroll_height(chat_window)
-            if (new_height == last_height or
-                    (enable_limit and self._has_past_last_stored_message(chat_name, last_message_timestamp,
-                                                                         message_blocks))):
-                break
-            last_height = new_height
-
     def _clear_search_box(self) -> None:
         """Clears the WhatsApp web client search box."""
 
@@ -530,6 +715,7 @@ class WhatsAppClient(ChatClient):
 
         if clear_search_box:
             self._clear_search_box()
+        self.selected_chat = None
         try:
             chat_container = self.driver.find_element(By.CLASS_NAME,
                                                       config.whatsapp_element['chat_container'])
@@ -550,8 +736,9 @@ class WhatsAppClient(ChatClient):
         else:
             return True
 
-    def _is_same_message(self, db_message: db.UniChatMessage, online_message: dict[str, db.Contact | str]) -> bool:
+    def _is_same_message(self, db_message: db.UniChatMessage, online_message: MessageDict) -> bool:
         return (db_message.from_contact == online_message['from_contact']
                 and db_message.to_contact == online_message['to_contact']
-                and datetime.fromisoformat(db_message.timestamp) == datetime.fromisoformat(online_message['timestamp'])
+                and db_message.timestamp == helpers.timestamp_to_epoch_ms(
+                    online_message['timestamp'])
                 and db_message.text == online_message['text'])
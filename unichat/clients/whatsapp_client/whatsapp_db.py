@@ -15,6 +15,10 @@ class WhatsAppContact(db.BaseModel):
     contact = pw.ForeignKeyField(db.Contact, on_delete='CASCADE')
 
 
+# resolved whatsapp contacts, cleared by `db.invalidate_identity_caches`
+_identity_cache = db.IdentityCache()
+
+
 def get_whatsapp_me() -> WhatsAppContact | None:
     """ returns whatsapp me """
     me = (WhatsAppContact
@@ -22,7 +26,7 @@ def get_whatsapp_me() -> WhatsAppContact | None:
           .join(db.Contact)
           .where(db.Contact.is_me))
     try:
-        return me.get()
+        return _identity_cache.get('me', me.get)
     except pw.DoesNotExist as e:
         logging.info(f'get Whatsapp me failed: {e}')
         return None
@@ -38,16 +42,23 @@ def get_whatsapp_contact(contact: db.Contact) -> WhatsAppContact | None:
                   .select()
                   .join(db.Contact)
                   .where(WhatsAppContact.contact == contact))
-    try:
-        return wa_contact.get()
-    except pw.DoesNotExist:
-        return None
+    return _identity_cache.get(('contact', contact.get_id() if contact else None),
+                               wa_contact.first)
 
 
 def get_contact_from_whatsapp_name(contact_name: str) -> db.Contact:
     """ returns whatsapp contact with `contact_name` """
     contact = (db.Contact
                .select(db.Contact, WhatsAppContact)
-               .join(WhatsAppContact, on=(db.Contact.name == WhatsAppContact.contact))
+               .join(WhatsAppContact, on=(db.Contact.id == WhatsAppContact.contact))
                .where(WhatsAppContact.chat_name == contact_name))
-    return contact.get()
+    return _identity_cache.get(('chat_name', contact_name), contact.get)
+
+
+def get_linked_chat_names() -> set[str]:
+    """ chat names of the linked whatsapp contacts, without the owner """
+    query = (WhatsAppContact
+             .select(WhatsAppContact.chat_name)
+             .join(db.Contact)
+             .where(WhatsAppContact.is_linked & ~db.Contact.is_me))
+    return {whatsapp_contact.chat_name for whatsapp_contact in query}
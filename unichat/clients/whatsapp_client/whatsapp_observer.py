@@ -0,0 +1,99 @@
+"""
+push based capture of new whatsapp messages. a MutationObserver in the
+whatsapp tab appends every message that is rendered to a buffer in the
+page, with the metadata of its data-pre-plain-text attribute. the
+fetcher drains the buffer with a single execute_script call instead of
+scraping the chat, and only rescans the chat after a gap: a reloaded
+page (the observer is gone), an overflown buffer or another chat that
+was opened in the meantime
+"""
+# external imports
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# project imports
+import unichat.config as config
+
+# arguments: content selector, block selector, text selector, buffer size
+INSTALL_SCRIPT = '''
+const [contentSelector, blockSelector, textSelector, maxSize] = arguments;
+const state = window.__unichatObserver || {};
+state.buffer = [];
+state.seen = new Set();
+state.overflow = false;
+if (!state.observer) {
+    state.capture = function (content) {
+        const block = content.closest(blockSelector) || content;
+        const row = content.closest('[data-id]');
+        const textElement = block.querySelector(textSelector);
+        const prePlainText = content.getAttribute('data-pre-plain-text');
+        const text = textElement ? textElement.innerText : '';
+        const key = row ? row.getAttribute('data-id') : prePlainText + text;
+        if (state.seen.has(key)) {
+            return;
+        }
+        if (state.buffer.length >= state.maxSize) {
+            state.overflow = true;
+            return;
+        }
+        state.seen.add(key);
+        state.buffer.push({
+            id: key,
+            external_id: row ? row.getAttribute('data-id') : null,
+            pre_plain_text: prePlainText,
+            text: text,
+        });
+    };
+    state.observer = new MutationObserver(function (mutations) {
+        for (const mutation of mutations) {
+            for (const node of mutation.addedNodes) {
+                if (node.nodeType !== Node.ELEMENT_NODE) {
+                    continue;
+                }
+                if (node.matches(contentSelector)) {
+                    state.capture(node);
+                }
+                node.querySelectorAll(contentSelector).forEach(state.capture);
+            }
+        }
+    });
+    state.observer.observe(document.body, {childList: true, subtree: true});
+    window.__unichatObserver = state;
+}
+state.maxSize = maxSize;
+'''
+
+DRAIN_SCRIPT = '''
+const state = window.__unichatObserver;
+if (!state) {
+    return null;
+}
+const drained = state.overflow ? null : state.buffer;
+state.buffer = [];
+state.seen.clear();
+state.overflow = false;
+return drained;
+'''
+
+
+def install(driver: WebDriver, max_size: int = config.whatsapp_observer_buffer_size) -> None:
+    """
+    injects the observer into the current tab (again), the buffer starts
+    empty. installing twice keeps the running observer
+    """
+    selectors = config.whatsapp_extraction
+    driver.execute_script(INSTALL_SCRIPT,
+                          selectors['metadata'],
+                          selectors['block'],
+                          selectors['text'],
+                          max_size)
+
+
+def drain(driver: WebDriver) -> list[dict[str, str]] | None:
+    """
+    returns and empties the buffer of the observer, a dict per message
+    with the keys id, external_id (the data-id of the row or None),
+    pre_plain_text and text in the order they were rendered. None after
+    a gap: the page was reloaded or the buffer overflowed, the chat has
+    to be rescanned
+    """
+    return driver.execute_script(DRAIN_SCRIPT)
@@ -2,6 +2,16 @@
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 800
 
+# messages per page of the chat history, older pages are loaded on scrolling up
+chat_history_page_size = 50
+# scroll steps from the top at which the next older page is loaded
+chat_history_load_threshold = 3
+
+# results per page of the message search
+search_page_size = 20
+# pause after the last key stroke before the search runs
+search_debounce_ms = 250
+
 # USER DATA CONFIG
 # data directory
 user_data_dir = 'unichat-user-data'
@@ -9,8 +19,50 @@ user_data_dir = 'unichat-user-data'
 log_dir = 'logs'
 # database name
 db_name = 'unichat.db'
+# number of rows that a migration backfills per transaction
+db_migration_batch_size = 5000
+# rows per multi-row INSERT of the bulk ingestion
+db_bulk_chunk_size = 500
+# 'managed': WAL journal, tuned pragmas and lock retries, 'plain': sqlite defaults
+db_storage_mode = 'managed'
+# page cache per connection in KiB
+db_cache_size_kib = 64000
+# memory mapped I/O in bytes, 0 disables it
+db_mmap_size = 268435456
+# how long sqlite waits for a lock before reporting 'database is locked'
+db_busy_timeout_sec = 5
+# retries after a 'database is locked' error, the delay doubles every retry
+db_lock_retries = 3
+db_lock_retry_delay_sec = 0.1
+# rows per identity cache, e.g. chat names or user ids resolved to contacts
+db_identity_cache_size = 1024
+# submissions that can wait for the persistence worker before producers block
+persistence_queue_size = 256
+# messages per write transaction of the persistence worker
+persistence_batch_size = 500
+# how long the persistence worker collects messages for a transaction
+persistence_flush_interval_sec = 0.05
+# messages per batch of `ChatClient.iter_chat_messages`, the first batch
+# is stored and shown while the rest of the history is fetched
+chat_fetch_batch_size = 50
+# adaptive polling of the background fetchers, see `poll_scheduler`. the
+# interval grows by the factor after every poll that finds nothing
+poll_backoff_factor = 2
+poll_max_interval_sec = 30
+# the intervals are stretched while the app window is hidden or minimized
+poll_hidden_factor = 4
+# how often the polling metrics are logged
+poll_metrics_log_interval_sec = 300
+# content addressed media store in the user data directory
+media_dir = 'media'
+# disk quota of the media store, the least recently used files are evicted
+media_quota_bytes = 1073741824
+# eviction frees the media store down to this share of the quota
+media_evict_ratio = 0.9
 telegram_sync_session = 'telethon_sync'
 telegram_async_session = 'telethon_async'
+# messages fetched at startup of a chat that has no sync cursor yet
+telegram_sync_limit = 64
 
 # INSTAGRAM SELENIUM CONFIG
 instagram_url = 'https://www.instagram.com/'
@@ -38,9 +90,25 @@ instagram_element = dict(
     msg_sender="html-span xdj266r x11i5rnm xat24cr x1mh8g0r xexx8yu x4uap5 x18d9i69 xkhd6sd x1hl2dhg x16tdsg8 x1vvkbs xzpqnlu x1hyvwdk xjm9jq1 x6ikm8r x10wlt62 x10l6tqk x1i1rx1s",
     chat_window="x78zum5.xdt5ytf.x1iyjqo2.xs83m0k.x1xzczws.x6ikm8r.x1rife3k.x1n2onr6.xh8yej3.x16o0dkt"
 )
+# selector map of the message extraction, see `dom_extractor`
+instagram_extraction = dict(
+    block='.' + instagram_element['msg_blobs'].replace(' ', '.'),
+    sender='.' + instagram_element['msg_sender'].replace(' ', '.'),
+    timestamp='.' + instagram_element['msg_time'].replace(' ', '.'),
+    text=', '.join('.' + instagram_element[key].replace(' ', '.')
+                   for key in ['own_msg', 'other_msg']),
+    own='.' + instagram_element['own_msg'].replace(' ', '.'),
+    media='img',
+    # the content of a block is only rendered when it is in view
+    scroll_into_view=True
+)
 
 # WHATSAPP SELENIUM CONFIG
 whatsapp_url = 'https://web.whatsapp.com/'
+# pause of the async fetcher between two drains of the message observer
+whatsapp_fetch_interval_sec = 0.25
+# messages the observer buffers in the page, a fuller buffer is a gap
+whatsapp_observer_buffer_size = 1000
 
 timeout_limit = 60
 timeout_limit_short = 5
@@ -48,6 +116,14 @@ timeout_limit_short = 5
 logged_in = "logged in"
 
 driver_new_page = "chrome://new-tab-page/"
+# browsers of the selenium clients. 1: all clients share one browser in
+# separate tabs, more: every client gets its own browser and profile.
+# one per selenium client of the app (whatsapp, instagram)
+driver_pool_size = 2
+# remote debugging port of the first browser, the others count up
+driver_port = 9222
+# browser profile in the user data directory, the others get a suffix
+driver_userdata_dir = 'chromedriver-userdata'
 
 whatsapp_element = dict(
     static_element="wa-popovers-bucket",
@@ -58,6 +134,9 @@ whatsapp_element = dict(
     chat_search_box_cancel="_ah_y",
     chat_list="x1n2onr6._ak9y",
     chat_list_item="_ak8q",
+    chat_list_item_time="_ak8i",
+    chat_list_item_preview="_ak8k",
+    chat_list_item_unread="_ak8l",
     chat_container="_ajyl",
     chat_window="x3psx0u.xwib8y2.xkhd6sd.xrmvbpv",
     chat_window_oldmsg="_ajvp",
@@ -71,6 +150,33 @@ whatsapp_element = dict(
     profile_element="x1n2onr6.x14yjl9h.xudhj91.x18nykt9.xww2gxu",
     username="_alcd"
 )
+# selector map of the message extraction, see `dom_extractor`
+whatsapp_extraction = dict(
+    block='.' + whatsapp_element['chat_message_block'],
+    id_attribute='data-id',
+    metadata=(f".{whatsapp_element['chat_message_content']}"
+              f"[{whatsapp_element['chat_message_data']}]"),
+    metadata_attribute=whatsapp_element['chat_message_data'],
+    text='.' + whatsapp_element['chat_message_text'],
+    media='img[src^="blob:"]'
+)
+# selector map of the chat list scan, see `whatsapp_chat_list`
+whatsapp_chat_list_extraction = dict(
+    row=f".{whatsapp_element['chat_list']} [role='listitem']",
+    name='.' + whatsapp_element['chat_list_item'],
+    time='.' + whatsapp_element['chat_list_item_time'],
+    preview='.' + whatsapp_element['chat_list_item_preview'],
+    # the badge with the number of unread messages
+    unread=f".{whatsapp_element['chat_list_item_unread']} span[aria-label]"
+)
+# the fetcher scans the chat list for new messages of all linked chats,
+# not only of the open one
+whatsapp_watch_all_chats = True
+whatsapp_watch_interval_sec = 2
+# blocks at the end of the chat that are read to find its last message
+whatsapp_extraction_tail = 5
+# blocks at the head of the chat that are read after a scroll, more than a scroll step renders
+whatsapp_window_size = 200
 
 discord_url = "https://discord.com/login"
 message_url = "https://discord.com/channels/@me"
@@ -87,3 +193,14 @@ discord_element = dict(
     message_box="markup_a7e664.editor__66464.slateTextArea_b19976.fontSize16Padding_bcbeae",
     qr_code_container="qrCodeOverlay_ae8574"
 )
+# selector map of the message extraction, see `dom_extractor`
+discord_extraction = dict(
+    block='li[id^="chat-messages"]',
+    id_attribute='id',
+    # only the first message of a group shows the sender
+    sender='div[class^="contents"] > h3 > span > span',
+    timestamp='time',
+    timestamp_attribute='datetime',
+    text='div[id^="message-content"]',
+    media='img[class^="lazyImg"]'
+)
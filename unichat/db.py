@@ -1,18 +1,64 @@
 """
 base database models and functions
 """
+import collections
+import contextlib
+import copy
+import hashlib
+import itertools
 import logging
 import os
+import re
 import sys
+import threading
+import time
+import weakref
 
 # external imports
 import peewee as pw
+from playhouse.sqlite_ext import FTS5Model, SearchField
 
 # project imports
 import unichat.config as config
 import unichat.helpers as helpers
 
 
+class ManagedSqliteDatabase(pw.SqliteDatabase):
+    """
+    database of the managed storage mode. peewee keeps one connection
+    per thread, with the WAL journal readers never wait for the writer.
+    statements that still fail because another connection holds the
+    write lock are retried with an exponential backoff
+    """
+
+    def execute_sql(self, sql, *args, **kwargs):
+        """ executes `sql`, retries if the database is locked """
+        for attempt in range(config.db_lock_retries + 1):
+            try:
+                return super().execute_sql(sql, *args, **kwargs)
+            except pw.OperationalError as e:
+                if 'locked' not in str(e) or attempt == config.db_lock_retries:
+                    raise
+                delay = config.db_lock_retry_delay_sec * 2 ** attempt
+                logging.warning('database is locked, retry %s/%s in %.2fs',
+                                attempt + 1, config.db_lock_retries, delay)
+                time.sleep(delay)
+
+
+def get_managed_pragmas() -> dict:
+    """
+    pragmas of the managed storage mode, applied to every new connection
+    """
+    return {
+        'foreign_keys': 1,  # Enforce foreign-key constraints
+        'journal_mode': 'wal',  # readers and the writer do not block each other
+        'synchronous': 1,  # NORMAL, safe with WAL and no fsync per commit
+        'cache_size': -config.db_cache_size_kib,  # negative values are KiB
+        'mmap_size': config.db_mmap_size,
+        'busy_timeout': config.db_busy_timeout_sec * 1000,
+    }
+
+
 def get_database():
     """
     initiates and returns an SQLite database in the user data directory
@@ -20,12 +66,116 @@ def get_database():
     """
     user_data_dir_path = helpers.get_user_data_dir_path()
     db_path = os.path.join(user_data_dir_path, config.db_name)
+    if config.db_storage_mode == 'managed':
+        return ManagedSqliteDatabase(db_path,
+                                     pragmas=get_managed_pragmas(),
+                                     timeout=config.db_busy_timeout_sec)
     database = pw.SqliteDatabase(db_path, pragmas={
         'foreign_keys': 1,  # Enforce foreign-key constraints
     })
     return database
 
 
+class IdentityCache:
+    """
+    bounded LRU map from a lookup key (e.g. a chat name or a user id)
+    to the row it resolves to, such that hot paths like scraping a chat
+    window query each contact only once. every cache is registered and
+    cleared by `invalidate_identity_caches` whenever contacts or links
+    change. failed lookups raise (or return None) and are not cached.
+    every caller gets its own copy of a row, the rows are shared between
+    threads and a caller may change and save its copy
+    """
+    caches = weakref.WeakSet()
+
+    def __init__(self, maxsize: int | None = None):
+        """
+        identity cache constructor
+        """
+        self.maxsize = maxsize or config.db_identity_cache_size
+        self.rows = collections.OrderedDict()
+        self.lock = threading.Lock()
+        # counts the invalidations, a row loaded during one is dropped
+        self.generation = 0
+        IdentityCache.caches.add(self)
+
+    def get(self, key, loader):
+        """
+        returns a copy of the cached row of `key`, calls `loader` on a miss
+        """
+        with self.lock:
+            if key in self.rows:
+                self.rows.move_to_end(key)
+                return copy.deepcopy(self.rows[key])
+            generation = self.generation
+        row = loader()
+        if row is None:
+            return None
+        with self.lock:
+            if generation != self.generation:
+                return row
+            self.rows[key] = copy.deepcopy(row)
+            if len(self.rows) > self.maxsize:
+                self.rows.popitem(last=False)
+        return row
+
+    def clear(self):
+        """
+        drops all cached rows
+        """
+        with self.lock:
+            self.rows.clear()
+            self.generation += 1
+
+
+# rows of the unichat tables, e.g. the owner contact
+_identity_cache = IdentityCache()
+
+
+def invalidate_identity_caches():
+    """
+    clears all identity caches, has to be called after contacts
+    are added, removed, linked or updated
+    """
+    for cache in IdentityCache.caches:
+        cache.clear()
+
+
+class EpochMillisecondsField(pw.BigIntegerField):
+    """
+    UTC epoch milliseconds. datetime objects (naive ones are local time)
+    and ISO 8601 strings are converted when they are stored or compared,
+    local time is only used for displaying, see `helpers.epoch_ms_to_datetime`
+    """
+
+    def db_value(self, value):
+        """ epoch milliseconds of `value` """
+        return super().db_value(helpers.timestamp_to_epoch_ms(value)
+                                if value is not None else None)
+
+
+def get_epoch_ms(timestamp, previous: int | None = None) -> int | None:
+    """
+    epoch milliseconds of a message timestamp. a client may deliver one
+    that can not be parsed, e.g. an instagram 'Mon 10:15', it gets
+    `previous`, the timestamp of the neighbouring message, such that the
+    order of the history is kept. the version 4 migration uses the same
+    rule, see `migrations.convert_timestamps`
+    """
+    epoch_ms = helpers.timestamp_to_epoch_ms(timestamp)
+    return previous if epoch_ms is None else epoch_ms
+
+
+def _get_last_epoch_ms(chat_client: str, conversation_key: str) -> int:
+    """ timestamp of the newest stored message of a conversation, the current time without one """
+    epoch_ms = (UniChatMessage
+                .select(pw.fn.MAX(UniChatMessage.timestamp))
+                .where((UniChatMessage.chat_client == chat_client)
+                       & (UniChatMessage.conversation_key == conversation_key))
+                .scalar())
+    return round(time.time() * 1000) if epoch_ms is None else epoch_ms
+
+
 class BaseModel(pw.Model):
     """
     base model for all others
@@ -37,13 +187,37 @@ class BaseModel(pw.Model):
 
 
 class Contact(BaseModel):
-    """ unichat contact (will include the user itself) """
-    name = pw.CharField(primary_key=True)
+    """
+    unichat contact (will include the user itself). the other tables
+    reference the integer id, so a contact can be renamed
+    """
+    name = pw.CharField(unique=True)
     profile_pic_path = pw.CharField(default=helpers.get_image_path('default_profile_pic.png'))
     # field for determining if it is the owner
     is_me = pw.BooleanField(default=False)
 
 
+class Media(BaseModel):
+    """
+    a media file of the content addressed media store, see `unichat.media_store`.
+    the same content is stored only once, no matter how many messages use it
+    """
+    # blake2b hash of the file content
+    content_hash = pw.CharField(unique=True)
+    # path relative to the media directory
+    path = pw.CharField()
+    size = pw.IntegerField()
+    # id of the media in the chat client (e.g. a telegram photo id), such
+    # that known media is not downloaded again
+    source_key = pw.CharField(null=True, unique=True)
+    # epoch milliseconds, the least recently used files are evicted first
+    last_access = EpochMillisecondsField(index=True)
+
+    def get_file_path(self) -> str:
+        """ absolute path of the media file """
+        return os.path.join(helpers.get_user_data_dir_path(), config.media_dir, self.path)
+
+
 class UniChatMessage(BaseModel):
     """
     this is the message object from unichat, how the
@@ -56,7 +230,260 @@ class UniChatMessage(BaseModel):
     text = pw.TextField(null=True)
     photo_path = pw.TextField(null=True)
     video_path = pw.TextField(null=True)
-    timestamp = pw.DateTimeField()
+    # stored file of the photo or video, it is unset when the file is evicted
+    media = pw.ForeignKeyField(Media, null=True, on_delete='SET NULL')
+    # UTC epoch milliseconds
+    timestamp = EpochMillisecondsField()
+    # order-independent key of the two contacts, see `get_conversation_key`
+    conversation_key = pw.CharField(null=True)
+    # content hash that makes storing the same message twice a no-op,
+    # see `get_message_hash`
+    dedup_hash = pw.CharField(null=True, unique=True)
+    # id of the message in its client, e.g. the data-id of a whatsapp row
+    # or the telegram message id. None if the client does not expose one
+    external_id = pw.CharField(null=True)
+
+    class Meta:
+        """ indexes for the chat history queries """
+        indexes = (
+            (('chat_client', 'conversation_key', 'timestamp'), False),
+            (('chat_client', 'external_id'), False),
+        )
+
+    def save(self, *args, **kwargs):
+        """ fills in the derived keys before the message is stored """
+        if self.conversation_key is None:
+            self.conversation_key = get_conversation_key(self.from_contact_id,
+                                                         self.to_contact_id)
+        if self.dedup_hash is None:
+            self.dedup_hash = get_message_hash(self.chat_client,
+                                               self.from_contact_id,
+                                               self.to_contact_id,
+                                               self.timestamp,
+                                               self.text,
+                                               self.photo_path,
+                                               self.video_path)
+        epoch_ms = get_epoch_ms(self.timestamp)
+        if epoch_ms is None:
+            logging.warning('unparsable timestamp %r, using the one of the previous message',
+                            self.timestamp)
+            epoch_ms = _get_last_epoch_ms(self.chat_client, self.conversation_key)
+        self.timestamp = epoch_ms
+        return super().save(*args, **kwargs)
+
+
+class UniChatMessageSearch(FTS5Model):
+    """
+    FTS5 full text index over the message texts. it is an external content
+    table of UniChatMessage, so the texts are not stored twice. triggers on
+    the message table keep it in sync with every insert (including bulk
+    inserts), update and delete (including contact cascade deletes)
+    """
+    text = SearchField()
+
+    class Meta:
+        """ database config """
+        database = BaseModel._meta.database
+        depends_on = [UniChatMessage]
+        options = {'content': UniChatMessage._meta.table_name,
+                   'content_rowid': UniChatMessage.id.column_name,
+                   'tokenize': 'unicode61 remove_diacritics 2'}
+
+    @classmethod
+    def get_trigger_sql(cls) -> dict[str, str]:
+        """ trigger names mapped to their CREATE statements """
+        fts = cls._meta.table_name
+        table = UniChatMessage._meta.table_name
+        delete_old = (f"INSERT INTO {fts} ({fts}, rowid, text) "
+                      f"SELECT 'delete', old.id, old.text WHERE old.text IS NOT NULL;")
+        insert_new = (f"INSERT INTO {fts} (rowid, text) "
+                      f"SELECT new.id, new.text WHERE new.text IS NOT NULL;")
+        return {
+            f'{fts}_ai': f'AFTER INSERT ON {table} BEGIN {insert_new} END',
+            f'{fts}_ad': f'AFTER DELETE ON {table} BEGIN {delete_old} END',
+            f'{fts}_au': f'AFTER UPDATE OF text ON {table} BEGIN {delete_old} {insert_new} END',
+        }
+
+    @classmethod
+    def create_table(cls, safe=True, **options):
+        """ creates the index together with its sync triggers """
+        super().create_table(safe=safe, **options)
+        for name, trigger in cls.get_trigger_sql().items():
+            cls._meta.database.execute_sql(f'CREATE TRIGGER IF NOT EXISTS {name} {trigger}')
+
+    @classmethod
+    def drop_table(cls, safe=True, drop_sequences=True, **options):
+        """ drops the sync triggers together with the index """
+        for name in cls.get_trigger_sql():
+            cls._meta.database.execute_sql(f'DROP TRIGGER IF EXISTS {name}')
+        super().drop_table(safe=safe, drop_sequences=drop_sequences, **options)
+
+
+class ConversationSummary(BaseModel):
+    """
+    one row per conversation of a chat client with its latest message,
+    number of messages and number of unread incoming messages. triggers on
+    the message table keep it up to date in the transaction of every
+    insert (including bulk inserts) and delete (including contact cascade
+    deletes), so readers never aggregate the history. messages are not
+    edited, updates are not tracked
+    """
+    chat_client = pw.CharField()
+    conversation_key = pw.CharField()
+    # the chat partner, i.e. the contact of the conversation that is not the owner
+    contact = pw.ForeignKeyField(Contact, on_delete='CASCADE')
+    last_message_id = pw.IntegerField()
+    last_timestamp = EpochMillisecondsField()
+    message_count = pw.IntegerField(default=0)
+    unread_count = pw.IntegerField(default=0)
+
+    class Meta:
+        """ one summary per conversation, the triggers need the message table """
+        depends_on = [UniChatMessage]
+        indexes = (
+            (('chat_client', 'conversation_key'), True),
+        )
+
+    @classmethod
+    def get_trigger_sql(cls) -> dict[str, str]:
+        """ trigger names mapped to their CREATE statements """
+        summary = cls._meta.table_name
+        table = UniChatMessage._meta.table_name
+        contact = Contact._meta.table_name
+        contact_pk = Contact._meta.primary_key.column_name
+        conversation = ('chat_client = old.chat_client '
+                        'AND conversation_key = old.conversation_key')
+        insert = (f"INSERT INTO {summary} (chat_client, conversation_key, contact_id, "
+                  f"last_message_id, last_timestamp, message_count, unread_count) "
+                  f"SELECT new.chat_client, new.conversation_key, "
+                  f"CASE WHEN c.is_me THEN new.to_contact_id ELSE new.from_contact_id END, "
+                  f"new.id, new.timestamp, 1, CASE WHEN c.is_me THEN 0 ELSE 1 END "
+                  f"FROM {contact} AS c WHERE c.{contact_pk} = new.from_contact_id "
+                  f"ON CONFLICT (chat_client, conversation_key) DO UPDATE SET "
+                  f"message_count = message_count + 1, "
+                  f"unread_count = unread_count + excluded.unread_count, "
+                  f"last_message_id = CASE WHEN "
+                  f"(excluded.last_timestamp, excluded.last_message_id) "
+                  f"> (last_timestamp, last_message_id) "
+                  f"THEN excluded.last_message_id ELSE last_message_id END, "
+                  f"last_timestamp = MAX(last_timestamp, excluded.last_timestamp);")
+        delete = (f"UPDATE {summary} SET message_count = message_count - 1, "
+                  f"unread_count = MIN(unread_count, message_count - 1) "
+                  f"WHERE {conversation}; "
+                  f"UPDATE {summary} SET (last_message_id, last_timestamp) = "
+                  f"(SELECT id, timestamp FROM {table} WHERE {conversation} "
+                  f"ORDER BY timestamp DESC, id DESC LIMIT 1) "
+                  f"WHERE {conversation} AND last_message_id = old.id AND message_count > 0; "
+                  f"DELETE FROM {summary} WHERE {conversation} AND message_count <= 0;")
+        return {
+            f'{summary}_ai': f'AFTER INSERT ON {table} BEGIN {insert} END',
+            f'{summary}_ad': f'AFTER DELETE ON {table} BEGIN {delete} END',
+        }
+
+    @classmethod
+    def create_table(cls, safe=True, **options):
+        """ creates the summary table together with its triggers """
+        super().create_table(safe=safe, **options)
+        for name, trigger in cls.get_trigger_sql().items():
+            cls._meta.database.execute_sql(f'CREATE TRIGGER IF NOT EXISTS {name} {trigger}')
+
+    @classmethod
+    def drop_table(cls, safe=True, drop_sequences=True, **options):
+        """ drops the triggers together with the summary table """
+        for name in cls.get_trigger_sql():
+            cls._meta.database.execute_sql(f'DROP TRIGGER IF EXISTS {name}')
+        super().drop_table(safe=safe, drop_sequences=drop_sequences, **options)
+
+
+class SyncState(BaseModel):
+    """
+    sync cursor of a conversation of a chat client: the external id of
+    the newest stored message that has one. it is advanced in the
+    transaction that stores the messages (see `save_messages_bulk`), so a
+    fetcher can ask its client for everything after the cursor instead
+    of comparing the history by content
+    """
+    chat_client = pw.CharField()
+    conversation_key = pw.CharField()
+    external_id = pw.CharField()
+    # UTC epoch milliseconds of the cursor message
+    timestamp = EpochMillisecondsField()
+
+    class Meta:
+        """ one cursor per conversation """
+        indexes = (
+            (('chat_client', 'conversation_key'), True),
+        )
+
+
+def get_conversation_key(contact_a, contact_b) -> str:
+    """
+    normalized key of the chat between `contact_a` and `contact_b`, the
+    order of the two contacts does not matter. accepts contact objects
+    or their primary keys
+    """
+    keys = sorted(str(c.get_id() if isinstance(c, Contact) else c)
+                  for c in (contact_a, contact_b))
+    # unit separator, can not be part of a contact name typed by the user
+    return '\x1f'.join(keys)
+
+
+@contextlib.contextmanager
+def thread_connection():
+    """
+    opens the database connection of the calling thread for the duration
+    of the block and closes it afterwards. a connection that was already
+    open is reused and stays open. every thread that accesses the database
+    (e.g. the run method of a worker) should wrap its work in this
+    """
+    database = BaseModel._meta.database
+    opened = database.connect(reuse_if_open=True)
+    try:
+        yield database
+    finally:
+        if opened:
+            database.close()
+
+
+def close_thread_connection() -> None:
+    """
+    closes the database connection of the calling thread if it is open
+    """
+    database = BaseModel._meta.database
+    if not database.is_closed():
+        database.close()
+
+
+def get_message_hash(chat_client: str,
+                     from_contact,
+                     to_contact,
+                     timestamp,
+                     text: str | None = None,
+                     photo_path: str | None = None,
+                     video_path: str | None = None,
+                     occurrence: int = 0,
+                     external_id: str | None = None) -> str:
+    """
+    deterministic deduplication hash of a message. the timestamp is
+    normalized to epoch milliseconds and media is identified by its file
+    name. `occurrence` tells identical messages apart (e.g. two 'ok' within
+    the same minute), it is counted per submitted batch. the external id
+    of the client tells them apart across batches, if it has one
+    """
+    epoch_ms = helpers.timestamp_to_epoch_ms(timestamp)
+    parts = [chat_client,
+             str(from_contact.get_id() if isinstance(from_contact, Contact) else from_contact),
+             str(to_contact.get_id() if isinstance(to_contact, Contact) else to_contact),
+             str(timestamp) if epoch_ms is None else str(epoch_ms),
+             text or '',
+             os.path.basename(photo_path or ''),
+             os.path.basename(video_path or '')]
+    if occurrence:
+        parts.append(str(occurrence))
+    if external_id is not None:
+        parts.append(f'id:{external_id}')
+    digest = hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16)
+    return digest.hexdigest()
 
 
 def create_user_data_dir():
@@ -88,11 +515,13 @@ def init_database(models: list) -> None:
 def init_storage():
     """
     This is the interface for the database / user data directory
-    to the outside world.
+    to the outside world. an existing database has to be migrated
+    first, see `migrations.run`
     """
     create_user_data_dir()
     logging.info('user data directory created...')
-    init_database([Contact, UniChatMessage])
+    init_database([Contact, Media, UniChatMessage, UniChatMessageSearch, ConversationSummary,
+                   SyncState])
     logging.info('database initiated...')
 
 
@@ -101,8 +530,10 @@ def add_contact(name: str, is_me: bool = False) -> Contact | None:
     adds an unichat contact with name as the database key
     """
     try:
-        return Contact.create(name=name,
-                              is_me=is_me)
+        contact = Contact.create(name=name,
+                                 is_me=is_me)
+        invalidate_identity_caches()
+        return contact
     except pw.IntegrityError as e:
         logging.info('add_contacted failed: %s', e)
         return None
@@ -117,18 +548,35 @@ def remove_contact(name: str) -> bool:
         Contact.select().where(Contact.name == name).get()
         # Remove Contact from table
         Contact.delete().where(Contact.name == name).execute()
+        invalidate_identity_caches()
         return True
     except pw.DoesNotExist:
         logging.info('Contact %s does not exist in Contact table.', name)
         return False
 
 
+def rename_contact(name: str, new_name: str) -> bool:
+    """
+    renames the contact `name`, its history stays linked. returns False
+    if there is no such contact or `new_name` is taken
+    """
+    try:
+        renamed = Contact.update(name=new_name).where(Contact.name == name).execute()
+    except pw.IntegrityError as e:
+        logging.info('rename contact failed: %s', e)
+        return False
+    invalidate_identity_caches()
+    return renamed > 0
+
+
 def get_unichat_me() -> Contact | None:
     """
     contact object of the owner
     """
     try:
-        return Contact.select().where(Contact.is_me).get()
+        return _identity_cache.get(
+            'me', lambda: Contact.select().where(Contact.is_me).get()
+        )
     except pw.DoesNotExist as e:
         logging.info('get unichat me failed: %s', e)
         return None
@@ -137,28 +585,180 @@ def get_unichat_me() -> Contact | None:
         return None
 
 
+def _select_messages() -> pw.ModelSelect:
+    """
+    selects unichat messages joined with both contacts, such that reading
+    `from_contact` or `to_contact` of a result does not cost a query
+    """
+    from_contact = Contact.alias()
+    to_contact = Contact.alias()
+    return (UniChatMessage
+            .select(UniChatMessage, from_contact, to_contact)
+            .join_from(UniChatMessage, from_contact,
+                       on=UniChatMessage.from_contact, attr='from_contact')
+            .join_from(UniChatMessage, to_contact,
+                       on=UniChatMessage.to_contact, attr='to_contact'))
+
+
 def get_unichat_message(
         contact_a_name: str,
         contact_b_name: str,
         chat_client: str,
         limit: int = -1) -> list[UniChatMessage]:
+    """
+    messages between the two contacts, newest first. served by the
+    (chat_client, conversation_key, timestamp) index
+    """
     contact_a = Contact.get(Contact.name == contact_a_name)
     contact_b = Contact.get(Contact.name == contact_b_name)
 
-    query = (UniChatMessage
-             .select()
+    query = (_select_messages()
              .where((UniChatMessage.chat_client == chat_client) &
-                    (
-                            ((UniChatMessage.from_contact == contact_a) & (UniChatMessage.to_contact == contact_b)) |
-                            ((UniChatMessage.from_contact == contact_b) & (UniChatMessage.to_contact == contact_a)))
-                    )
-             .order_by(UniChatMessage.id.desc()))  # timestamp is not precise enough, changed to id, i.e. add order
+                    (UniChatMessage.conversation_key == get_conversation_key(contact_a, contact_b)))
+             # messages with the same timestamp are in insertion order
+             .order_by(UniChatMessage.timestamp.desc(), UniChatMessage.id.desc()))
 
     query = query if limit < 1 else query.limit(limit)
 
     return list(query)
 
 
+def get_message_page(chat_client: str,
+                     conversation_key: str,
+                     before_id: int | None = None,
+                     limit: int = config.chat_history_page_size) -> list[UniChatMessage]:
+    """
+    keyset pagination of a chat history: the `limit` newest messages of
+    the conversation that are older than the message `before_id` (the
+    newest messages if it is None), returned oldest first. messages are
+    ordered by (timestamp, id) and every page is a range scan of the
+    (chat_client, conversation_key, timestamp) index, so the cost does not
+    depend on the size of the history
+    """
+    query = (_select_messages()
+             .where((UniChatMessage.chat_client == chat_client) &
+                    (UniChatMessage.conversation_key == conversation_key)))
+    if before_id is not None:
+        before = UniChatMessage.alias()
+        before_timestamp = before.select(before.timestamp).where(before.id == before_id)
+        query = query.where(pw.Tuple(UniChatMessage.timestamp, UniChatMessage.id) <
+                            pw.Tuple(before_timestamp, before_id))
+    query = (query
+             .order_by(UniChatMessage.timestamp.desc(), UniChatMessage.id.desc())
+             .limit(limit))
+    return list(reversed(list(query)))
+
+
+def get_conversation_summary(chat_client: str,
+                             conversation_key: str) -> ConversationSummary | None:
+    """
+    summary of a conversation, None if it has no messages
+    """
+    return ConversationSummary.get_or_none(
+        (ConversationSummary.chat_client == chat_client) &
+        (ConversationSummary.conversation_key == conversation_key)
+    )
+
+
+def get_last_message(chat_client: str, conversation_key: str) -> UniChatMessage | None:
+    """
+    latest message of a conversation, read through its summary
+    """
+    query = (_select_messages()
+             .join_from(UniChatMessage, ConversationSummary,
+                        on=(ConversationSummary.last_message_id == UniChatMessage.id))
+             .where((ConversationSummary.chat_client == chat_client) &
+                    (ConversationSummary.conversation_key == conversation_key)))
+    return query.first()
+
+
+def get_sync_state(chat_client: str, conversation_key: str) -> SyncState | None:
+    """
+    sync cursor of a conversation, None if no message with an external
+    id is stored yet
+    """
+    return SyncState.get_or_none(
+        (SyncState.chat_client == chat_client) &
+        (SyncState.conversation_key == conversation_key)
+    )
+
+
+def get_unread_counts(contact: Contact) -> dict[str, int]:
+    """
+    maps the chat client names to the number of unread messages of `contact`
+    """
+    query = (ConversationSummary
+             .select(ConversationSummary.chat_client, ConversationSummary.unread_count)
+             .where(ConversationSummary.contact == contact))
+    return {summary.chat_client: summary.unread_count for summary in query}
+
+
+def mark_conversation_read(chat_client: str, conversation_key: str) -> None:
+    """
+    resets the unread count of a conversation
+    """
+    (ConversationSummary
+     .update(unread_count=0)
+     .where((ConversationSummary.chat_client == chat_client) &
+            (ConversationSummary.conversation_key == conversation_key) &
+            (ConversationSummary.unread_count != 0))
+     .execute())
+
+
+def get_contacts_by_activity() -> list[Contact]:
+    """
+    all contacts, the owner first and then by their latest message over
+    all chat clients, contacts without messages last
+    """
+    last_activity = pw.fn.MAX(ConversationSummary.last_timestamp)
+    query = (Contact
+             .select()
+             .join(ConversationSummary, pw.JOIN.LEFT_OUTER)
+             .group_by(Contact)
+             .order_by(Contact.is_me.desc(),
+                       pw.fn.COALESCE(last_activity, 0).desc(),
+                       Contact.name))
+    return list(query)
+
+
+def _to_search_query(query: str) -> str:
+    """
+    turns user input into an FTS5 query. every word is quoted (so FTS5
+    operators typed by the user are plain text) and matched as prefix,
+    which makes search-as-you-type work on incomplete words
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_messages(query: str,
+                    client: str | None = None,
+                    contact: Contact | None = None,
+                    limit: int = config.search_page_size,
+                    offset: int = 0) -> list[UniChatMessage]:
+    """
+    full text search over all stored messages, best matches first.
+    `client` restricts the search to a chat client and `contact` to the
+    messages from or to a contact
+    """
+    search_query = _to_search_query(query)
+    if not search_query:
+        return []
+    messages = (_select_messages()
+                .join_from(UniChatMessage, UniChatMessageSearch,
+                           on=(UniChatMessage.id == UniChatMessageSearch.rowid))
+                .where(UniChatMessageSearch.match(search_query)))
+    if client is not None:
+        messages = messages.where(UniChatMessage.chat_client == client)
+    if contact is not None:
+        messages = messages.where((UniChatMessage.from_contact == contact) |
+                                  (UniChatMessage.to_contact == contact))
+    messages = (messages
+                .order_by(UniChatMessageSearch.rank(), UniChatMessage.id.desc())
+                .limit(limit)
+                .offset(offset))
+    return list(messages)
+
+
 def has_unichat_message(
         from_contact: Contact,
         to_contact: Contact,
@@ -166,15 +766,274 @@ def has_unichat_message(
         timestamp: str,
         text: str) -> bool:
     """ Returns true if an unichat message matches all given parameters """
-    try:
+    dedup_hash = get_message_hash(chat_client, from_contact, to_contact, timestamp, text)
+    return (UniChatMessage
+            .select()
+            .where(UniChatMessage.dedup_hash == dedup_hash)
+            .exists())
+
+
+def _chunks(iterable, size: int):
+    """ yields lists of `size` items, the last one can be shorter """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _to_message_row(chat_client: str,
+                    message: dict,
+                    occurrences: collections.Counter) -> tuple[dict, str | None]:
+    """
+    row of the unichat message table for a message dict of a client and,
+    for a message with an external id, the hash it would have without the
+    id (see `_claim_stored_rows`). `occurrences` counts the identical
+    messages of the current batch. an unparsable timestamp is None, see
+    `_fill_timestamps`
+    """
+    row = {
+        'from_contact': message['from_contact'],
+        'to_contact': message['to_contact'],
+        'chat_client': chat_client,
+        'text': message.get('text'),
+        'photo_path': message.get('photo_path'),
+        'video_path': message.get('video_path'),
+        'media': message.get('media'),
+        'timestamp': get_epoch_ms(message['timestamp']),
+        'conversation_key': get_conversation_key(message['from_contact'],
+                                                 message['to_contact']),
+        'external_id': message.get('external_id'),
+    }
+    # the hash uses the delivered timestamp, an unparsable one stays stable
+    hash_args = (chat_client, row['from_contact'], row['to_contact'], message['timestamp'],
+                 row['text'], row['photo_path'], row['video_path'])
+    if message.get('dedup_hash'):
+        # e.g. an imported message keeps the hash of its origin store
+        row['dedup_hash'] = message['dedup_hash']
+        return row, None
+    base_hash = get_message_hash(*hash_args)
+    occurrence = occurrences[base_hash]
+    occurrences[base_hash] += 1
+    content_hash = get_message_hash(*hash_args, occurrence=occurrence) if occurrence else base_hash
+    if row['external_id'] is None:
+        row['dedup_hash'] = content_hash
+        return row, None
+    # the client tells identical messages apart, also across batches
+    row['dedup_hash'] = get_message_hash(*hash_args, external_id=row['external_id'])
+    return row, content_hash
+
+
+def _fill_timestamps(rows: list[dict], state: dict) -> None:
+    """
+    rows with a timestamp that can not be parsed get the one of the
+    previous row (see `get_epoch_ms`), the first rows of a batch the one
+    of the next row, or of the newest stored message of the conversation.
+    `state` carries the previous timestamp and the number of unparsable
+    ones across the chunks of a batch
+    """
+    for i, row in enumerate(rows):
+        if row['timestamp'] is not None:
+            state['previous'] = row['timestamp']
+            continue
+        state['unparsable'] += 1
+        previous = state['previous']
+        if previous is None:
+            previous = next((other['timestamp'] for other in rows[i + 1:]
+                             if other['timestamp'] is not None), None)
+        if previous is None:
+            previous = _get_last_epoch_ms(row['chat_client'], row['conversation_key'])
+        row['timestamp'] = state['previous'] = previous
+
+
+def _get_content_key(message) -> tuple:
+    """ the fields of a stored message or a row that the dedup hash covers """
+    if isinstance(message, dict):
+        return (message['chat_client'], message['conversation_key'], message['timestamp'],
+                message['text'] or '', os.path.basename(message['photo_path'] or ''),
+                os.path.basename(message['video_path'] or ''))
+    return (message.chat_client, message.conversation_key, message.timestamp,
+            message.text or '', os.path.basename(message.photo_path or ''),
+            os.path.basename(message.video_path or ''))
+
+
+def _match_rows_with_ids(rows: list[dict]) -> None:
+    """
+    a message without an external id (e.g. from a chat export) that is
+    stored with one already gets the hash of the stored message, the n-th
+    identical row matches the n-th stored one
+    """
+    rows = [row for row in rows if row['external_id'] is None]
+    if not rows:
+        return
+    query = (UniChatMessage
+             .select()
+             .where(UniChatMessage.conversation_key.in_({row['conversation_key'] for row in rows})
+                    & UniChatMessage.timestamp.in_({row['timestamp'] for row in rows})
+                    & UniChatMessage.external_id.is_null(False))
+             .order_by(UniChatMessage.id))
+    stored = collections.defaultdict(list)
+    for message in query:
+        stored[_get_content_key(message)].append(message.dedup_hash)
+    occurrences = collections.Counter()
+    for row in rows:
+        key = _get_content_key(row)
+        if occurrences[key] < len(stored[key]):
+            row['dedup_hash'] = stored[key][occurrences[key]]
+        occurrences[key] += 1
+
+
+def _claim_stored_rows(chunk: list[tuple[dict, str | None]]) -> None:
+    """
+    matches the rows of a chunk with their stored copies of the other kind.
+    a message that was stored without its external id (e.g. before the
+    client had ids, or from a chat export) is found by its content hash,
+    it gets the external id and the hash of the row, so the row is skipped
+    as stored. see `_match_rows_with_ids` for the other direction
+    """
+    _match_rows_with_ids([row for row, content_hash in chunk])
+    content_hashes = {content_hash: row for row, content_hash in chunk if content_hash is not None}
+    if not content_hashes:
+        return
+    id_hashes = [row['dedup_hash'] for row in content_hashes.values()]
+    stored = set(UniChatMessage
+                 .select(UniChatMessage.dedup_hash)
+                 .where(UniChatMessage.dedup_hash.in_(id_hashes))
+                 .tuples())
+    query = (UniChatMessage
+             .select(UniChatMessage.id, UniChatMessage.dedup_hash)
+             .where(UniChatMessage.dedup_hash.in_(list(content_hashes))
+                    & UniChatMessage.external_id.is_null()))
+    for message_id, content_hash in query.tuples():
+        row = content_hashes[content_hash]
+        if (row['dedup_hash'],) in stored:
+            continue
         (UniChatMessage
-         .select()
-         .where((UniChatMessage.from_contact == from_contact) &
-                (UniChatMessage.to_contact == to_contact) &
-                (UniChatMessage.chat_client == chat_client) &
-                (UniChatMessage.timestamp == timestamp) &
-                (UniChatMessage.text == text))
-         .get())
-        return True
-    except pw.DoesNotExist:
-        return False
+         .update(external_id=row['external_id'], dedup_hash=row['dedup_hash'])
+         .where(UniChatMessage.id == message_id)
+         .execute())
+
+
+def _get_stored_rows(chunk: list[dict], inserted: set[str]) -> list[dict]:
+    """
+    the rows of a chunk with an external id that are stored: the inserted
+    ones (by their dedup hash) and the skipped ones whose stored duplicate
+    has the same external id
+    """
+    rows = [row for row in chunk if row['external_id'] is not None]
+    skipped = [row['dedup_hash'] for row in rows if row['dedup_hash'] not in inserted]
+    stored = set()
+    if skipped:
+        stored = set(UniChatMessage
+                     .select(UniChatMessage.dedup_hash, UniChatMessage.external_id)
+                     .where(UniChatMessage.dedup_hash.in_(skipped))
+                     .tuples())
+    return [row for row in rows
+            if row['dedup_hash'] in inserted or (row['dedup_hash'], row['external_id']) in stored]
+
+
+def _track_cursors(cursors: dict, rows: list[dict]) -> None:
+    """
+    keeps the newest row per conversation in `cursors`, a later row of
+    the same timestamp is newer
+    """
+    for row in rows:
+        key = (row['chat_client'], row['conversation_key'])
+        if key not in cursors or row['timestamp'] >= cursors[key]['timestamp']:
+            cursors[key] = row
+
+
+def _advance_sync_states(rows) -> None:
+    """
+    moves the sync cursors of the conversations forward to `rows`, a
+    cursor is never moved back, e.g. by a backfilled history
+    """
+    for row in rows:
+        (SyncState
+         .insert(chat_client=row['chat_client'],
+                 conversation_key=row['conversation_key'],
+                 external_id=row['external_id'],
+                 timestamp=row['timestamp'])
+         .on_conflict(conflict_target=[SyncState.chat_client, SyncState.conversation_key],
+                      preserve=[SyncState.external_id, SyncState.timestamp],
+                      where=(pw.EXCLUDED.timestamp >= SyncState.timestamp))
+         .execute())
+
+
+def save_messages_bulk(chat_client: str,
+                       messages,
+                       chunk_size: int = config.db_bulk_chunk_size) -> list[int]:
+    """
+    stores many messages of `chat_client` at once. the rows are written
+    with chunked multi-row INSERTs inside a single transaction, so the
+    whole batch costs one commit. a message is a dict with the keys
+    from_contact, to_contact, timestamp and optionally text, photo_path,
+    video_path, media, dedup_hash and external_id. messages that are
+    already stored (same dedup hash) are skipped by the database, so a
+    batch can be submitted blindly. messages with and without an external
+    id match their stored copies of the other kind, see
+    `_claim_stored_rows`. the sync cursors of the conversations advance to
+    the newest stored external id of the batch in the same transaction.
+    returns the ids of the created messages in order
+    """
+    database = UniChatMessage._meta.database
+    occurrences = collections.Counter()
+    cursors = {}
+    timestamps = {'previous': None, 'unparsable': 0}
+    rows = (_to_message_row(chat_client, message, occurrences) for message in messages)
+    ids = []
+    # IMMEDIATE takes the write lock up front, a deferred transaction could
+    # fail to upgrade its read lock while another connection writes
+    with database.atomic('IMMEDIATE'):
+        for chunk in _chunks(rows, chunk_size):
+            _fill_timestamps([row for row, _ in chunk], timestamps)
+            _claim_stored_rows(chunk)
+            chunk = [row for row, _ in chunk]
+            if database.server_version >= (3, 35, 0):
+                query = (UniChatMessage
+                         .insert_many(chunk)
+                         .on_conflict(conflict_target=[UniChatMessage.dedup_hash],
+                                      action='NOTHING')
+                         .returning(UniChatMessage.id, UniChatMessage.dedup_hash))
+                inserted = [(message.id, message.dedup_hash) for message in query.execute()]
+            else:
+                # no RETURNING, the rowid of a single row insert is known
+                # and the change counter tells whether it was ignored
+                connection = database.connection()
+                inserted = []
+                for row in chunk:
+                    changes = connection.total_changes
+                    query = (UniChatMessage
+                             .insert(**row)
+                             .on_conflict(conflict_target=[UniChatMessage.dedup_hash],
+                                          action='NOTHING'))
+                    message_id = query.execute()
+                    if connection.total_changes > changes:
+                        inserted.append((message_id, row['dedup_hash']))
+            ids.extend(message_id for message_id, _ in inserted)
+            stored_hashes = {dedup_hash for _, dedup_hash in inserted}
+            _track_cursors(cursors, _get_stored_rows(chunk, stored_hashes))
+        _advance_sync_states(cursors.values())
+    if timestamps['unparsable']:
+        # once per batch, a client may deliver a whole page of them
+        logging.warning('%d %s messages with an unparsable timestamp got the one of the '
+                        'previous message', timestamps['unparsable'], chat_client)
+    return ids
+
+
+def save_message(chat_client: str, message: dict) -> UniChatMessage | None:
+    """
+    stores a single message of `chat_client`, see `save_messages_bulk`.
+    returns None if the message was already stored
+    """
+    ids = save_messages_bulk(chat_client, [message])
+    return UniChatMessage.get_by_id(ids[0]) if ids else None
+
+
+def get_messages_by_ids(ids: list[int]) -> list[UniChatMessage]:
+    """
+    unichat messages with the given ids, in the order of the ids
+    """
+    messages = {}
+    for chunk in _chunks(ids, config.db_bulk_chunk_size):
+        query = _select_messages().where(UniChatMessage.id.in_(chunk))
+        messages.update((message.id, message) for message in query)
+    return [messages[i] for i in ids if i in messages]
@@ -0,0 +1,100 @@
+"""
+bulk extraction of scraped message windows. one execute_script call
+reads all message blocks of the page and returns plain data, instead of
+several webdriver round trips (find_element, get_attribute, text) per
+message. parsing and contact resolution happen in python.
+
+what is read is described by a selector map of the client in `config`,
+e.g. `config.whatsapp_extraction`. all selectors are css selectors
+relative to a message block:
+    block: the message blocks (required)
+    id_attribute: attribute of the block or an ancestor that identifies it
+    metadata, metadata_attribute: attribute of an element, e.g. the
+        data-pre-plain-text of whatsapp
+    sender: text of the sender name
+    timestamp, timestamp_attribute: text (or attribute) of the time
+    text: text of the message
+    own: an element that only messages of the owner contain
+    media: elements with a src, e.g. the images of the message
+    scroll_into_view: for clients that render the content lazily. the
+        page only renders after the script returned, so the blocks are
+        read in batches of `scroll_batch_size` (default 10), every batch
+        is scrolled into view in a round trip of its own before it is read
+"""
+from typing import Any
+
+# external imports
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+# arguments: selector map, root element (or null for the document), start, end
+EXTRACT_SCRIPT = '''
+const [selectors, root, start, end] = arguments;
+function read(block, selector, attribute) {
+    if (!selector) {
+        return null;
+    }
+    const element = block.matches(selector) ? block : block.querySelector(selector);
+    if (!element) {
+        return null;
+    }
+    return attribute ? element.getAttribute(attribute) : element.innerText;
+}
+const blocks = Array.from((root || document).querySelectorAll(selectors.block))
+    .slice(start, end === null ? undefined : end);
+return blocks.map(function (block) {
+    let id = null;
+    if (selectors.id_attribute) {
+        const identified = block.closest('[' + selectors.id_attribute + ']')
+            || block.querySelector('[' + selectors.id_attribute + ']');
+        id = identified ? identified.getAttribute(selectors.id_attribute) : null;
+    }
+    return {
+        id: id,
+        metadata: read(block, selectors.metadata, selectors.metadata_attribute),
+        sender: read(block, selectors.sender, null),
+        timestamp: read(block, selectors.timestamp, selectors.timestamp_attribute),
+        text: read(block, selectors.text, null),
+        is_own: selectors.own ? block.querySelector(selectors.own) !== null : null,
+        media: selectors.media
+            ? Array.from(block.querySelectorAll(selectors.media),
+                         element => element.getAttribute('src'))
+            : [],
+    };
+});
+'''
+
+# arguments: block selector, root element (or null for the document), index (or null)
+SCROLL_SCRIPT = '''
+const [blockSelector, root, index] = arguments;
+const blocks = (root || document).querySelectorAll(blockSelector);
+if (index !== null && index < blocks.length) {
+    blocks[index].scrollIntoView(true);
+}
+return blocks.length;
+'''
+
+
+def extract_messages(driver: WebDriver,
+                     selectors: dict[str, Any],
+                     root: WebElement | None = None,
+                     start: int = 0,
+                     end: int | None = None) -> list[dict[str, Any]]:
+    """
+    reads the message blocks below `root` (default: the whole page) in
+    one script call, optionally only the blocks[start:end]. returns a
+    dict per block with the keys id, metadata, sender, timestamp, text,
+    is_own and media; a value that the selector map does not describe
+    or that is missing in the block is None
+    """
+    if not selectors.get('scroll_into_view'):
+        return driver.execute_script(EXTRACT_SCRIPT, selectors, root, start, end) or []
+    indexes = range(driver.execute_script(SCROLL_SCRIPT, selectors['block'], root, None))[start:end]
+    batch_size = selectors.get('scroll_batch_size', 10)
+    blocks = []
+    for i in range(0, len(indexes), batch_size):
+        batch = indexes[i:i + batch_size]
+        driver.execute_script(SCROLL_SCRIPT, selectors['block'], root, batch[0])
+        blocks += driver.execute_script(EXTRACT_SCRIPT, selectors, root,
+                                        batch[0], batch[-1] + 1) or []
+    return blocks
@@ -1,4 +1,5 @@
 import os
+import shutil
 import socket
 import threading
 import logging
@@ -13,34 +14,50 @@ import unichat.config as config
 import unichat.helpers as helpers
 
 
+def _copy_profile(source_dir: str, userdata_dir: str) -> None:
+    """ copies a browser profile without its caches and the locks of a running browser """
+    try:
+        shutil.copytree(source_dir, userdata_dir,
+                        ignore=shutil.ignore_patterns('Singleton*', 'lockfile', '*Cache'))
+    except (OSError, shutil.Error) as e:
+        logging.warning('copying the browser profile %s failed: %s', source_dir, e)
+
+
 class DriverManager:
     """Driver Manager class to create Selenium webdriver instances."""
 
     def __init__(self,
                  headless: bool = True,
-                 default_driver_port: int = 9222,
-                 host: str = 'localhost') -> None:
+                 default_driver_port: int = config.driver_port,
+                 host: str = 'localhost',
+                 userdata_dir: str = '') -> None:
         """Initialize DriverManager instance with the given configurations.
 
         :param headless: Boolean to enable headless mode.
+        :param default_driver_port: Remote debugging port of the browser.
+        :param userdata_dir: Browser profile directory, every browser needs its own.
         """
 
-        self.userdata_dir = os.path.join(helpers.get_user_data_dir_path(),
-                                         'chromedriver-userdata')
+        self.userdata_dir = userdata_dir or os.path.join(helpers.get_user_data_dir_path(),
+                                                         config.driver_userdata_dir)
         self.headless = headless
         self.default_driver_port = default_driver_port
         self.host = host
+        # reentrant, so a command can call other commands of its client
+        self.mutexLock = threading.RLock()
+        # the browser is started on first use, see `get_chromedriver`
         self.driver = None
-        self.driver = self.get_chromedriver()
-        self.mutexLock = threading.Lock()
 
     def get_chromedriver(self) -> webdriver.Chrome:
-        """Creates and returns a ChromeDriver instance with the given configurations.
+        """Returns the ChromeDriver instance, it is created with the given configurations
+        on the first call.
 
         :return: Selenium webdriver instance.
         """
         if not self.driver:
-            self.driver = self.initialize_driver()
+            with self.mutexLock:
+                if not self.driver:
+                    self.driver = self.initialize_driver()
         return self.driver
 
     def initialize_driver(self) -> webdriver.Chrome:
@@ -86,12 +103,9 @@ class DriverManager:
         self.driver.switch_to.window(driver_window_handle)
 
     def execute_driver_command(self, func: Callable, *args) -> Any:
-        """ executes the driver command """
+        """ executes the driver command, one at a time per browser """
         with self.mutexLock:
-            if len(args) > 0:
-                return func(*args)
-            else:
-                return func(*args)
+            return func(*args)
 
     def close_driver(self) -> None:
         """Closes the driver and window."""
@@ -146,3 +160,57 @@ class DriverManager:
             return True
         except ConnectionRefusedError:
             return False
+
+
+class DriverPool:
+    """
+    hands out a driver manager per chat client. with a pool size of 1 all
+    clients share one browser (and its lock) in separate tabs. a larger
+    pool starts a browser with its own profile, port and lock per client,
+    so a slow command of one client does not block the others. clients
+    beyond the pool size share the browsers round robin. a browser is only
+    started when its client uses it first
+    """
+
+    def __init__(self, headless: bool = True, size: int = config.driver_pool_size) -> None:
+        self.headless = headless
+        self.size = max(1, size)
+        self.driver_managers: list[DriverManager] = []
+        # client name -> driver manager
+        self.assigned: dict[str, DriverManager] = {}
+        self.lock = threading.Lock()
+
+    def get_driver_manager(self, client_name: str) -> DriverManager:
+        """ returns the driver manager of the client, adds a browser if the pool is not full """
+        with self.lock:
+            if client_name not in self.assigned:
+                if len(self.driver_managers) < self.size:
+                    driver_manager = self._create_driver_manager(len(self.driver_managers),
+                                                                 client_name)
+                    self.driver_managers.append(driver_manager)
+                else:
+                    driver_manager = self.driver_managers[len(self.assigned) % self.size]
+                self.assigned[client_name] = driver_manager
+            return self.assigned[client_name]
+
+    def _create_driver_manager(self, index: int, client_name: str) -> DriverManager:
+        """
+        the first browser keeps the profile of the shared mode. the others
+        get a profile named after their first client, which starts as a copy
+        of the shared one, so the logins of the shared mode are kept
+        """
+        shared_dir = os.path.join(helpers.get_user_data_dir_path(), config.driver_userdata_dir)
+        userdata_dir = shared_dir
+        if index > 0:
+            userdata_dir = f'{shared_dir}-{client_name}'
+            if not os.path.exists(userdata_dir) and os.path.isdir(shared_dir):
+                _copy_profile(shared_dir, userdata_dir)
+        return DriverManager(headless=self.headless,
+                             default_driver_port=config.driver_port + index,
+                             userdata_dir=userdata_dir)
+
+    def close_drivers(self) -> None:
+        """ closes all browsers of the pool """
+        with self.lock:
+            for driver_manager in self.driver_managers:
+                driver_manager.close_driver()
@@ -3,6 +3,7 @@ collection of helper functions
 """
 import itertools
 import os
+from collections.abc import Iterable, Iterator
 from importlib import resources
 from datetime import datetime, timezone
 
@@ -46,11 +47,20 @@ def format_msg(message: str, line_length: int = 64) -> str:
     return '\n'.join([first_part, second_part])
 
 
+def epoch_ms_to_datetime(epoch_ms: int) -> datetime:
+    """
+    local time of an UTC epoch milliseconds timestamp, as stored in the database
+    """
+    return datetime.fromtimestamp(epoch_ms / 1000)
+
+
 def convert_timestamp_to_date(timestamp) -> str:
     """
-    since sqlite stores datetime objects as string, timestamp can either be
-    a string or a datetime object
+    timestamp can be epoch milliseconds (as stored in the database),
+    a datetime object or a date string
     """
+    if isinstance(timestamp, int):
+        timestamp = epoch_ms_to_datetime(timestamp)
     try:
         timestamp = timestamp.strftime('%Y-%m-%d')
     except AttributeError:
@@ -62,6 +72,18 @@ def convert_timestamp_to_date(timestamp) -> str:
     return '.'.join([day, month, year])
 
 
+def convert_timestamp_to_time(timestamp) -> str:
+    """
+    local time of day (e.g. 13:37), timestamp is like in `convert_timestamp_to_date`
+    """
+    if isinstance(timestamp, int):
+        timestamp = epoch_ms_to_datetime(timestamp)
+    try:
+        return timestamp.strftime('%H:%M')
+    except AttributeError:
+        return timestamp[11:16]
+
+
 def get_user_data_dir_path() -> str:
     """
         returns absolut path of userdata directory
@@ -112,7 +134,8 @@ def string_to_utc_timestamp(date_string: str) -> str:
     for fmt in formats:
         try:
             date_object = datetime.strptime(date_string, fmt)
-            date_utc = date_object.replace(tzinfo=timezone.utc)
+            # the web clients show the local time
+            date_utc = date_object.astimezone(timezone.utc)
             return date_utc.isoformat()
         except ValueError:
             pass
@@ -120,6 +143,41 @@ def string_to_utc_timestamp(date_string: str) -> str:
     return f'Invalid date format: {date_string}'
 
 
+def timestamp_to_epoch_ms(timestamp) -> int | None:
+    """
+    UTC epoch milliseconds of a message timestamp: epoch milliseconds, a
+    datetime or an ISO 8601 string, naive ones are local time. None if the
+    timestamp can not be parsed
+    """
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    try:
+        return round(timestamp.timestamp() * 1000)
+    except AttributeError:
+        return None
+
+
+def chunks_by_timestamp(messages: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """
+    chunks of about `size` messages that are split between different
+    timestamps only, so identical messages of one timestamp are counted
+    in the same dedup batch
+    """
+    chunk = []
+    for message in messages:
+        if len(chunk) >= size and message['timestamp'] != chunk[-1]['timestamp']:
+            yield chunk
+            chunk = []
+        chunk.append(message)
+    if chunk:
+        yield chunk
+
+
 def find_xpath_with_class(class_name: str) -> str:
     """Helper to find xpath elements in Instagram web client.
 
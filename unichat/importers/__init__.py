@@ -0,0 +1,5 @@
+"""
+offline importers for the chat exports of the clients. they backfill the
+history through the bulk ingestion path with deduplication, so the
+scrapers only need to fetch new messages
+"""
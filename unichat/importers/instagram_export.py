@@ -0,0 +1,165 @@
+"""
+importer for the message files of the instagram data download ("Download
+your information", format json), from the extracted archive:
+.../messages/inbox/<thread>/message_1.json, message_2.json, ...
+
+every file holds up to some thousand messages of a thread, newest first,
+so the files are read one at a time from the oldest. instagram writes
+the strings as utf-8 bytes escaped as latin-1 code points ('Ã¤' instead
+of 'ä'), `fix_encoding` reverts that
+"""
+import json
+import logging
+import os
+import re
+from collections.abc import Iterator
+from datetime import datetime, timezone
+
+# external imports
+import peewee as pw
+
+# project imports
+import unichat.clients.instagram_client.instagram_db as idb
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.media_store as media_store
+
+MESSAGE_FILE_REGEX = re.compile(r'^message_(?P<number>\d+)\.json$')
+
+
+def fix_encoding(text: str) -> str:
+    """ decodes the latin-1 escaped utf-8 of an export string """
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        # not mojibake, e.g. an export that is encoded correctly
+        return text
+
+
+def _fix_object(obj: dict) -> dict:
+    return {key: fix_encoding(value) if isinstance(value, str) else value
+            for key, value in obj.items()}
+
+
+def load_message_file(file_path: str) -> dict:
+    """ reads a message file with the strings of its objects fixed """
+    with open(file_path, encoding='utf-8') as f:
+        return json.load(f, object_hook=_fix_object)
+
+
+def find_threads(path: str) -> dict[str, list[str]]:
+    """
+    message files per thread directory below `path` (the archive, the
+    inbox, a thread or a single message file), oldest file first
+    """
+    if os.path.isfile(path):
+        return {os.path.dirname(path): [path]}
+    threads = {}
+    for dir_path, _, file_names in os.walk(path):
+        numbered = [(int(match.group('number')), file_name) for file_name in file_names
+                    if (match := MESSAGE_FILE_REGEX.match(file_name))]
+        if numbered:
+            # message_1.json holds the newest messages
+            threads[dir_path] = [os.path.join(dir_path, file_name)
+                                 for _, file_name in sorted(numbered, reverse=True)]
+    return threads
+
+
+def resolve_participants(names: list[str]) -> tuple[str, db.Contact] | None:
+    """
+    (chat name, contact) of the other participant of a thread with the
+    owner, the contact is found by its instagram chat name. None for group
+    threads and threads of contacts that are not linked
+    """
+    if len(names) != 2:
+        return None
+    me = db.get_unichat_me()
+    for name in names:
+        try:
+            contact = idb.get_contact_from_instagram_name(name)
+        except pw.DoesNotExist:
+            continue
+        if contact.id != me.id:
+            return name, contact
+    return None
+
+
+def _find_media_file(file_path: str, uri: str) -> str | None:
+    """
+    local path of the uri of an attachment, it is relative to the root
+    of the archive, which is one of the directories above the message file
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    while True:
+        media_path = os.path.join(directory, uri)
+        if os.path.isfile(media_path):
+            return media_path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def _to_unichat_messages(file_path: str, messages: list[dict],
+                         names: dict[str, tuple[db.Contact, db.Contact]]) -> Iterator[dict]:
+    """
+    converts the messages of a file, oldest first. every photo becomes a
+    message of its own, the first one carries the text
+    """
+    for message in reversed(messages):
+        if message.get('sender_name') not in names:
+            continue
+        from_contact, to_contact = names[message['sender_name']]
+        text = message.get('content')
+        timestamp = datetime.fromtimestamp(message['timestamp_ms'] / 1000, tz=timezone.utc)
+        photos = [media_path for photo in message.get('photos', [])
+                  if (media_path := _find_media_file(file_path, photo.get('uri', '')))]
+        for media_path in photos or [None]:
+            media = media_store.add_file(media_path) if media_path else None
+            if text is None and media is None:
+                continue
+            yield {'from_contact': from_contact,
+                   'to_contact': to_contact,
+                   'text': text,
+                   'photo_path': media.get_file_path() if media else None,
+                   'media': media,
+                   'timestamp': timestamp}
+            text = None
+
+
+def _iter_thread_messages(file_paths: list[str],
+                          names: dict[str, tuple[db.Contact, db.Contact]]) -> Iterator[dict]:
+    """ the messages of all files of a thread, oldest first, read one file at a time """
+    for file_path in file_paths:
+        messages = load_message_file(file_path).get('messages', [])
+        yield from _to_unichat_messages(file_path, messages, names)
+
+
+def import_inbox(path: str) -> int:
+    """
+    imports the threads of an instagram data download below `path`.
+    threads of contacts that are not linked and group threads are
+    skipped, messages that are stored already as well. returns the
+    number of new messages
+    """
+    imported = 0
+    for thread_dir, file_paths in find_threads(path).items():
+        thread = load_message_file(file_paths[0])
+        participants = [participant['name'] for participant in thread.get('participants', [])]
+        resolved = resolve_participants(participants)
+        if resolved is None:
+            logging.info('instagram thread %s is skipped, no linked contact', thread_dir)
+            continue
+        contact_name, contact = resolved
+        # the other name is the owner, whatever it is called in the client
+        me = db.get_unichat_me()
+        names = {name: (me, contact) for name in participants}
+        names[contact_name] = (contact, me)
+        messages = _iter_thread_messages(file_paths, names)
+        for chunk in helpers.chunks_by_timestamp(messages, config.db_migration_batch_size):
+            imported += len(db.save_messages_bulk('instagram', chunk))
+            logging.info('imported %s instagram messages...', imported)
+        # a backfilled history is not unread
+        db.mark_conversation_read('instagram', db.get_conversation_key(me, contact))
+    return imported
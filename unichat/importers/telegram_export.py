@@ -0,0 +1,249 @@
+"""
+importer for the result.json of "Export chat history" (or "Export
+Telegram data") of telegram desktop.
+
+the file can reach gigabytes, so it is not loaded at once: a small
+streaming reader walks the json structure and decodes one message object
+at a time, the memory use is bounded by the largest message. the
+messages of the personal chats are mapped to the unichat contacts by
+their telegram user id, photos are copied into the media store. the
+messages get the same fields as the ones of the live client (UTC date
+to the second, raw text, photo stored by its content), so the dedup
+hash recognizes the messages that were synced already
+"""
+import json
+import logging
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+
+# external imports
+import peewee as pw
+
+# project imports
+import unichat.clients.telegram_client.telegram_db as tdb
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.media_store as media_store
+
+# characters that are read from the file at once
+READ_SIZE = 1 << 16
+PERSONAL_CHAT_TYPES = {'personal_chat', 'saved_messages'}
+
+
+class _JsonStream:
+    """
+    reads a json file piecewise. values are decoded with `raw_decode`
+    from a buffer that is refilled when a value reaches its end
+    """
+    decoder = json.JSONDecoder()
+
+    def __init__(self, f, read_size: int = READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """ reads more of the file, returns False at the end """
+        if self.eof:
+            return False
+        data = self.f.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        # drop the consumed part, the buffer stays about one read long
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """ next character that is not whitespace, '' at the end """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            context = self.buffer[self.pos:self.pos + 20]
+            raise ValueError(f'invalid json: expected {char!r} at {context!r}')
+        self.pos += 1
+
+    def skip(self, char: str) -> bool:
+        """ consumes `char` if it is next """
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """ decodes the next value """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the file
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _walk(stream: _JsonStream) -> Iterator[tuple[dict, dict]]:
+    """
+    walks the json value at the position of the stream and yields the
+    elements of every "messages" array with the scalar fields of its
+    object (the chat), i.e. the name, type and id that precede it
+    """
+    if stream.skip('{'):
+        fields = {}
+        if stream.skip('}'):
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'messages' and stream.peek() == '[':
+                stream.expect('[')
+                if not stream.skip(']'):
+                    while True:
+                        yield fields, stream.value()
+                        if not stream.skip(','):
+                            break
+                    stream.expect(']')
+            elif stream.peek() in '{[':
+                yield from _walk(stream)
+            else:
+                fields[key] = stream.value()
+            if not stream.skip(','):
+                break
+        stream.expect('}')
+    elif stream.skip('['):
+        if stream.skip(']'):
+            return
+        while True:
+            yield from _walk(stream)
+            if not stream.skip(','):
+                break
+        stream.expect(']')
+    else:
+        stream.value()
+
+
+def iter_chat_messages(f, read_size: int = READ_SIZE) -> Iterator[tuple[dict, dict]]:
+    """
+    yields (chat, message) for all messages of a result.json, the chat
+    holds the fields before the messages, e.g. name, type and id. works
+    for the export of a single chat and of all chats
+    """
+    yield from _walk(_JsonStream(f, read_size))
+
+
+def get_text(message: dict) -> str:
+    """
+    plain text of an exported message, formatted text is a list of
+    strings and entity objects
+    """
+    text = message.get('text', '')
+    if isinstance(text, list):
+        return ''.join(part if isinstance(part, str) else part.get('text', '') for part in text)
+    return text
+
+
+def get_timestamp(message: dict) -> datetime:
+    """ UTC datetime of an exported message, to the second like telegram """
+    if 'date_unixtime' in message:
+        return datetime.fromtimestamp(int(message['date_unixtime']), tz=timezone.utc)
+    # older exports only have the local time
+    return datetime.fromisoformat(message['date']).astimezone(timezone.utc)
+
+
+def get_user_id(from_id: str | None) -> int | None:
+    """ telegram user id of 'user123', None for channels and groups """
+    if isinstance(from_id, str) and from_id.startswith('user') and from_id[4:].isdigit():
+        return int(from_id[4:])
+    return None
+
+
+def _store_photo(export_dir: str, message: dict) -> db.Media | None:
+    """ copies the photo of an exported message into the media store """
+    photo = message.get('photo')
+    if not photo:
+        return None
+    file_path = os.path.join(export_dir, photo)
+    if not os.path.isfile(file_path):
+        # '(File not included. Change data exporting settings to download.)'
+        return None
+    return media_store.add_file(file_path)
+
+
+def _to_unichat_messages(chat_messages, export_dir: str, me: db.Contact, my_user_id: int):
+    """
+    converts the messages of the personal chats with linked contacts,
+    others are skipped with one log line per chat
+    """
+    skipped_chats = set()
+    for chat, message in chat_messages:
+        if message.get('type') != 'message' or chat.get('type') not in PERSONAL_CHAT_TYPES:
+            continue
+        peer_id = chat.get('id', my_user_id) if chat['type'] == 'personal_chat' else my_user_id
+        try:
+            contact = tdb.get_contact_from_telegram_user_id(peer_id)
+        except pw.DoesNotExist:
+            if peer_id not in skipped_chats:
+                skipped_chats.add(peer_id)
+                logging.info('telegram chat %s is not linked to a contact, skipped',
+                             chat.get('name'))
+            continue
+        sender_id = get_user_id(message.get('from_id'))
+        if sender_id == peer_id:
+            from_contact, to_contact = contact, me
+        elif sender_id == my_user_id:
+            from_contact, to_contact = me, contact
+        else:
+            continue
+        media = _store_photo(export_dir, message)
+        yield {'from_contact': from_contact,
+               'to_contact': to_contact,
+               'text': get_text(message),
+               'photo_path': media.get_file_path() if media else None,
+               'media': media,
+               'timestamp': get_timestamp(message),
+               # the same id as the messages of the telegram client
+               'external_id': str(message['id'])}
+
+
+def import_result_json(file_path: str) -> int:
+    """
+    imports the personal chats of a telegram desktop export. the owner
+    has to be linked to telegram, chats with contacts that are not linked
+    are skipped. messages that are stored already are skipped, so an
+    export can be imported again. returns the number of new messages
+    """
+    me = tdb.get_telegram_me()
+    if me is None:
+        raise ValueError('the owner is not linked to telegram')
+    my_user_id = me.telegramcontact.user_id
+    export_dir = os.path.dirname(os.path.abspath(file_path))
+
+    imported = 0
+    conversation_keys = set()
+    with open(file_path, encoding='utf-8-sig') as f:
+        messages = _to_unichat_messages(iter_chat_messages(f), export_dir, me, my_user_id)
+        for chunk in helpers.chunks_by_timestamp(messages, config.db_migration_batch_size):
+            imported += len(db.save_messages_bulk('telegram', chunk))
+            conversation_keys.update(db.get_conversation_key(m['from_contact'], m['to_contact'])
+                                     for m in chunk)
+            logging.info('imported %s telegram messages...', imported)
+
+    # a backfilled history is not unread
+    for conversation_key in conversation_keys:
+        db.mark_conversation_read('telegram', conversation_key)
+    return imported
@@ -0,0 +1,230 @@
+"""
+importer for the "Export chat" files of the whatsapp app: a text file, or
+a zip file with the text file and the attached media.
+
+the file is parsed line by line, so the memory use does not depend on the
+length of the chat. the timestamps are cut to the minute like the ones
+that the web client shows. the export has no message ids, the imported
+and the scraped messages are matched by their content, see
+`db.save_messages_bulk`
+"""
+import contextlib
+import io
+import logging
+import os
+import re
+import shutil
+import zipfile
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+
+# project imports
+import unichat.clients.whatsapp_client.whatsapp_db as wdb
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.media_store as media_store
+
+# android: '31.12.23, 22:15 - Trinity: hi', ios: '[31.12.23, 22:15:07] Trinity: hi'
+HEADER_REGEX = re.compile(r'^\[?(?P<date>\d{1,4}[./-]\d{1,2}[./-]\d{1,4}),? '
+                          r'(?P<time>\d{1,2}[:.]\d{2}(?:[:.]\d{2})?(?: ?[AaPp]\.? ?[Mm]\.?)?)'
+                          r'(?:\] | - )(?P<rest>.*)$')
+# android: 'IMG-20231231-WA0001.jpg (file attached)',
+# ios: '<attached: 00000012-PHOTO-2023-12-31.jpg>'
+ATTACHMENT_REGEX = re.compile(r'^(?:<attached: (?P<ios>[^>]+)>'
+                              r'|(?P<android>\S+\.\w+) \(file attached\))$')
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# 'WhatsApp Chat with Trinity.txt' or 'WhatsApp Chat - Trinity.zip'
+FILE_NAME_REGEX = re.compile(r'^WhatsApp Chat (?:with|-) (?P<chat_name>.+?)(?:\.txt|\.zip)?$')
+
+
+def _clean_line(line: str) -> str:
+    """ removes the direction marks and the narrow spaces of the exports """
+    return (line.rstrip('\r\n')
+            .replace('\u200e', '')
+            .replace('\u202f', ' ')
+            .replace('\xa0', ' '))
+
+
+def _split_date(date: str) -> list[int]:
+    return [int(part) for part in re.split(r'[./-]', date)]
+
+
+def detect_day_first(lines: Iterable[str]) -> bool:
+    """
+    the order of day and month depends on the locale of the phone. a
+    component above 12 decides, dates with dots are day first otherwise
+    """
+    uses_dots = False
+    for line in lines:
+        match = HEADER_REGEX.match(_clean_line(line))
+        if match is None:
+            continue
+        first, second, _ = _split_date(match.group('date'))
+        if first > 12:
+            return True
+        if second > 12:
+            return False
+        uses_dots = uses_dots or '.' in match.group('date')
+    return uses_dots
+
+
+def parse_timestamp(date: str, time: str, day_first: bool) -> datetime:
+    """
+    UTC datetime of the local date and time of an export line, cut to
+    the minute
+    """
+    first, second, year = _split_date(date)
+    if first > 31:
+        # year first, e.g. 2023-12-31
+        year, first, second = first, second, year
+    day, month = (first, second) if day_first else (second, first)
+    if year < 100:
+        year += 2000
+    time = time.replace(' ', '').lower()
+    is_pm = time.endswith(('pm', 'p.m.'))
+    is_am = time.endswith(('am', 'a.m.'))
+    hour, minute = (int(part) for part in re.split(r'[:.]', time.rstrip('apm.'))[:2])
+    if is_pm and hour < 12:
+        hour += 12
+    elif is_am and hour == 12:
+        hour = 0
+    local = datetime(year, month, day, hour, minute)
+    return local.astimezone(timezone.utc)
+
+
+def parse_chat_export(lines: Iterable[str], day_first: bool) -> Iterator[dict]:
+    """
+    yields the messages of an export, a dict with timestamp, sender, text
+    and attachment (a file name or None). lines without a date continue
+    the message before, system messages without a sender are skipped
+    """
+    message = None
+    for line in lines:
+        line = _clean_line(line)
+        match = HEADER_REGEX.match(line)
+        if match is None:
+            if message is not None:
+                message['lines'].append(line)
+            continue
+        if message is not None:
+            yield _finish_message(message)
+        sender, separator, text = match.group('rest').partition(': ')
+        if not separator:
+            # e.g. 'Messages and calls are end-to-end encrypted.'
+            message = None
+            continue
+        timestamp = parse_timestamp(match.group('date'), match.group('time'), day_first)
+        message = {'timestamp': timestamp,
+                   'sender': sender,
+                   'lines': [text]}
+    if message is not None:
+        yield _finish_message(message)
+
+
+def _finish_message(message: dict) -> dict:
+    """ separates an attachment from the text of a parsed message """
+    lines = message.pop('lines')
+    attachment = ATTACHMENT_REGEX.match(lines[0])
+    if attachment:
+        message['attachment'] = attachment.group('ios') or attachment.group('android')
+        lines = lines[1:]
+    else:
+        message['attachment'] = None
+    message['text'] = '\n'.join(lines) or None
+    return message
+
+
+@contextlib.contextmanager
+def _open_export(file_path: str):
+    """
+    yields a function that opens the chat text and the zip file with the
+    attachments (None for a text export)
+    """
+    if not zipfile.is_zipfile(file_path):
+        yield lambda: open(file_path, encoding='utf-8-sig'), None
+        return
+    with zipfile.ZipFile(file_path) as archive:
+        texts = [name for name in archive.namelist() if name.endswith('.txt')]
+        if not texts:
+            raise ValueError(f'{file_path} contains no chat text')
+        # the chat is '_chat.txt' (ios) or 'WhatsApp Chat with <name>.txt' (android)
+        text = min(texts, key=lambda name: (os.path.basename(name) != '_chat.txt', len(name)))
+        yield (lambda: io.TextIOWrapper(archive.open(text), encoding='utf-8-sig')), archive
+
+
+def _store_attachment(archive: zipfile.ZipFile | None, file_name: str) -> db.Media | None:
+    """ adds an attached photo of the zip file to the media store """
+    if archive is None or os.path.splitext(file_name)[1].lower() not in PHOTO_EXTENSIONS:
+        return None
+    try:
+        member = archive.open(file_name)
+    except KeyError:
+        return None
+    file_path = media_store.get_temp_file_path(os.path.splitext(file_name)[1])
+    with member, open(file_path, 'wb') as f:
+        shutil.copyfileobj(member, f)
+    return media_store.add_file(file_path, move=True)
+
+
+def get_chat_name(file_path: str) -> str | None:
+    """ chat name from the file name that the app suggests, None if renamed """
+    match = FILE_NAME_REGEX.match(os.path.basename(file_path))
+    return match.group('chat_name') if match else None
+
+
+def import_chat_export(file_path: str, contact: db.Contact, chat_name: str | None = None) -> int:
+    """
+    imports the export of the chat with `contact`. the contact is linked
+    to `chat_name` (default: from the file name) unless it is linked
+    already. messages of the chat name are from the contact, all others
+    from the owner. returns the number of new messages
+    """
+    me = db.get_unichat_me()
+    whatsapp_contact = wdb.get_whatsapp_contact(contact)
+    if whatsapp_contact is None:
+        chat_name = chat_name or get_chat_name(file_path)
+        if chat_name is None:
+            raise ValueError('the chat name of the contact is not known')
+        whatsapp_contact = wdb.WhatsAppContact.create(phone_nr='-',
+                                                      chat_name=chat_name,
+                                                      is_linked=False,
+                                                      contact=contact)
+        db.invalidate_identity_caches()
+
+    with _open_export(file_path) as (open_text, archive):
+        with open_text() as f:
+            day_first = detect_day_first(f)
+
+        def to_unichat_messages(exported_messages):
+            for exported in exported_messages:
+                is_incoming = exported['sender'] == whatsapp_contact.chat_name
+                from_contact, to_contact = (contact, me) if is_incoming else (me, contact)
+                message = {'from_contact': from_contact,
+                           'to_contact': to_contact,
+                           'text': exported['text'],
+                           'timestamp': exported['timestamp']}
+                if exported['attachment']:
+                    media = _store_attachment(archive, exported['attachment'])
+                    if media is not None:
+                        message['photo_path'] = media.get_file_path()
+                        message['media'] = media
+                    elif message['text'] is None:
+                        message['text'] = exported['attachment']
+                if message['text'] is not None or message.get('photo_path'):
+                    yield message
+
+        imported = 0
+        with open_text() as f:
+            messages = to_unichat_messages(parse_chat_export(f, day_first))
+            for chunk in helpers.chunks_by_timestamp(messages, config.db_migration_batch_size):
+                imported += len(db.save_messages_bulk('whatsapp', chunk))
+                logging.info('imported %s whatsapp messages...', imported)
+
+    # a backfilled history is not unread
+    db.mark_conversation_read('whatsapp', db.get_conversation_key(me, contact))
+    # the scraper only fetches the messages after the imported ones
+    whatsapp_contact.is_linked = True
+    whatsapp_contact.save()
+    db.invalidate_identity_caches()
+    return imported
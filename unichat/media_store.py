@@ -0,0 +1,169 @@
+"""
+content addressed media store. a file is stored once under the hash of
+its content, sharded into subdirectories (media/ab/cd/abcd...jpg), no
+matter how many messages or chat clients deliver it. the store is
+bounded by `config.media_quota_bytes`, the least recently used files
+are evicted first
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+# external imports
+import peewee as pw
+
+# project imports
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def get_media_dir_path() -> str:
+    """ returns the absolute path of the media directory """
+    return os.path.join(helpers.get_user_data_dir_path(), config.media_dir)
+
+
+def get_temp_file_path(suffix: str = '') -> str:
+    """
+    returns a new file path for a download in the media directory, it is
+    on the same file system as the store, so adding it is a rename
+    """
+    tmp_dir = os.path.join(get_media_dir_path(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, file_path = tempfile.mkstemp(suffix=suffix, dir=tmp_dir)
+    os.close(fd)
+    return file_path
+
+
+def hash_file(file_path: str) -> str:
+    """ blake2b hash of the file content """
+    content_hash = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1 << 16):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def add_file(file_path: str, source_key: str | None = None, move: bool = False) -> db.Media:
+    """
+    adds a file to the store, the content is only written if it is not
+    stored yet. `source_key` identifies the media in its chat client,
+    see `get_by_source`. with `move` the file is moved into the store
+    (or deleted if its content is stored already), otherwise copied
+    """
+    content_hash = hash_file(file_path)
+    if (source_key is not None
+            and db.Media.select().where(db.Media.source_key == source_key).exists()):
+        # another content was stored under this key, e.g. a changed file
+        source_key = None
+    media = db.Media.get_or_none(db.Media.content_hash == content_hash)
+    if media is None or not os.path.exists(media.get_file_path()):
+        extension = os.path.splitext(file_path)[1].lower()
+        relative_path = os.path.join(content_hash[:2], content_hash[2:4], content_hash + extension)
+        store_path = os.path.join(get_media_dir_path(), relative_path)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        if move:
+            shutil.move(file_path, store_path)
+        else:
+            # copy next to the target first, a reader never sees half a file
+            tmp_path = get_temp_file_path(extension)
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, store_path)
+        size = os.path.getsize(store_path)
+        if media is None:
+            try:
+                media = db.Media.create(content_hash=content_hash,
+                                        path=relative_path,
+                                        size=size,
+                                        source_key=source_key,
+                                        last_access=_now_ms())
+            except pw.IntegrityError:
+                # the same content was added concurrently, into the same file
+                return db.Media.get(db.Media.content_hash == content_hash)
+            evict()
+            return media
+        media.path = relative_path
+        media.size = size
+    elif move:
+        os.remove(file_path)
+
+    if media.source_key is None and source_key is not None:
+        media.source_key = source_key
+    media.last_access = _now_ms()
+    media.save()
+    return media
+
+
+def get_by_source(source_key: str, mark_used: bool = True) -> db.Media | None:
+    """
+    returns the stored media of a chat client id, e.g. 'telegram:photo:<id>',
+    None if it is not stored (or was evicted). without `mark_used` it
+    only reads, e.g. outside the persistence worker
+    """
+    media = db.Media.get_or_none(db.Media.source_key == source_key)
+    if media is None or not os.path.exists(media.get_file_path()):
+        return None
+    if mark_used:
+        touch([media.id])
+    return media
+
+
+def touch(media_ids: list[int]) -> None:
+    """ marks the media as used, e.g. when a chat history page is shown """
+    if media_ids:
+        (db.Media
+         .update(last_access=_now_ms())
+         .where(db.Media.id.in_(media_ids))
+         .execute())
+
+
+def get_total_size() -> int:
+    """ size of all stored files in bytes """
+    return db.Media.select(pw.fn.SUM(db.Media.size)).scalar() or 0
+
+
+def evict(quota: int | None = None) -> list[str]:
+    """
+    deletes the least recently used files while the store exceeds
+    `quota`, down to `config.media_evict_ratio` of it. profile pictures
+    are kept. the messages keep their photo path, the widget shows a
+    placeholder for a missing file. returns the deleted file paths
+    """
+    quota = config.media_quota_bytes if quota is None else quota
+    total_size = get_total_size()
+    if total_size <= quota:
+        return []
+
+    profile_pics = {contact.profile_pic_path
+                    for contact in db.Contact.select(db.Contact.profile_pic_path)}
+    target_size = quota * config.media_evict_ratio
+    deleted = []
+    evicted_ids = []
+    for media in db.Media.select().order_by(db.Media.last_access, db.Media.id):
+        if total_size <= target_size:
+            break
+        file_path = media.get_file_path()
+        if file_path in profile_pics:
+            continue
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning('evicting %s failed: %s', file_path, e)
+            continue
+        total_size -= media.size
+        deleted.append(file_path)
+        evicted_ids.append(media.id)
+
+    if evicted_ids:
+        db.Media.delete().where(db.Media.id.in_(evicted_ids)).execute()
+        logging.info('evicted %d media files', len(evicted_ids))
+    return deleted
@@ -0,0 +1,501 @@
+"""
+schema migrations for existing unichat databases.
+
+the applied schema version is stored in the `user_version` pragma of the
+database file. every migration step is idempotent and backfills in
+batches with a commit per batch, so the app (or a crash) can interrupt a
+step and it continues where it stopped on the next start.
+"""
+import datetime
+import logging
+import os
+import re
+
+# external imports
+import peewee as pw
+from playhouse.migrate import SqliteMigrator, migrate
+
+# project imports
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+import unichat.media_store as media_store
+
+
+def _get_column_names(database: pw.SqliteDatabase, table: str) -> list[str]:
+    """ column names of an existing table """
+    return [column.name for column in database.get_columns(table)]
+
+
+def _backfill(database: pw.SqliteDatabase,
+              select_sql: str,
+              update_sql: str,
+              convert) -> int:
+    """
+    generic batched backfill. `select_sql` has to select the rowid first
+    and take the last seen rowid and the batch size as parameters,
+    `convert` maps a selected row to the parameters of `update_sql`.
+    returns the number of updated rows
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        rows = database.execute_sql(select_sql,
+                                    (last_id, config.db_migration_batch_size)).fetchall()
+        if not rows:
+            return updated
+        with database.atomic():
+            for row in rows:
+                database.execute_sql(update_sql, convert(row))
+        last_id = rows[-1][0]
+        updated += len(rows)
+        logging.info('migration backfilled %s rows...', updated)
+
+
+def _find_dedup_hash(database: pw.SqliteDatabase,
+                     message_id: int,
+                     hash_args: tuple,
+                     table: str = 'unichatmessage') -> str:
+    """
+    dedup hash of a message with the first occurrence number that no
+    other message of `table` uses
+    """
+    occurrence = 0
+    while True:
+        dedup_hash = db.get_message_hash(*hash_args, occurrence=occurrence)
+        cursor = database.execute_sql(f'SELECT 1 FROM {table} '
+                                      'WHERE dedup_hash = ? AND id != ?',
+                                      (dedup_hash, message_id))
+        if cursor.fetchone() is None:
+            return dedup_hash
+        occurrence += 1
+
+
+def add_conversation_key(database: pw.SqliteDatabase) -> None:
+    """
+    version 1: normalized conversation key for the chat history queries.
+    the composite index is created afterwards by `db.init_database`
+    """
+    if 'conversation_key' not in _get_column_names(database, 'unichatmessage'):
+        migrator = SqliteMigrator(database)
+        migrate(migrator.add_column('unichatmessage',
+                                    'conversation_key',
+                                    pw.CharField(null=True)))
+    _backfill(database,
+              'SELECT id, from_contact_id, to_contact_id FROM unichatmessage '
+              'WHERE id > ? AND conversation_key IS NULL ORDER BY id LIMIT ?',
+              'UPDATE unichatmessage SET conversation_key = ? WHERE id = ?',
+              lambda row: (db.get_conversation_key(row[1], row[2]), row[0]))
+
+
+def add_dedup_hash(database: pw.SqliteDatabase) -> None:
+    """
+    version 2: unique deduplication hash. messages that are stored more
+    than once already get increasing occurrence numbers, nothing is deleted
+    """
+    if 'dedup_hash' not in _get_column_names(database, 'unichatmessage'):
+        migrator = SqliteMigrator(database)
+        migrate(migrator.add_column('unichatmessage',
+                                    'dedup_hash',
+                                    pw.CharField(null=True)))
+    # the unique index exists before the backfill, so the lookups of the
+    # occurrence loop are cheap
+    database.execute_sql('CREATE UNIQUE INDEX IF NOT EXISTS "unichatmessage_dedup_hash" '
+                         'ON "unichatmessage" ("dedup_hash")')
+
+    def to_update(row):
+        message_id, *hash_args = row
+        return _find_dedup_hash(database, message_id, hash_args), message_id
+
+    _backfill(database,
+              'SELECT id, chat_client, from_contact_id, to_contact_id, timestamp, '
+              'text, photo_path, video_path FROM unichatmessage '
+              'WHERE id > ? AND dedup_hash IS NULL ORDER BY id LIMIT ?',
+              'UPDATE unichatmessage SET dedup_hash = ? WHERE id = ?',
+              to_update)
+
+
+def add_message_search(database: pw.SqliteDatabase) -> None:
+    """
+    version 3: FTS5 index of the message texts. the sync triggers are
+    created first, then the existing texts are indexed in batches
+    """
+    fts = db.UniChatMessageSearch._meta.table_name
+    if database.table_exists(fts):
+        # an interrupted run, the index is rebuilt from scratch
+        database.execute_sql(f"INSERT INTO {fts} ({fts}) VALUES ('delete-all')")
+    with database.bind_ctx([db.UniChatMessageSearch]):
+        db.UniChatMessageSearch.create_table()
+    last_id = 0
+    while True:
+        row = database.execute_sql('SELECT MAX(id) FROM (SELECT id FROM unichatmessage '
+                                   'WHERE id > ? ORDER BY id LIMIT ?)',
+                                   (last_id, config.db_migration_batch_size)).fetchone()
+        if row[0] is None:
+            return
+        with database.atomic():
+            database.execute_sql(f'INSERT INTO {fts} (rowid, text) '
+                                 'SELECT id, text FROM unichatmessage '
+                                 'WHERE id > ? AND id <= ? AND text IS NOT NULL',
+                                 (last_id, row[0]))
+        last_id = row[0]
+        logging.info('indexed messages up to id %s...', last_id)
+
+
+def _parse_stored_timestamp(chat_client: str, timestamp) -> int | None:
+    """
+    epoch milliseconds of a timestamp stored before version 4, None if it
+    can not be parsed. the whatsapp web client shows local time, which was
+    stored with an UTC offset, so the offset is dropped again
+    """
+    if chat_client == 'whatsapp' and isinstance(timestamp, str):
+        try:
+            timestamp = datetime.datetime.fromisoformat(timestamp).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return helpers.timestamp_to_epoch_ms(timestamp)
+
+
+def convert_timestamps(database: pw.SqliteDatabase) -> None:
+    """
+    version 4: timestamps as UTC epoch milliseconds. converted rows are
+    integers, the others still have their stored text. a timestamp that
+    can not be parsed gets the value of the previous message, such that
+    the order of the history is kept, like a new message (see
+    `db.get_epoch_ms`). the dedup hashes are recomputed, since whatsapp
+    timestamps are now converted to UTC before hashing
+    """
+    database.execute_sql('DROP INDEX IF EXISTS "unichatmessage_chat_client_conversation_key_id"')
+    previous = database.execute_sql("SELECT timestamp FROM unichatmessage "
+                                    "WHERE typeof(timestamp) = 'integer' "
+                                    "ORDER BY id DESC LIMIT 1").fetchone()
+    state = {'previous': previous[0] if previous else 0, 'unparsable': 0}
+
+    def to_update(row):
+        message_id, chat_client, from_contact, to_contact, timestamp, *content = row
+        epoch_ms = _parse_stored_timestamp(chat_client, timestamp)
+        hash_args = (chat_client, from_contact, to_contact,
+                     timestamp if epoch_ms is None else epoch_ms, *content)
+        if epoch_ms is None:
+            state['unparsable'] += 1
+            epoch_ms = state['previous']
+        state['previous'] = epoch_ms
+        return epoch_ms, _find_dedup_hash(database, message_id, hash_args), message_id
+
+    _backfill(database,
+              'SELECT id, chat_client, from_contact_id, to_contact_id, timestamp, '
+              'text, photo_path, video_path FROM unichatmessage '
+              "WHERE id > ? AND typeof(timestamp) != 'integer' ORDER BY id LIMIT ?",
+              'UPDATE unichatmessage SET timestamp = ?, dedup_hash = ? WHERE id = ?',
+              to_update)
+    if state['unparsable']:
+        logging.warning('%d messages with an unparsable timestamp got the one of the '
+                        'previous message', state['unparsable'])
+
+
+def add_conversation_summary(database: pw.SqliteDatabase) -> None:
+    """
+    version 5: per conversation summary table. the triggers are created
+    with the table, the existing history is aggregated per conversation
+    in batches and counts as read
+    """
+    summary = db.ConversationSummary._meta.table_name
+    with database.bind_ctx([db.ConversationSummary]):
+        db.ConversationSummary.create_table()
+    last_id = 0
+    while True:
+        conversations = database.execute_sql(
+            'SELECT MIN(id), chat_client, conversation_key FROM unichatmessage '
+            'GROUP BY chat_client, conversation_key HAVING MIN(id) > ? '
+            'ORDER BY MIN(id) LIMIT ?',
+            (last_id, config.db_migration_batch_size)).fetchall()
+        if not conversations:
+            return
+        with database.atomic():
+            for _, chat_client, conversation_key in conversations:
+                database.execute_sql(
+                    f'INSERT OR REPLACE INTO {summary} (chat_client, conversation_key, contact_id, '
+                    f'last_message_id, last_timestamp, message_count, unread_count) '
+                    f'SELECT m.chat_client, m.conversation_key, '
+                    f'CASE WHEN c.is_me THEN m.to_contact_id ELSE m.from_contact_id END, '
+                    f'm.id, m.timestamp, (SELECT COUNT(*) FROM unichatmessage '
+                    f'WHERE chat_client = m.chat_client '
+                    f'AND conversation_key = m.conversation_key), 0 '
+                    f'FROM unichatmessage AS m JOIN contact AS c ON c.name = m.from_contact_id '
+                    f'WHERE m.chat_client = ? AND m.conversation_key = ? '
+                    f'ORDER BY m.timestamp DESC, m.id DESC LIMIT 1',
+                    (chat_client, conversation_key))
+        last_id = conversations[-1][0]
+        logging.info('summarized conversations up to message id %s...', last_id)
+
+
+def _import_legacy_file(file_path: str, source_key: str | None) -> db.Media | None:
+    """
+    moves a file of the user data directory into the media store. a file
+    that was moved already by an earlier row (or run) is found by its
+    source key, None if it is gone
+    """
+    if os.path.isfile(file_path):
+        return media_store.add_file(file_path, source_key=source_key, move=True)
+    if source_key is not None:
+        return media_store.get_by_source(source_key)
+    return None
+
+
+def add_media_store(database: pw.SqliteDatabase) -> None:
+    """
+    version 6: content addressed media store. the photos that were saved
+    as <telegram photo id>.jpg in the user data directory are moved into
+    the store, the messages reference them and their dedup hashes are
+    recomputed with the new file names. profile pictures move as well
+    """
+    with database.bind_ctx([db.Media]):
+        db.Media.create_table()
+    if 'media_id' not in _get_column_names(database, 'unichatmessage'):
+        database.execute_sql('ALTER TABLE unichatmessage ADD COLUMN media_id INTEGER '
+                             'REFERENCES media (id) ON DELETE SET NULL')
+    user_data_dir_path = helpers.get_user_data_dir_path()
+
+    def to_update(row):
+        (message_id, chat_client, from_contact, to_contact, timestamp, text, photo_path,
+         video_path, dedup_hash) = row
+        stem = os.path.splitext(os.path.basename(photo_path))[0]
+        source_key = None
+        if chat_client == 'telegram' and stem.isdigit():
+            source_key = f'telegram:photo:{stem}'
+        media = _import_legacy_file(photo_path, source_key)
+        if media is None:
+            logging.warning('photo %s of message %s is missing', photo_path, message_id)
+            return photo_path, None, dedup_hash, message_id
+        photo_path = media.get_file_path()
+        hash_args = (chat_client, from_contact, to_contact, timestamp, text, photo_path, video_path)
+        dedup_hash = _find_dedup_hash(database, message_id, hash_args)
+        return photo_path, media.id, dedup_hash, message_id
+
+    with database.bind_ctx([db.Media, db.Contact]):
+        _backfill(database,
+                  'SELECT id, chat_client, from_contact_id, to_contact_id, timestamp, '
+                  'text, photo_path, video_path, dedup_hash FROM unichatmessage '
+                  'WHERE id > ? AND photo_path IS NOT NULL AND media_id IS NULL '
+                  'ORDER BY id LIMIT ?',
+                  'UPDATE unichatmessage SET photo_path = ?, media_id = ?, dedup_hash = ? '
+                  'WHERE id = ?',
+                  to_update)
+        contacts = database.execute_sql('SELECT rowid, profile_pic_path FROM contact').fetchall()
+        for rowid, profile_pic_path in contacts:
+            if os.path.dirname(profile_pic_path) != user_data_dir_path:
+                continue
+            media = _import_legacy_file(profile_pic_path, None)
+            if media is not None:
+                database.execute_sql('UPDATE contact SET profile_pic_path = ? WHERE rowid = ?',
+                                     (media.get_file_path(), rowid))
+
+
+# columns that referenced a contact by its name before version 7
+CONTACT_REFERENCES = {
+    'whatsappcontact': ['contact_id'],
+    'telegramcontact': ['contact_id'],
+    'instagramcontact': ['contact_id'],
+    'conversationsummary': ['contact_id'],
+    'unichatmessage': ['from_contact_id', 'to_contact_id'],
+}
+
+
+def _create_table_with_contact_ids(database: pw.SqliteDatabase, table: str) -> None:
+    """
+    creates <table>_new with the columns of `table`, but with integer
+    contact references to contact_new. renaming contact_new to contact
+    later renames the references as well
+    """
+    sql = database.execute_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                               (table,)).fetchone()[0]
+    sql = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE IF NOT EXISTS "{table}_new"', sql)
+    for column in CONTACT_REFERENCES[table]:
+        sql = re.sub(rf'("?{column}"?)\s+VARCHAR\(\d+\)', r'\1 INTEGER', sql)
+    sql = re.sub(r'REFERENCES\s+"?contact"?\s*\(\s*"?name"?\s*\)',
+                 'REFERENCES "contact_new" ("id")', sql)
+    database.execute_sql(sql)
+
+
+def _copy_with_contact_ids(database: pw.SqliteDatabase, table: str) -> None:
+    """
+    copies a small table into <table>_new in one statement, rows of
+    contacts that do not exist anymore are dropped
+    """
+    references = CONTACT_REFERENCES[table]
+    columns = _get_column_names(database, table)
+    values = [f'(SELECT id FROM contact_new WHERE name = t.{column})' if column in references
+              else f't.{column}' for column in columns]
+    exists = ' AND '.join(f'EXISTS (SELECT 1 FROM contact_new WHERE name = t.{column})'
+                          for column in references)
+    database.execute_sql(f'DELETE FROM {table}_new')
+    database.execute_sql(f'INSERT INTO {table}_new ({", ".join(columns)}) '
+                         f'SELECT {", ".join(values)} FROM {table} AS t WHERE {exists}')
+
+
+def _copy_messages_with_contact_ids(database: pw.SqliteDatabase, contact_ids: dict) -> None:
+    """
+    copies the messages into unichatmessage_new in batches, continuing
+    after the last copied message. the conversation keys and the dedup
+    hashes are computed from the contact ids
+    """
+    columns = _get_column_names(database, 'unichatmessage')
+    insert_sql = (f'INSERT INTO unichatmessage_new ({", ".join(columns)}) '
+                  f'VALUES ({", ".join("?" * len(columns))})')
+    database.execute_sql('CREATE UNIQUE INDEX IF NOT EXISTS "unichatmessage_new_dedup_hash" '
+                         'ON "unichatmessage_new" ("dedup_hash")')
+    last_id = database.execute_sql('SELECT MAX(id) FROM unichatmessage_new').fetchone()[0] or 0
+    copied = 0
+    while True:
+        rows = database.execute_sql(f'SELECT {", ".join(columns)} FROM unichatmessage '
+                                    'WHERE id > ? ORDER BY id LIMIT ?',
+                                    (last_id, config.db_migration_batch_size)).fetchall()
+        if not rows:
+            return
+        with database.atomic():
+            for row in rows:
+                message = dict(zip(columns, row))
+                if (message['from_contact_id'] not in contact_ids
+                        or message['to_contact_id'] not in contact_ids):
+                    logging.warning('message %s of a removed contact is dropped', message['id'])
+                    continue
+                message['from_contact_id'] = contact_ids[message['from_contact_id']]
+                message['to_contact_id'] = contact_ids[message['to_contact_id']]
+                message['conversation_key'] = db.get_conversation_key(message['from_contact_id'],
+                                                                       message['to_contact_id'])
+                hash_args = (message['chat_client'], message['from_contact_id'],
+                             message['to_contact_id'], message['timestamp'], message['text'],
+                             message['photo_path'], message['video_path'])
+                message['dedup_hash'] = _find_dedup_hash(database, message['id'], hash_args,
+                                                         table='unichatmessage_new')
+                database.execute_sql(insert_sql, [message[column] for column in columns])
+        last_id = rows[-1][0]
+        copied += len(rows)
+        logging.info('migration copied %s messages...', copied)
+
+
+def add_contact_id(database: pw.SqliteDatabase) -> None:
+    """
+    version 7: integer surrogate key for the contacts instead of the name.
+    every table that references a contact is rebuilt as <table>_new with
+    integer references, the messages in batches. the conversation keys and
+    dedup hashes are recomputed from the ids. the old tables are swapped
+    with the new ones in one transaction at the end, an interrupted run
+    continues with the copied messages
+    """
+    if 'id' in _get_column_names(database, 'contact'):
+        return
+    with database.atomic():
+        database.execute_sql('CREATE TABLE IF NOT EXISTS "contact_new" ('
+                             '"id" INTEGER NOT NULL PRIMARY KEY, '
+                             '"name" VARCHAR(255) NOT NULL UNIQUE, '
+                             '"profile_pic_path" VARCHAR(255) NOT NULL, '
+                             '"is_me" INTEGER NOT NULL)')
+        database.execute_sql('INSERT INTO contact_new (name, profile_pic_path, is_me) '
+                             'SELECT name, profile_pic_path, is_me FROM contact '
+                             'WHERE name NOT IN (SELECT name FROM contact_new) ORDER BY rowid')
+    contact_ids = dict(database.execute_sql('SELECT name, id FROM contact_new').fetchall())
+    tables = [table for table in CONTACT_REFERENCES if database.table_exists(table)]
+
+    for table in tables:
+        _create_table_with_contact_ids(database, table)
+    with database.atomic():
+        for table in tables[:-1]:
+            _copy_with_contact_ids(database, table)
+        # the summaries are keyed by the conversation, e.g. 'Neo\x1fTrinity'
+        for summary_id, conversation_key in database.execute_sql(
+                'SELECT id, conversation_key FROM conversationsummary_new').fetchall():
+            names = conversation_key.split('\x1f')
+            if all(name in contact_ids for name in names):
+                conversation_key = db.get_conversation_key(*(contact_ids[name] for name in names))
+                database.execute_sql('UPDATE conversationsummary_new SET conversation_key = ? '
+                                     'WHERE id = ?', (conversation_key, summary_id))
+    _copy_messages_with_contact_ids(database, contact_ids)
+
+    with database.atomic():
+        # the renames check the schema, `db.init_database` recreates the triggers
+        triggers = database.execute_sql("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                        "AND tbl_name = 'unichatmessage'").fetchall()
+        for trigger, in triggers:
+            database.execute_sql(f'DROP TRIGGER {trigger}')
+        database.execute_sql('DROP INDEX "unichatmessage_new_dedup_hash"')
+        for table in tables:
+            database.execute_sql(f'DROP TABLE {table}')
+            database.execute_sql(f'ALTER TABLE {table}_new RENAME TO {table}')
+        database.execute_sql('DROP TABLE contact')
+        database.execute_sql('ALTER TABLE contact_new RENAME TO contact')
+
+
+def add_sync_state(database: pw.SqliteDatabase) -> None:
+    """
+    version 8: external message ids and the per conversation sync
+    cursors. the stored messages have no external ids, the cursors start
+    with the next fetch. the external id index is created afterwards by
+    `db.init_database`
+    """
+    if 'external_id' not in _get_column_names(database, 'unichatmessage'):
+        migrator = SqliteMigrator(database)
+        migrate(migrator.add_column('unichatmessage',
+                                    'external_id',
+                                    pw.CharField(null=True)))
+    with database.bind_ctx([db.SyncState]):
+        db.SyncState.create_table()
+
+
+# (schema version, migration step), ordered by version
+MIGRATIONS = [
+    (1, add_conversation_key),
+    (2, add_dedup_hash),
+    (3, add_message_search),
+    (4, convert_timestamps),
+    (5, add_conversation_summary),
+    (6, add_media_store),
+    (7, add_contact_id),
+    (8, add_sync_state),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(database: pw.SqliteDatabase) -> int:
+    """ schema version of the database file """
+    return database.pragma('user_version')
+
+
+def run() -> None:
+    """
+    migrates the database of the user data directory, before
+    `db.init_storage` creates the tables that are missing
+    """
+    db.create_user_data_dir()
+    migrate_database(db.get_database())
+
+
+def migrate_database(database: pw.SqliteDatabase) -> None:
+    """
+    brings an existing database up to `SCHEMA_VERSION`. a new database
+    gets the current schema from `db.init_database` and is only stamped
+    with the version
+    """
+    opened = database.connect(reuse_if_open=True)
+    try:
+        if not database.table_exists(db.UniChatMessage._meta.table_name):
+            database.pragma('user_version', SCHEMA_VERSION)
+            return
+        version = get_schema_version(database)
+        # the steps rebuild tables, the references are checked afterwards
+        foreign_keys = database.pragma('foreign_keys')
+        database.pragma('foreign_keys', 0)
+        try:
+            for step_version, step in MIGRATIONS:
+                if step_version <= version:
+                    continue
+                logging.info('migrating database to version %s...', step_version)
+                step(database)
+                database.pragma('user_version', step_version)
+        finally:
+            database.pragma('foreign_keys', foreign_keys)
+        for violation in database.execute_sql('PRAGMA foreign_key_check').fetchall():
+            logging.warning('foreign key violation after the migration: %s', violation)
+    finally:
+        if opened:
+            database.close()
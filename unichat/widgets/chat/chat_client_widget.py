@@ -1,5 +1,3 @@
-import collections
-
 # external imports
 from PySide6.QtCore import QSize
 from PySide6.QtGui import QIcon
@@ -12,10 +10,12 @@ from PySide6.QtWidgets import (
     QFileDialog,
     QPushButton,
     QHBoxLayout,
-    QSizePolicy
+    QSizePolicy,
+    QAbstractItemView
 )
 
 # project imports
+import unichat.config as config
 import unichat.db as db
 import unichat.helpers as helpers
 from unichat.clients.chat_client import ChatClient
@@ -38,6 +38,16 @@ class ChatClientWidget(QWidget):
         self.contact = contact
         self.chat_client = chat_client
         self.me = db.get_unichat_me()
+        self.conversation_key = db.get_conversation_key(self.me, self.contact)
+        # keyset pagination state of the chat history
+        self.oldest_message_id: int | None = None
+        # newer messages are appended by `add_message_to_chat_history`
+        self.newest_message_id: int | None = None
+        # epoch ms of the newest shown message, older ones are paged in
+        self.newest_timestamp: int | None = None
+        self.oldest_date: str | None = None
+        self.has_older_messages = True
+        self.is_loading_history = False
         self.chat_widget = QWidget()
         self.chat_message_history = QListWidget()
         self.send_file_button = QPushButton()
@@ -51,6 +61,9 @@ class ChatClientWidget(QWidget):
         layout = QVBoxLayout(self)
         layout.addWidget(self.chat_widget)
         layout.addWidget(self.chat_message_history)
+        self.chat_message_history.verticalScrollBar().valueChanged.connect(
+            self.handle_history_scroll
+        )
 
         # text input and send file button
         container_widget = QWidget()
@@ -98,9 +111,10 @@ class ChatClientWidget(QWidget):
         if file_dialog.exec():
             selected_files = file_dialog.selectedFiles()
             if selected_files:
-                photo = self.chat_client.upload_file(selected_files[0])
-                ucm = self.chat_client.send_photo_message(self.contact, photo)
-                self.add_message_to_chat_history(ucm)
+                ucm = self.chat_client.send_photo_message(self.contact, selected_files[0])
+                # None if the message arrived through the persistence worker first
+                if ucm is not None:
+                    self.add_message_to_chat_history(ucm)
                 self._scroll_to_last_message()
 
     def _scroll_to_last_message(self):
@@ -114,72 +128,123 @@ class ChatClientWidget(QWidget):
 
     def init_chat_display(self):
         """
-        loads messages from the contact from the database and
-        sets up the chat history in the GUI
+        sets up the chat history in the GUI with the newest page of
+        messages, older pages are loaded when the user scrolls up
 
         """
         self.chat_message_history.clear()
-        messages = self.load_messages()
-        dates = collections.defaultdict(int)
-        for ucm in messages:
-            date = helpers.convert_timestamp_to_date(ucm.timestamp)
-            # insert 'date' to the chat history
-            if dates[date] == 0:
-                self.insert_day_separator(date)
-            dates[date] += 1
-            self.add_message_to_chat_history(ucm)
+        self.oldest_message_id = None
+        self.newest_message_id = None
+        self.newest_timestamp = None
+        self.oldest_date = None
+        self.has_older_messages = True
+        self.load_older_messages()
         vb = self.chat_message_history.verticalScrollBar()
         self.chat_message_history.verticalScrollBar().setValue(vb.maximum())
         self._scroll_to_last_message()
         self.setContentsMargins(2, 2, 3, 4)
 
+    def handle_history_scroll(self, value: int):
+        """
+        loads the next older page when the chat history is scrolled
+        close to the top
+
+        """
+        vb = self.chat_message_history.verticalScrollBar()
+        if (value <= vb.minimum() + config.chat_history_load_threshold
+                and vb.maximum() > vb.minimum()
+                and self.has_older_messages
+                and not self.is_loading_history):
+            self.load_older_messages()
+
+    def load_older_messages(self):
+        """
+        fetches the page before the oldest displayed message and
+        prepends it to the chat history, the view stays at the message
+        that was on top before
+
+        """
+        self.is_loading_history = True
+        try:
+            messages = db.get_message_page(self.chat_client.name,
+                                           self.conversation_key,
+                                           before_id=self.oldest_message_id)
+            self.has_older_messages = len(messages) == config.chat_history_page_size
+            if messages and self.newest_message_id is None:
+                self.newest_message_id = messages[-1].id
+                self.newest_timestamp = helpers.timestamp_to_epoch_ms(messages[-1].timestamp)
+            if messages:
+                # the shown photos are the last ones the media store evicts
+                self.chat_client.touch_media([m.media_id for m in messages if m.media_id])
+                anchor = self.prepend_messages(messages)
+                if anchor is not None:
+                    self.chat_message_history.scrollToItem(anchor, QAbstractItemView.PositionAtTop)
+        finally:
+            self.is_loading_history = False
+
+    def prepend_messages(self, messages: list[db.UniChatMessage]) -> QListWidgetItem | None:
+        """
+        inserts `messages` (oldest first) with their day separators at the
+        top of the chat history. returns the item that was on top before
+
+        """
+        last_date = helpers.convert_timestamp_to_date(messages[-1].timestamp)
+        if last_date == self.oldest_date:
+            # the page continues the day on top, its separator moves up
+            self.chat_message_history.takeItem(0)
+        anchor = self.chat_message_history.item(0)
+
+        row = 0
+        date = None
+        for ucm in messages:
+            ucm_date = helpers.convert_timestamp_to_date(ucm.timestamp)
+            if ucm_date != date:
+                self._insert_history_widget(row, DateBubbleWidget(ucm_date))
+                row += 1
+                date = ucm_date
+            self._insert_history_widget(row, ChatMessageWidget(ucm))
+            row += 1
+
+        self.oldest_message_id = messages[0].id
+        self.oldest_date = helpers.convert_timestamp_to_date(messages[0].timestamp)
+        return anchor
+
+    def _insert_history_widget(self, row: int, widget: QWidget):
+        """
+        inserts a message or date bubble widget at `row` of the chat history
+
+        """
+        list_item = QListWidgetItem()
+        list_item.setSizeHint(widget.sizeHint())
+        self.chat_message_history.insertItem(row, list_item)
+        self.chat_message_history.setItemWidget(list_item, widget)
+
     def insert_day_separator(self, day):
         """
         inserts a date bubble so the user can see the date of
         the messages.
 
         """
-        list_item = QListWidgetItem(self.chat_message_history)
-        date_widget = DateBubbleWidget(day)
-        list_item.setSizeHint(date_widget.sizeHint())
-        self.chat_message_history.addItem(list_item)
-        self.chat_message_history.setItemWidget(list_item, date_widget)
+        self._insert_history_widget(self.chat_message_history.count(),
+                                    DateBubbleWidget(day))
 
     def add_message_to_chat_history(self, unichat_message: db.UniChatMessage):
         """
-        adds a single message to the chat history
-
-        """
-        list_item = QListWidgetItem(self.chat_message_history)
-        message_widget = ChatMessageWidget(unichat_message)
-        list_item.setSizeHint(message_widget.sizeHint())
-        self.chat_message_history.addItem(list_item)
-        self.chat_message_history.setItemWidget(list_item, message_widget)
+        adds a single message to the chat history, unless it is shown
+        already (e.g. it was stored while the history was loaded). a
+        message older than the shown ones, e.g. of a history that is
+        still being fetched, is not appended but paged in on scrolling up
+
+        """
+        if self.newest_message_id is not None and unichat_message.id <= self.newest_message_id:
+            return
+        timestamp = helpers.timestamp_to_epoch_ms(unichat_message.timestamp)
+        if (self.newest_timestamp is not None and timestamp is not None
+                and timestamp < self.newest_timestamp):
+            self.has_older_messages = True
+            return
+        self.newest_message_id = unichat_message.id
+        self.newest_timestamp = timestamp if timestamp is not None else self.newest_timestamp
+        self._insert_history_widget(self.chat_message_history.count(),
+                                    ChatMessageWidget(unichat_message))
         self._scroll_to_last_message()
-
-    def load_messages(self):
-        """
-        This function loads messages based on the contact,
-        filtering by whether the contact is the user or not.
-        :return: The `load_messages` method returns a result containing
-        UniChatMessage objects based on the conditions specified in the method.
-        If the contact is the user themselves (is_me), it retrieves messages
-        where the from_contact and to_contact are the same contact and orders them
-        by timestamp. If the contact is not the user, it retrieves messages
-        where the contact is either the from_contact or the to_contact and orders
-        """
-        if self.contact.is_me:
-            messages = (db.UniChatMessage
-                        .select()
-                        .where((db.UniChatMessage.from_contact == self.contact) &
-                               (db.UniChatMessage.to_contact == self.contact) &
-                               (db.UniChatMessage.chat_client == self.chat_client.name))
-                        .order_by(db.UniChatMessage.timestamp))
-        else:
-            messages = (db.UniChatMessage
-                        .select()
-                        .where(((db.UniChatMessage.from_contact == self.contact) |
-                                (db.UniChatMessage.to_contact == self.contact)) &
-                               (db.UniChatMessage.chat_client == self.chat_client.name))
-                        .order_by(db.UniChatMessage.timestamp))
-        return messages
@@ -74,6 +74,8 @@ class ChatContainerWidget(QWidget):
                 tab = ChatClientWidget(self.contact, chat_client)
                 self.tab_widget.addTab(tab, chat_client.name)
         self.tab_widget.setCurrentWidget(self.tab_widget.widget(0))
+        self.tab_widget.currentChanged.connect(self.mark_current_chat_read)
+        self.mark_current_chat_read()
 
     def init_linking(self, chat_client_name):
         """
@@ -112,6 +114,7 @@ class ChatContainerWidget(QWidget):
         self.tab_widget.removeTab(i)
         self.tab_widget.insertTab(i, tab, chat_client_name)
         self.tab_widget.setCurrentWidget(self.tab_widget.widget(i))
+        self.mark_current_chat_read()
 
     def update_chat_history(self, ucm: db.UniChatMessage, chat_client_name: str):
         """
@@ -124,5 +127,39 @@ class ChatContainerWidget(QWidget):
         :param chat_client_name: name of the client
         """
         index = self.client_name2widget_index[chat_client_name]
-        self.tab_widget.widget(index).add_message_to_chat_history(ucm)
+        tab = self.tab_widget.widget(index)
+        if not isinstance(tab, ChatClientWidget):
+            # the chat is not linked yet, its history is loaded when it is
+            return
+        tab.add_message_to_chat_history(ucm)
+        if index == self.tab_widget.currentIndex():
+            self.mark_current_chat_read()
+        else:
+            self.update_unread_counts()
 
+    def mark_current_chat_read(self):
+        """
+        resets the unread count of the chat in the current tab
+        """
+        tab = self.tab_widget.currentWidget()
+        if isinstance(tab, ChatClientWidget):
+            db.mark_conversation_read(tab.chat_client.name, tab.conversation_key)
+        self.update_unread_counts()
+
+    def update_unread_counts(self):
+        """
+        shows the number of unread messages in the tab titles
+        """
+        unread_counts = db.get_unread_counts(self.contact)
+        for chat_client_name, index in self.client_name2widget_index.items():
+            unread_count = unread_counts.get(chat_client_name, 0)
+            title = f'{chat_client_name} ({unread_count})' if unread_count else chat_client_name
+            self.tab_widget.setTabText(index, title)
+
+    def show_chat_client(self, chat_client_name: str):
+        """
+        switches to the tab of the given chat client
+        """
+        if chat_client_name in self.client_name2widget_index:
+            index = self.client_name2widget_index[chat_client_name]
+            self.tab_widget.setCurrentIndex(index)
@@ -1,3 +1,5 @@
+import os
+
 # external imports
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont, QPixmap
@@ -49,6 +51,10 @@ class ChatMessageWidget(QWidget):
         if self.unichat_message.text:
             msg_text = helpers.format_msg(self.unichat_message.text)
             self.message_label.setText(msg_text)
+        elif (self.unichat_message.photo_path
+              and not os.path.exists(self.unichat_message.photo_path)):
+            # evicted from the media store
+            self.message_label.setText('[ Photo is not available anymore ]')
         elif self.unichat_message.photo_path:
             pixmap = QPixmap(self.unichat_message.photo_path)
             scaled_pixmap = pixmap.scaled(300, 300, aspectMode=Qt.KeepAspectRatio)
@@ -63,14 +69,8 @@ class ChatMessageWidget(QWidget):
         constructs a timestamp under the message bubble
 
         """
-        # this is needed because SQLite saved timestamps as strings
-        try:
-            # timestamp is a datetime object
-            timestamp = self.unichat_message.timestamp.strftime('%H:%M')
-        except AttributeError:
-            # timestamp is a string from the db
-            timestamp = self.unichat_message.timestamp[11:16]
-
+        # stored as UTC epoch milliseconds, shown in local time
+        timestamp = helpers.convert_timestamp_to_time(self.unichat_message.timestamp)
         self.timestamp_label.setText(timestamp)
         self.timestamp_label.setObjectName('TimestampLabel')
         self.timestamp_label.setAlignment(Qt.AlignRight)
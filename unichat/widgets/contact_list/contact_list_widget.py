@@ -52,9 +52,10 @@ class ContactListWidget(QWidget):
     def init_contact_list(self):
         """
         The `init_contact_list` function populates a list of widgets with 
-        items representing contacts retrieved from a database.
+        items representing contacts retrieved from a database, the most
+        recently active contacts first.
         """
-        for contact in db.Contact.select():
+        for contact in db.get_contacts_by_activity():
             self.add_contact_to_list(contact)
 
     def open_add_contact_dialog(self):
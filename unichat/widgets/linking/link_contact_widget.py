@@ -1,3 +1,5 @@
+import asyncio
+
 # external imports
 from PySide6.QtCore import Signal, Qt
 from PySide6.QtWidgets import (
@@ -6,6 +8,10 @@ from PySide6.QtWidgets import (
     QComboBox,
     QWidget)
 
+# project imports
+from unichat.workers.chat_client_worker import ChatClientWorker
+from unichat.workers.history_worker import StoreHistoryWorker
+
 
 class LinkContact(QWidget):
     """
@@ -13,6 +19,8 @@ class LinkContact(QWidget):
 
     """
     linked_contact = Signal(str)
+    # number of history messages that are stored so far
+    progress = Signal(int)
 
     def __init__(self, contact, chat_client):
         """
@@ -25,6 +33,7 @@ class LinkContact(QWidget):
         self.combo_box = QComboBox()
         self.choose_contact_button = QPushButton('Select Contact')
         self.possible_contacts: dict = {}
+        self.history_worker = None
         self.init_ui()
 
     def init_ui(self):
@@ -35,6 +44,7 @@ class LinkContact(QWidget):
         layout = QVBoxLayout()
         self.init_button.clicked.connect(self.init_chat)
         self.choose_contact_button.clicked.connect(self.link_contact)
+        self.progress.connect(self.show_progress)
         layout.addWidget(self.init_button)
         layout.addWidget(self.combo_box)
         layout.addWidget(self.choose_contact_button)
@@ -53,3 +63,28 @@ class LinkContact(QWidget):
         child widgets need to implement this for linking a contact
         """
         raise NotImplementedError
+
+    def show_progress(self, stored: int):
+        """
+        shows the number of stored history messages while a contact is linked
+        """
+        self.choose_contact_button.setText(f'{stored} messages stored')
+
+    def store_history(self, chat, event_loop: asyncio.AbstractEventLoop | None = None):
+        """
+        stores the history of `chat` in a QThread, see `StoreHistoryWorker`.
+        the chat is shown after the first batch and the gui stays
+        responsive while the rest is fetched
+        """
+        worker = StoreHistoryWorker(client=self.chat_client,
+                                    chat=chat,
+                                    qt_signal=self.linked_contact,
+                                    event_loop=event_loop)
+        worker.progress.connect(self.progress)
+        self.history_worker = ChatClientWorker(worker=worker, sub_func=self.enable_buttons)
+        self.history_worker.execute_worker()
+        self.choose_contact_button.setDisabled(True)
+
+    def enable_buttons(self):
+        """ the history is stored """
+        self.choose_contact_button.setDisabled(False)
@@ -15,7 +15,7 @@ class LinkInstagramContact(LinkContact):
         initializes chat
         """
         self.chat_list = self.chat_client.get_active_chats()
-        for (name, url) in self.chat_list:
+        for name, _ in self.chat_list:
             self.combo_box.addItem(name)
 
     def link_contact(self):
@@ -28,5 +28,5 @@ class LinkInstagramContact(LinkContact):
         for (name, url) in self.chat_list:
             if chat_name == name:
                 self.chat_client.link_to_unichat_account(name, self.contact, url)
-                for msg in self.chat_client.get_all_messages(name, url):
-                    self.chat_client.save_message(msg)
+                self.store_history(name)
+                return
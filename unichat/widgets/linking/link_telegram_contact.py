@@ -21,11 +21,10 @@ class LinkTelegramContact(LinkContact):
     def link_contact(self):
         """
         The function `link_contact` links a contact to a UniChat account and saves all messages
-        associated with that contact.
+        associated with that contact, the chat is shown after the first batch.
         """
         name = self.combo_box.currentText()
         _, entity = self.possible_contacts[name]
         self.chat_client.link_to_unichat_account(entity, self.contact)
-        for msg in self.chat_client.get_all_messages(entity.id):
-            self.chat_client.save_message(msg)
-        self.linked_contact.emit(self.chat_client.name)
+        # the sync telethon client runs its requests on its own loop
+        self.store_history(entity.id, event_loop=self.chat_client.loop)
@@ -47,6 +47,7 @@ class LinkWhatsAppContact(LinkContact):
                                                      chat_name=chat_name,
                                                      unichat_contact=self.contact,
                                                      qt_signal=self.linked_contact)
+        self.link_worker.progress.connect(self.progress)
         self.chat_client_worker = ChatClientWorker(worker=self.link_worker,
                                                    sub_func=self.enable_buttons)
         self.chat_client_worker.execute_worker()
@@ -0,0 +1,101 @@
+# external imports
+from PySide6.QtCore import QTimer, Signal
+from PySide6.QtWidgets import (
+    QWidget,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QPushButton,
+    QVBoxLayout
+)
+
+# project imports
+import unichat.config as config
+import unichat.db as db
+import unichat.helpers as helpers
+
+
+class MessageSearchWidget(QWidget):
+    """
+    search-as-you-type panel over all stored messages. the query runs
+    when the user stops typing for `config.search_debounce_ms`, results
+    are ranked by relevance and loaded page by page
+    """
+    # contact of the chat and name of the chat client of the selected result
+    message_selected = Signal(object, str)
+
+    def __init__(self, parent=None):
+        """
+        message search widget constructor
+        """
+        super().__init__(parent=parent)
+        self.search_input = QLineEdit()
+        self.results = QListWidget()
+        self.more_button = QPushButton('More results')
+        self.debounce_timer = QTimer(self)
+        self.query = ''
+        self.offset = 0
+        self.init_ui()
+
+    def init_ui(self):
+        """
+        sets up the search input and the (initially hidden) result list
+        """
+        layout = QVBoxLayout()
+        self.search_input.setPlaceholderText('Search messages...')
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.debounce_timer.start)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(config.search_debounce_ms)
+        self.debounce_timer.timeout.connect(self.run_search)
+        self.results.itemClicked.connect(self.handle_result_clicked)
+        self.more_button.clicked.connect(self.load_more_results)
+        layout.addWidget(self.search_input)
+        layout.addWidget(self.results)
+        layout.addWidget(self.more_button)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+        self.results.hide()
+        self.more_button.hide()
+
+    def run_search(self):
+        """
+        starts a new search with the current input
+        """
+        self.query = self.search_input.text().strip()
+        self.offset = 0
+        self.results.clear()
+        self.results.setVisible(bool(self.query))
+        self.more_button.hide()
+        if self.query:
+            self.load_more_results()
+
+    def load_more_results(self):
+        """
+        appends the next page of results
+        """
+        messages = db.search_messages(self.query,
+                                      limit=config.search_page_size,
+                                      offset=self.offset)
+        self.offset += len(messages)
+        for message in messages:
+            self.add_result(message)
+        self.more_button.setVisible(len(messages) == config.search_page_size)
+
+    def add_result(self, message: db.UniChatMessage):
+        """
+        adds a result line: contact, chat client, date and text
+        """
+        contact = message.to_contact if message.from_contact.is_me else message.from_contact
+        date = helpers.convert_timestamp_to_date(message.timestamp)
+        text = helpers.format_msg(message.text, line_length=40)
+        item = QListWidgetItem(f'{contact.name} · {message.chat_client} · {date}\n{text}')
+        item.setData(101, (contact, message.chat_client))
+        self.results.addItem(item)
+
+    def handle_result_clicked(self, item: QListWidgetItem):
+        """
+        emits the chat of the clicked result
+        """
+        contact, chat_client_name = item.data(101)
+        self.message_selected.emit(contact, chat_client_name)
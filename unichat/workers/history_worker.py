@@ -0,0 +1,53 @@
+import asyncio
+
+# external imports
+from PySide6.QtCore import QObject, Signal
+
+# project imports
+import unichat.db as db
+from unichat.clients.chat_client import ChatClient
+
+
+class StoreHistoryWorker(QObject):
+    """
+    QObject worker that stores the history of a linked chat batch by batch
+    while it is fetched, see `ChatClient.iter_chat_messages`. the chat is
+    shown after the first batch
+    """
+    finished = Signal(bool)
+    # number of history messages that are stored so far
+    progress = Signal(int)
+
+    def __init__(self,
+                 client: ChatClient,
+                 chat,
+                 qt_signal: Signal,
+                 event_loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """
+        constructor. a client that runs its requests on an asyncio loop,
+        e.g. the sync telethon client, passes it as `event_loop`, it
+        becomes the loop of the worker thread
+        """
+        super().__init__()
+        self.client = client
+        self.chat = chat
+        self.qt_signal = qt_signal
+        self.event_loop = event_loop
+
+    def run(self):
+        """ runs worker """
+        if self.event_loop is not None:
+            asyncio.set_event_loop(self.event_loop)
+        with db.thread_connection():
+            stored = 0
+            is_shown = False
+            for batch in self.client.iter_chat_messages(self.chat):
+                # the progress counts the stored messages, so the write is awaited
+                stored += len(self.client.store_messages(batch).result())
+                self.progress.emit(stored)
+                if not is_shown:
+                    self.qt_signal.emit(self.client.name)
+                    is_shown = True
+            if not is_shown:
+                self.qt_signal.emit(self.client.name)
+        self.finished.emit(True)
@@ -2,6 +2,7 @@
 from PySide6.QtCore import QObject, Signal
 
 # project imports
+import unichat.db as db
 from unichat.clients.chat_client import ChatClient
 from unichat.encryption.utility import EncryptionUtility
 
@@ -50,6 +51,7 @@ class InstagramLoginWorker(QObject):
         """
         run worker
         """
-        success_login = self.client.login(self.username, self.password)
-        check_login = self.client.is_logged_in()
+        with db.thread_connection():
+            success_login = self.client.login(self.username, self.password)
+            check_login = self.client.is_logged_in()
         self.finished.emit(success_login and check_login)
@@ -0,0 +1,183 @@
+"""
+write-behind persistence of incoming messages. a single QThread owns the
+writer connection, the producers (GUI thread, fetchers, link workers)
+only enqueue messages. the queue is bounded, so a producer blocks when
+the writer falls behind instead of filling up the memory
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# external imports
+from PySide6.QtCore import QObject, Signal
+
+# project imports
+import unichat.config as config
+import unichat.db as db
+import unichat.media_store as media_store
+
+
+def add_media_files(messages: list[dict]) -> list[dict]:
+    """
+    adds the downloaded files of the messages to the media store, i.e. the
+    'media_file' key: a file path and the source key of the chat client
+    (see `media_store.add_file`). returns the messages with their media.
+    the files are copied, a rolled back transaction must not lose them.
+    the caller removes them once the media rows are committed
+    """
+    added = []
+    for message in messages:
+        if message.get('media_file'):
+            file_path, source_key = message['media_file']
+            media = media_store.add_file(file_path, source_key=source_key)
+            message = dict(message, media=media, photo_path=media.get_file_path())
+        added.append(message)
+    return added
+
+
+class PersistenceWorker(QObject):
+    """
+    QObject worker that stores the submitted messages in batches. a batch
+    collects submissions until it holds `config.persistence_batch_size`
+    messages or `config.persistence_flush_interval_sec` passed and is
+    written in one transaction. every submission gets a future with its
+    stored messages, all stored messages of a batch are emitted as well.
+    downloaded media files of the messages are added to the media store
+    in the same transaction and removed after the commit, see
+    `add_media_files`. the media shown by the GUI is marked as used in
+    the same thread, see `touch_media`
+    """
+    finished = Signal(bool)
+    msg_receive_signal = Signal(list)
+
+    def __init__(self, maxsize: int = config.persistence_queue_size) -> None:
+        """ persistence worker constructor """
+        super().__init__()
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._is_running = True
+        # media ids to mark as used, collected until the next flush
+        self.touched_media_ids = set()
+        self.touch_lock = threading.Lock()
+
+    def submit(self, chat_client: str, messages: list[dict]) -> Future:
+        """
+        enqueues messages of `chat_client` (see `db.save_messages_bulk`),
+        blocks while the queue is full. the future resolves to the unichat
+        messages that were stored, i.e. without the ones already stored.
+        after `stop` nothing is written anymore and the future fails
+        """
+        future = Future()
+        messages = list(messages)
+        if not self._is_running:
+            future.set_exception(RuntimeError('the persistence worker is stopped'))
+        elif not messages:
+            future.set_result([])
+        else:
+            self.queue.put((chat_client, messages, future))
+        return future
+
+    def run(self):
+        """ writes batches until stopped, then writes what is left """
+        with db.thread_connection():
+            while self._is_running or not self.queue.empty():
+                batch = self.collect_batch()
+                if batch:
+                    self.write_batch(batch)
+                self.flush_touched_media()
+            self.flush_touched_media()
+        self.finished.emit(True)
+
+    def stop(self):
+        """ stops the worker after the queued messages are written """
+        self._is_running = False
+
+    def touch_media(self, media_ids: list[int]) -> None:
+        """
+        marks media as used (see `media_store.touch`), the ids are collected
+        and written after the next batch or flush interval
+        """
+        with self.touch_lock:
+            self.touched_media_ids.update(media_ids)
+
+    def flush_touched_media(self) -> None:
+        """ writes the collected media ids in one update """
+        with self.touch_lock:
+            media_ids, self.touched_media_ids = self.touched_media_ids, set()
+        if media_ids:
+            try:
+                media_store.touch(sorted(media_ids))
+            except Exception as e:
+                logging.error('marking %d media as used failed: %s', len(media_ids), e)
+
+    def collect_batch(self) -> list[tuple]:
+        """
+        waits for a submission and collects more until the batch is full
+        or the flush interval passed
+        """
+        try:
+            batch = [self.queue.get(timeout=config.persistence_flush_interval_sec)]
+        except queue.Empty:
+            return []
+        size = len(batch[0][1])
+        deadline = time.monotonic() + config.persistence_flush_interval_sec
+        while size < config.persistence_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                submission = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(submission)
+            size += len(submission[1])
+        return batch
+
+    def write_batch(self, batch: list[tuple]) -> None:
+        """
+        writes a batch in one transaction. a failing submission is rolled
+        back to its savepoint and fails its future, the others are stored.
+        every future is resolved or failed, a producer never waits forever
+        """
+        database = db.UniChatMessage._meta.database
+        stored = []
+        media_files = []
+        try:
+            with database.atomic('IMMEDIATE'):
+                for chat_client, messages, future in batch:
+                    try:
+                        # nested in the batch transaction, i.e. a savepoint
+                        with database.atomic():
+                            ids = db.save_messages_bulk(chat_client, add_media_files(messages))
+                        stored.append((future, ids))
+                        media_files.extend(message['media_file'][0] for message in messages
+                                           if message.get('media_file'))
+                    except Exception as e:
+                        logging.error('storing %s messages failed: %s', chat_client, e)
+                        future.set_exception(e)
+        except Exception as e:
+            logging.error('persistence batch failed: %s', e)
+            for future, _ in stored:
+                future.set_exception(e)
+            return
+
+        for file_path in media_files:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logging.warning('removing the media file %s failed: %s', file_path, e)
+        try:
+            stored_ids = [i for _, ids in stored for i in ids]
+            messages = {message.id: message for message in db.get_messages_by_ids(stored_ids)}
+            # the signal is queued before a waiting producer continues
+            if messages:
+                self.msg_receive_signal.emit(list(messages.values()))
+        except Exception as e:
+            logging.error('reading the stored messages failed: %s', e)
+            for future, _ in stored:
+                future.set_exception(e)
+            return
+        for future, ids in stored:
+            future.set_result([messages[i] for i in ids if i in messages])
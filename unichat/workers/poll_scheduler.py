@@ -0,0 +1,101 @@
+"""
+adaptive polling of the background fetchers. a scheduler backs off
+exponentially while the polls find nothing and snaps back to its base
+interval when a poll finds something or the user opens the chat. all
+intervals are stretched while the app window is hidden. the schedulers
+count their polls and hits, see `get_poll_metrics`
+"""
+import logging
+import threading
+import time
+import weakref
+
+# project imports
+import unichat.config as config
+
+# set by the app window, see `set_app_hidden`
+_is_app_hidden = False
+
+
+class PollScheduler:
+    """
+    interval of a polling loop. the loop calls `wait` before and `record`
+    after every poll, `wake` can be called from any thread
+    """
+    schedulers = weakref.WeakSet()
+
+    def __init__(self,
+                 name: str,
+                 base_interval: float,
+                 max_interval: float = config.poll_max_interval_sec,
+                 backoff_factor: float = config.poll_backoff_factor,
+                 clock=time.monotonic):
+        self.name = name
+        self.base_interval = base_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.backoff_factor = backoff_factor
+        self.clock = clock
+        self.interval = base_interval
+        self.polls = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._woken = threading.Event()
+        self._last_log = clock()
+        PollScheduler.schedulers.add(self)
+
+    def get_delay(self) -> float:
+        """ time between two polls, longer while the app window is hidden """
+        return self.interval * (config.poll_hidden_factor if _is_app_hidden else 1)
+
+    def wait(self) -> bool:
+        """ waits for the next poll, returns True if it was woken early """
+        woken = self._woken.wait(self.get_delay())
+        self._woken.clear()
+        return woken
+
+    def record(self, hit: bool) -> None:
+        """
+        counts a poll, one that found something resets the interval,
+        otherwise it grows up to the maximum
+        """
+        with self._lock:
+            self.polls += 1
+            if hit:
+                self.hits += 1
+                self.interval = self.base_interval
+            else:
+                self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+        if self.clock() - self._last_log >= config.poll_metrics_log_interval_sec:
+            self._last_log = self.clock()
+            logging.info('polling metrics of %s: %s', self.name, self.get_metrics())
+
+    def wake(self) -> None:
+        """ back to the base interval and poll now, e.g. the user opened the chat """
+        with self._lock:
+            self.interval = self.base_interval
+        self._woken.set()
+
+    def get_metrics(self) -> dict[str, float]:
+        """ current interval, number of polls and hits and the hit rate """
+        with self._lock:
+            return {'interval_sec': self.get_delay(),
+                    'polls': self.polls,
+                    'hits': self.hits,
+                    'hit_rate': self.hits / self.polls if self.polls else 0.0}
+
+
+def set_app_hidden(hidden: bool) -> None:
+    """
+    stretches the intervals of all schedulers while the app window is
+    hidden, they poll right away when it is shown again
+    """
+    global _is_app_hidden
+    _is_app_hidden = hidden
+    if not hidden:
+        for scheduler in list(PollScheduler.schedulers):
+            scheduler.wake()
+
+
+def get_poll_metrics() -> dict[str, dict[str, float]]:
+    """ metrics of the running schedulers by their name """
+    return {scheduler.name: scheduler.get_metrics() for scheduler in list(PollScheduler.schedulers)}
@@ -6,6 +6,7 @@ messages
 
 """
 import asyncio
+import logging
 import os
 
 # external imports
@@ -14,8 +15,12 @@ from dotenv import load_dotenv
 from telethon import TelegramClient, events
 
 # project imports
+import unichat.clients.telegram_client.telegram_db as tdb
 import unichat.config as config
+import unichat.db as db
 import unichat.helpers as helpers
+import unichat.media_store as media_store
+from unichat.clients.telegram_client.telegram_client import get_photo_source_key
 
 
 class AsyncTelegramClientWorker(QObject):
@@ -26,7 +31,9 @@ class AsyncTelegramClientWorker(QObject):
     signal so the main app can process the message.
 
     """
-    msg_receive_signal = Signal(events.newmessage.NewMessage)
+    # telethon message, the stored media of its photo and the downloaded
+    # photo file that the persistence worker stores (or None)
+    msg_receive_signal = Signal(object, object, object)
     finished = Signal()
 
     def __init__(self):
@@ -39,6 +46,9 @@ class AsyncTelegramClientWorker(QObject):
         self.api_id = int(os.getenv('API_ID'))
         self.api_hash = os.getenv('API_HASH')
         self.telethon_client = self.init_telethon_client()
+        # the event loop of the worker thread, see `stop`
+        self.loop = None
+        self._is_running = True
 
     def init_telethon_client(self):
         """
@@ -60,10 +70,52 @@ class AsyncTelegramClientWorker(QObject):
     async def msg_handler(self, event):
         """
         telegram message event handler, called when a
-        new message arrives.
-        returns a telethon message object
+        new message arrives. emits the telethon message object, the
+        stored media and the downloaded file, see `emit_message`
         """
-        self.msg_receive_signal.emit(event.message)
+        await self.emit_message(event.message)
+
+    async def emit_message(self, message):
+        """
+        the photo of the message is downloaded here, such that the GUI
+        thread does not wait for it, unless the media store has it
+        already. the file is added to the store by the persistence
+        worker, this thread does not write
+        """
+        media = None
+        media_file = None
+        source_key = get_photo_source_key(message)
+        if source_key is not None:
+            media = media_store.get_by_source(source_key, mark_used=False)
+            if media is None:
+                media_file = await message.download_media(
+                    file=media_store.get_temp_file_path('.jpg'))
+        self.msg_receive_signal.emit(message, media, media_file)
+
+    async def sync_chats(self):
+        """
+        the event handler only receives new messages. the ones that arrived
+        while the app was closed are fetched for every linked chat from its
+        sync cursor on and emitted like new ones. without a cursor the
+        latest messages are fetched
+        """
+        me = db.get_unichat_me()
+        client = self.telethon_client
+        for user_id in tdb.get_linked_user_ids():
+            contact = tdb.get_contact_from_telegram_user_id(user_id)
+            sync_state = db.get_sync_state('telegram', db.get_conversation_key(me, contact))
+            try:
+                if sync_state is None:
+                    messages = await client.get_messages(user_id, limit=config.telegram_sync_limit)
+                else:
+                    messages = await client.get_messages(user_id,
+                                                         min_id=int(sync_state.external_id),
+                                                         reverse=True,
+                                                         limit=None)
+                for message in sorted(messages, key=lambda message: message.id):
+                    await self.emit_message(message)
+            except ValueError as e:
+                logging.warning('syncing the telegram chat %s failed: %s', user_id, e)
 
     def run(self):
         """
@@ -71,9 +123,23 @@ class AsyncTelegramClientWorker(QObject):
         """
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
+        self.loop = loop
+        if not self._is_running:
+            self.finished.emit()
+            return
         self.telethon_client.start()
 
-        with self.telethon_client:
+        with db.thread_connection(), self.telethon_client:
+            self.telethon_client.loop.run_until_complete(self.sync_chats())
             self.telethon_client.run_until_disconnected()
 
         self.finished.emit()
+
+    def stop(self):
+        """
+        disconnects the client from the qt app. the client belongs to the
+        event loop of the worker thread, the disconnect is scheduled there
+        """
+        self._is_running = False
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.telethon_client.disconnect)
@@ -4,9 +4,12 @@ import time
 from PySide6.QtCore import QObject, Signal
 
 # project imports
+import unichat.clients.whatsapp_client.whatsapp_chat_list as whatsapp_chat_list
 import unichat.clients.whatsapp_client.whatsapp_db as wdb
+import unichat.config as config
 import unichat.db as db
 from unichat.clients.chat_client import ChatClient
+from unichat.workers.poll_scheduler import PollScheduler
 
 
 class WhatsappQrCodeWorker(QObject):
@@ -44,7 +47,8 @@ class WhatsappLoginWorker(QObject):
         """
         runs worker
         """
-        success = self.client.login()
+        with db.thread_connection():
+            success = self.client.login()
         self.finished.emit(success)
 
 
@@ -65,6 +69,8 @@ class WhatsappLoadActiveChatsWorker(QObject):
 class WhatsappLinkContactWorker(QObject):
     """QObject worker to link a given chat to the unichat contact and download the chat history from Whatsapp"""
     finished = Signal(bool)
+    # number of history messages that are stored so far
+    progress = Signal(int)
 
     def __init__(self, client: ChatClient, chat_name: str, unichat_contact: db.Contact, qt_signal: Signal) -> None:
         """ constructor """
@@ -76,50 +82,105 @@ class WhatsappLinkContactWorker(QObject):
 
     def run(self):
         """ runs worker """
-        whatsapp_contact: wdb.WhatsAppContact = self.client.link_to_unichat_account(self.chat_name,
-                                                                                    self.unichat_contact)
-
-        for msg in self.client.get_all_messages(self.chat_name):
-            self.client.save_message(msg)
-        self.qt_signal.emit(self.client.name)
-        whatsapp_contact.is_linked = True
-        whatsapp_contact.save()
+        with db.thread_connection():
+            whatsapp_contact: wdb.WhatsAppContact = self.client.link_to_unichat_account(
+                self.chat_name, self.unichat_contact)
+
+            # the history is stored window by window while it is scraped,
+            # the chat is shown with the newest window
+            stored = 0
+            is_shown = False
+            for window in self.client.iter_chat_messages(self.chat_name):
+                stored += len(self.client.store_messages(window).result())
+                self.progress.emit(stored)
+                if not is_shown:
+                    self.qt_signal.emit(self.client.name)
+                    is_shown = True
+            if not is_shown:
+                self.qt_signal.emit(self.client.name)
+            whatsapp_contact.is_linked = True
+            whatsapp_contact.save()
+            db.invalidate_identity_caches()
         self.finished.emit(True)
 
 
 class WhatsappAsyncFetcherWorker(QObject):
-    """QObject worker to constantly fetch the newest chat history from Whatsapp and store it in the database"""
+    """
+    QObject worker to constantly fetch the newest chat history from Whatsapp and store it in the
+    database. the new messages of the target chat are drained from the message observer of the
+    tab, see `whatsapp_observer`. with `watch_all_chats` the chat list is scanned as well and the
+    other linked chats are only opened when their row changed, see `whatsapp_chat_list`. the
+    polls back off while nothing changes, see `poll_scheduler`. the stored messages are announced
+    by the persistence worker of the client
+    """
     finished = Signal(bool)
-    msg_receive_signal = Signal(list)
 
     def __init__(self,
                  client: ChatClient,
                  unichat_contact: db.Contact | None,
-                 interval_in_sec: int = 0.5) -> None:
+                 interval_in_sec: float = config.whatsapp_fetch_interval_sec,
+                 watch_all_chats: bool = config.whatsapp_watch_all_chats,
+                 watch_interval_in_sec: float = config.whatsapp_watch_interval_sec) -> None:
         super().__init__()
         self.client = client
         self.unichat_contact = unichat_contact
         self.chat_name = ""
-        self.change_target(unichat_contact)
         self.interval_in_sec = interval_in_sec
+        self.scheduler = PollScheduler(client.name, base_interval=interval_in_sec)
+        self.change_target(unichat_contact)
+        self.watch_all_chats = watch_all_chats
+        self.watch_interval_in_sec = watch_interval_in_sec
+        # chat name -> (time, preview) of its row when it was scanned last
+        self.seen_chats: dict[str, tuple] = {}
+        self._next_watch = 0.0
         self._is_running = True
 
     def run(self):
-        while self._is_running:
-            time.sleep(self.interval_in_sec)
-            if self.chat_name:
-                latest_messages = self.client.get_latest_messages(self.chat_name)
-                if latest_messages:
-                    unichat_messages = []
-                    for msg in latest_messages:
-                        unichat_messages.append(self.client.save_message(msg))
-                    self.msg_receive_signal.emit(unichat_messages)
+        with db.thread_connection():
+            while self._is_running:
+                self.scheduler.wait()
+                if self._is_running:
+                    self.scheduler.record(self.poll())
         self.finished.emit(True)
 
+    def poll(self) -> bool:
+        """ fetches the target chat and watches the others, returns True if something changed """
+        has_changed = False
+        if self.chat_name:
+            latest_messages = self.client.get_new_messages(self.chat_name)
+            if latest_messages:
+                # the observer only captures new messages, the write is not awaited
+                self.client.save_messages(latest_messages)
+                has_changed = True
+        if self.watch_all_chats and time.monotonic() >= self._next_watch:
+            self._next_watch = time.monotonic() + self.watch_interval_in_sec
+            has_changed = self.watch_chats() or has_changed
+        return has_changed
+
+    def watch_chats(self) -> bool:
+        """
+        scans the chat list and fetches the linked chats whose row changed in
+        one pass that returns to the target chat, the target chat is drained
+        by the observer instead. returns True if a row changed
+        """
+        rows = self.client.get_chat_list()
+        changed = whatsapp_chat_list.find_changed_chats(self.seen_chats, rows,
+                                                        wdb.get_linked_chat_names())
+        chat_names = [chat_name for chat_name in changed if chat_name != self.chat_name]
+        if chat_names:
+            # the messages after the sync cursors of the chats are new
+            latest_messages = self.client.get_latest_messages_of_chats(chat_names, self.chat_name)
+            if latest_messages:
+                self.client.save_messages(latest_messages)
+        return bool(changed)
+
     def stop(self):
         self._is_running = False
+        self.scheduler.wake()
 
     def change_target(self, contact: db.Contact | None) -> None:
         self.unichat_contact = contact
-        self.chat_name = wdb.get_whatsapp_contact(contact).chat_name if wdb.get_whatsapp_contact(
-            contact) else None
+        whatsapp_contact = wdb.get_whatsapp_contact(contact)
+        self.chat_name = whatsapp_contact.chat_name if whatsapp_contact else None
+        # the user opened the chat, it is polled fast again
+        self.scheduler.wake()